@@ -1,11 +1,62 @@
 from setuptools import setup, find_packages
-from pkg_resources import Requirement, resource_filename
+from subprocess import Popen, PIPE
 import sys, os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),'src')))
-import rrt
+
+VERSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'src', 'rrt', 'RELEASE-VERSION')
+
+def call_git_describe(abbrev=4):
+    try:
+        p = Popen(['git', 'describe', '--abbrev=%d' % abbrev],
+                  stdout=PIPE, stderr=PIPE)
+        p.stderr.close()
+        line = p.stdout.readlines()[0]
+        return line.strip()
+    except:
+        return None
+
+def read_release_version():
+    try:
+        f = open(VERSION_FILE, "r")
+        try:
+            version = f.readlines()[0]
+            return version.strip()
+        finally:
+            f.close()
+    except:
+        return None
+
+def write_release_version(version):
+    f = open(VERSION_FILE, "w")
+    f.write("%s\n" % version)
+    f.close()
+
+def get_git_version(abbrev=4):
+    """
+    Stamps RELEASE-VERSION at build time so `rrt` never has to run git when
+    it is imported (see `rrt.get_version_number`).
+    """
+    # Read in the version that's currently in RELEASE-VERSION.
+    release_version = read_release_version()
+    # First try to get the current version using git describe.
+    version = call_git_describe(abbrev)
+    # If that doesn't work, fall back on the value that's in
+    # RELEASE-VERSION.
+    if version is None:
+        version = release_version
+    # If we still don't have anything, that's an error.
+    if version is None:
+        raise ValueError("Cannot find the version number!")
+    # If the current version is different from what's in the
+    # RELEASE-VERSION file, update the file to be current.
+    if version != release_version:
+        write_release_version(version)
+    # Finally, return the current version.
+    return version
+
 setup(
     name = "ringling_render_tools",
-    version = rrt.__version__,
+    version = get_git_version(),
     author = "Owen Nelson",
     author_email = "onelson@ringling.edu",
     license = "MIT",
@@ -24,7 +75,13 @@ setup(
         'console_scripts': [
             'hpc-node-prep = rrt.hpc.scripts:prep_delegator',
             'hpc-node-release = rrt.hpc.scripts:release_delegator',
+            'hpc-node-run = rrt.hpc.scripts:run_delegator',
             'hpc-deploy-extras = rrt.hpc.scripts:deploy_extras',
+            'rrt-stats = rrt.telemetry:main',
+            'rrt-logs = rrt.renderlog:main',
+            'rrt-verify = rrt.verify:main',
+            'rrt-deps = rrt.dependencies:main',
+            'rrt-validate = rrt.validation:main',
         ],
         'gui_scripts': [
             'hpc-submit-max = rrt.max.gui:submit_gui',
@@ -1,6 +1,4 @@
-import logging, os
-from pkg_resources import resource_filename
-from subprocess import Popen, PIPE
+import logging, os, sys, types
 __VERSION_FILE__ = "RELEASE-VERSION"
 __LOG_LEVEL__ = logging.DEBUG if os.getenv('RRT_DEBUG',False) else logging.INFO
 
@@ -14,19 +12,13 @@ def get_log(name=__name__, stream=False):
         log.addHandler(handler)
     return log
 
-def __call_git_describe(abbrev=4):
-    try:
-        p = Popen(['git', 'describe', '--abbrev=%d' % abbrev],
-                  stdout=PIPE, stderr=PIPE)
-        p.stderr.close()
-        line = p.stdout.readlines()[0]
-        return line.strip()
-    except:
-        return None
-
 def __read_release_version():
+    """
+    RELEASE-VERSION is stamped by setup.py at build time, so reading it never
+    needs git (or a subprocess) on the nodes.
+    """
     try:
-        f = open(resource_filename(__name__, __VERSION_FILE__), "r")
+        f = open(os.path.join(os.path.abspath(os.path.dirname(__file__)), __VERSION_FILE__), "r")
         try:
             version = f.readlines()[0]
             return version.strip()
@@ -35,36 +27,32 @@ def __read_release_version():
     except:
         return None
 
-def __write_release_version(version):
-    f = open(os.path.join(os.path.abspath(os.path.dirname(__file__)),__VERSION_FILE__), "w")
-    f.write("%s\n" % version)
-    f.close()
+__cached_version = None
 
-
-def get_git_version(abbrev=4):
-    # Read in the version that's currently in RELEASE-VERSION.
-    release_version = __read_release_version()
-    # First try to get the current version using git describe.
-    version = __call_git_describe(abbrev)
-    # If that doesn't work, fall back on the value that's in
-    # RELEASE-VERSION.
-    if version is None:
-        version = release_version
-    # If we still don't have anything, that's an error.
-    if version is None:
-        raise ValueError("Cannot find the version number!")
-    # If the current version is different from what's in the
-    # RELEASE-VERSION file, update the file to be current.
-    if version != release_version:
-        __write_release_version(version)
-    # Finally, return the current version.
-    return version
-
-
-__version__ = get_git_version()
+def get_version_number():
+    global __cached_version
+    if __cached_version is None:
+        __cached_version = __read_release_version() or 'unknown'
+    return __cached_version
 
 def get_version():
-    version_string = 'Ringling Render Tools '+__version__
+    version_string = 'Ringling Render Tools '+get_version_number()
     return version_string
 
 class RinglingException(Exception):pass
+
+class _LazyModule(types.ModuleType):
+    """
+    Resolves `rrt.__version__` on first access rather than at import.
+    """
+    @property
+    def __version__(self):
+        return get_version_number()
+
+# Module level __getattr__ only exists in python >= 3.7, so swap this module
+# for an equivalent one that can carry a property.  The original is kept
+# alive since python 2 clears a module's globals when it is collected.
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update(sys.modules[__name__].__dict__)
+_module._original = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -0,0 +1,198 @@
+"""
+Remembers what's in Max project archives, so a multi-gigabyte zip on the
+project share has its central directory read over the network once, not
+every time it's browsed, submitted or extracted::
+
+    index = get_index()
+    index.scenes('Z:\\projects\\shot.zip')     # ['shot.max', ...]
+    index.problems('Z:\\projects\\shot.zip')   # [] if it can be extracted
+
+An archive's member list (names, sizes, crcs and where each member is in
+the archive) is kept in memory and as a small json file in a local
+directory, keyed by the archive's path; it's used for as long as the
+archive's size and modification time haven't changed.
+
+The submit window browses and checks archives through `get_index()`; node
+prep keeps its own index in the node cache, which plans the extraction
+and logs the archive's problems before anything is extracted.
+"""
+import os, json, zipfile, hashlib, threading
+from rrt import get_log
+from rrt.settings import ARCHIVE_INDEX_DIR
+
+LOG = get_log(__name__)
+
+# bumped when what's stored for an archive changes
+VERSION = 1
+# a member is stored as a row of these ZipInfo fields
+_INFO_FIELDS = ('filename', 'file_size', 'compress_size', 'CRC', 'header_offset',
+                'compress_type', 'flag_bits', 'date_time')
+(_NAME, _SIZE, _COMPRESS_SIZE, _CRC, _OFFSET, _COMPRESS_TYPE, _FLAGS, _DATE_TIME) = range(8)
+_EXTRACTABLE = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+def _to_row(info):
+    return [getattr(info, field) for field in _INFO_FIELDS]
+
+def _to_info(row):
+    info = zipfile.ZipInfo(row[_NAME], tuple(row[_DATE_TIME]))
+    for i in range(_SIZE, _DATE_TIME):
+        setattr(info, _INFO_FIELDS[i], row[i])
+    return info
+
+def _from_json(row):
+    try:
+        # zipfile's own names are str unless they aren't ascii
+        row[_NAME] = str(row[_NAME])
+    except UnicodeEncodeError:
+        pass
+    return row
+
+class ArchiveIndex(object):
+    """
+    Archive member lists, cached under `root`.  `reads` counts the central
+    directories read from the archives themselves.  Listing members doesn't
+    make a ZipInfo for each, which is most of the cost of a stored list;
+    only `infolist` does.
+    """
+
+    def __init__(self, root=ARCHIVE_INDEX_DIR):
+        self.root = root
+        self.reads = 0
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _index_path(self, path):
+        key = hashlib.sha1(os.path.normcase(os.path.abspath(path))).hexdigest()
+        return os.path.join(self.root, key + '.json')
+
+    def _read_archive(self, path):
+        with open(path, 'rb') as fh:
+            zf = zipfile.ZipFile(fh)
+            infolist = zf.infolist()
+            zf.close()
+        self.reads += 1
+        return infolist
+
+    def _load(self, path, stamp):
+        try:
+            with open(self._index_path(path), 'rb') as fh:
+                stored = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+        if stored.get('version') != VERSION or stored.get('size') != stamp[0] or \
+                stored.get('mtime') != stamp[1]:
+            return None
+        return [_from_json(row) for row in stored['members']]
+
+    def _save(self, path, stamp, rows):
+        stored = {'version': VERSION, 'path': path, 'size': stamp[0], 'mtime': stamp[1],
+                  'members': rows}
+        index_path = self._index_path(path)
+        tmp = '%s.%d.tmp' % (index_path, os.getpid())
+        try:
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root)
+            with open(tmp, 'wb') as fh:
+                json.dump(stored, fh)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            os.rename(tmp, index_path)
+        except Exception, e:
+            # (names that aren't ascii or utf-8 can't be written as json)
+            LOG.debug("Could not write archive index %s: %s" % (index_path, e))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _entry(self, path):
+        """[stamp, rows, infolist or None] for an archive, as it is now."""
+        stamp = _stamp(path)
+        key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry
+        infolist = None
+        rows = self._load(path, stamp)
+        if rows is None:
+            LOG.debug("Indexing %s" % path)
+            infolist = self._read_archive(path)
+            rows = [_to_row(info) for info in infolist]
+            self._save(path, stamp, rows)
+        entry = [stamp, rows, infolist]
+        with self._lock:
+            self._memory[key] = entry
+        return entry
+
+    def infolist(self, path):
+        """
+        The archive's members, as zipfile.ZipInfo.  Raises zipfile.BadZipfile
+        for files that aren't archives, like zipfile does.
+        """
+        entry = self._entry(path)
+        if entry[2] is None:
+            entry[2] = [_to_info(row) for row in entry[1]]
+        return entry[2]
+
+    def names(self, path):
+        """Every file in the archive (not its directories)."""
+        return [row[_NAME] for row in self._entry(path)[1] if not row[_NAME].endswith('/')]
+
+    def scenes(self, path, ext='.max'):
+        return [name for name in self.names(path) if name.lower().endswith(ext)]
+
+    def problems(self, path):
+        """
+        What would stop the archive being extracted on the nodes, found
+        without reading the members: a missing or unreadable archive, one
+        cut short, members that can't be inflated, and names that would
+        overwrite each other on Windows.
+        """
+        try:
+            stamp, rows = self._entry(path)[:2]
+        except (IOError, OSError), e:
+            return ["Can't read archive %s: %s" % (path, e)]
+        except zipfile.BadZipfile, e:
+            return ["Not a zip archive: %s (%s)" % (path, e)]
+        problems = []
+        truncated = [row for row in rows if row[_OFFSET] + row[_COMPRESS_SIZE] > stamp[0]]
+        if truncated:
+            problems.append("%s is cut short: %d members are past its end, e.g. %s" % (
+                            path, len(truncated), truncated[0][_NAME]))
+        for row in rows:
+            if row[_FLAGS] & 0x1:
+                problems.append("%s is encrypted." % row[_NAME])
+            elif row[_COMPRESS_TYPE] not in _EXTRACTABLE:
+                problems.append("%s uses an unsupported compression method (%d)." %
+                                (row[_NAME], row[_COMPRESS_TYPE]))
+        seen = {}
+        for name in [row[_NAME] for row in rows if not row[_NAME].endswith('/')]:
+            key = name.replace('\\', '/').lower()
+            if key in seen:
+                problems.append("%s and %s would overwrite each other." % (seen[key], name))
+            seen[key] = name
+        return problems
+
+    def has_member(self, path, name):
+        name = name.replace('\\', '/').lower()
+        return name in [n.replace('\\', '/').lower() for n in self.names(path)]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """The process wide index, in ARCHIVE_INDEX_DIR."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ArchiveIndex()
+        return _index
+
+def set_index(index):
+    """Replaces the process wide index (None goes back to the default)."""
+    global _index
+    with _index_lock:
+        _index = index
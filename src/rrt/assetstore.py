@@ -0,0 +1,123 @@
+"""
+Content addressed store for the files jobs need, on the file server.
+
+Each file listed in a job manifest (see `rrt.dependencies`) is stored once,
+named by the sha1 of its contents::
+
+    <ASSET_STORE_UNC>/blobs/ab/abcdef0123...   the file's bytes
+    <ASSET_STORE_UNC>/tmp/...                  uploads in progress
+
+so a texture library referenced from many projects, or a Max archive that
+is resubmitted with one map changed, is uploaded and stored once.  When a
+job is submitted every manifest entry gets a "blob" naming its contents;
+node prep then builds the job's files from the store, through a node local
+cache (`rrt.hpc.cache.BlobCache`).
+"""
+import os, re, shutil, hashlib, binascii, zipfile
+from rrt import get_log
+from rrt.settings import ASSET_STORE_UNC, EXTRACT_BUFFER
+
+LOG = get_log(__name__)
+
+BLOB_DIR = 'blobs'
+TMP_DIR = 'tmp'
+
+_SHA1 = re.compile(r'^[0-9a-f]{40}$')
+
+def is_blob_name(value):
+    return bool(value) and bool(_SHA1.match(value))
+
+def hash_stream(fh, buffer_size=EXTRACT_BUFFER):
+    digest = hashlib.sha1()
+    while True:
+        data = fh.read(buffer_size)
+        if not data:
+            break
+        digest.update(data)
+    return digest.hexdigest()
+
+class AssetStore(object):
+
+    def __init__(self, root=ASSET_STORE_UNC, buffer_size=EXTRACT_BUFFER):
+        self.root = root
+        self.buffer_size = buffer_size
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, BLOB_DIR, digest[:2], digest)
+
+    def has(self, digest, size=None):
+        path = self.blob_path(digest)
+        if not os.path.isfile(path):
+            return False
+        return size is None or os.path.getsize(path) == size
+
+    def _upload(self, open_source, digest):
+        tmp_dir = os.path.join(self.root, TMP_DIR)
+        target = self.blob_path(digest)
+        for folder in (tmp_dir, os.path.dirname(target)):
+            if not os.path.isdir(folder):
+                try:
+                    os.makedirs(folder)
+                except OSError:
+                    if not os.path.isdir(folder):
+                        raise
+        # written beside the store so a half uploaded blob is never seen
+        tmp = os.path.join(tmp_dir, '%s.%s' % (digest, binascii.hexlify(os.urandom(8))))
+        src = open_source()
+        try:
+            with open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.buffer_size)
+        finally:
+            src.close()
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # someone else stored it first
+            os.remove(tmp)
+            if not os.path.isfile(target):
+                raise
+        return os.path.getsize(target)
+
+    def put(self, open_source, digest=None, size=None):
+        """
+        Stores the contents of the file object returned by `open_source()`
+        unless they're already there.  `digest` saves hashing the source when
+        its sha1 is known.  Returns (digest, bytes uploaded).
+        """
+        if not is_blob_name(digest):
+            src = open_source()
+            try:
+                digest = hash_stream(src, self.buffer_size)
+            finally:
+                src.close()
+        if self.has(digest, size):
+            return digest, 0
+        return digest, self._upload(open_source, digest)
+
+    def store_manifest(self, entries, archive=None):
+        """
+        Stores every file in a manifest, adding its "blob" to each entry.
+        For Max jobs the entries are members of `archive`, which is read
+        member by member rather than stored whole.
+        Returns counts of files and of files and bytes uploaded.
+        """
+        stats = {'files': 0, 'uploaded_files': 0, 'uploaded_bytes': 0}
+        zf = zipfile.ZipFile(archive) if archive else None
+        try:
+            for entry in entries:
+                if zf is not None:
+                    opener = lambda name=entry['path']: zf.open(name)
+                else:
+                    opener = lambda path=entry['path']: open(path, 'rb', self.buffer_size)
+                digest, uploaded = self.put(opener, entry.get('hash'), entry.get('size'))
+                entry['blob'] = digest
+                stats['files'] += 1
+                if uploaded:
+                    stats['uploaded_files'] += 1
+                    stats['uploaded_bytes'] += uploaded
+        finally:
+            if zf is not None:
+                zf.close()
+        LOG.info("Asset store: %d files, uploaded %d (%0.1f MB)" % (
+                 stats['files'], stats['uploaded_files'], stats['uploaded_bytes'] / (1024 * 1024.0)))
+        return stats
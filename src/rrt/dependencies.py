@@ -0,0 +1,221 @@
+"""
+Finds the files a scene needs, for the job manifest (see `rrt.manifest`).
+
+Maya ASCII scenes are read directly: file textures, image planes, caches
+and references (which are scanned in turn).  In the submit window the open
+scene is asked instead (`rrt.maya.shortcuts.get_scene_dependencies`), which
+also covers binary scenes.  For Max jobs the archive already holds exactly
+what the scene needed when it was archived, so every member is listed,
+with the sizes, times and crcs from the zip's central directory (through
+`rrt.archiveindex`, so an archive that was just browsed isn't read again).
+"""
+import os, re, sys, glob, time, hashlib
+from optparse import OptionParser
+from rrt import get_log
+from rrt.manifest import write_manifest
+from rrt.archiveindex import get_index
+from rrt.settings import MANIFEST_HASHES
+
+LOG = get_log(__name__)
+
+# node types whose string attributes hold a path: {type: (attributes)}
+# both short and long names, since scenes can be saved with either
+MAYA_PATH_ATTRS = {
+    'file': ('ftn', 'fileTextureName'),
+    'psdFileTex': ('ftn', 'fileTextureName'),
+    'mentalrayTexture': ('ftn', 'fileTextureName'),
+    'imagePlane': ('imn', 'imageName'),
+    'gpuCache': ('cfn', 'cacheFileName'),
+    'AlembicNode': ('fn', 'abc_File'),
+    'audio': ('f', 'filename'),
+}
+# cacheFile nodes split the path into a directory and a base name
+MAYA_CACHE_DIR = ('cp', 'cachePath')
+MAYA_CACHE_NAME = ('cn', 'cacheName')
+
+_CREATE_NODE = re.compile(r'^createNode\s+(\w+)')
+_SET_STRING = re.compile(r'^\s*setAttr\s+"\.(\w+)"\s+-type\s+"string"\s+"((?:[^"\\]|\\.)*)"')
+_REFERENCE = re.compile(r'^file\s.*-(?:r|rdi)\b.*"((?:[^"\\]|\\.)+)"\s*;\s*$')
+# <udim>, <f> and other per-tile/per-frame tokens in texture names
+_TOKEN = re.compile(r'<\w+>|%0?\d*d|#+')
+_ESCAPED = re.compile(r'\\.')
+
+def _unescape(value):
+    return value.replace('\\\\', '\\').replace('\\"', '"')
+
+def _statements(fh):
+    """
+    The statements in a Maya ASCII file, one per line: Maya wraps long
+    statements over several lines (``file -r ...`` often has its path on
+    the next one), and a statement only ends at a ``;`` outside quotes.
+    """
+    parts, quoted = [], False
+    for line in fh:
+        if not parts and line.lstrip().startswith('//'):
+            yield line
+            continue
+        parts.append(parts and line.strip() or line.rstrip())
+        if _ESCAPED.sub('', line).count('"') % 2:
+            quoted = not quoted
+        if not quoted and parts[-1].endswith(';'):
+            yield ' '.join(parts)
+            parts = []
+    if parts:
+        yield ' '.join(parts)
+
+def resolve_path(path, project):
+    """
+    A scene's path as a file on disk: relative paths and old style
+    ``//dirname`` paths are under the project, $VARS are expanded.
+    """
+    path = os.path.expandvars(path.strip())
+    if path.startswith('//') and project:
+        # //sourceimages/x.tif, not a //server/share path (see rrt.hpc.maya.dirmap)
+        first = path[2:].split('/', 1)[0]
+        if os.path.isdir(os.path.join(project, first)):
+            path = path[2:]
+    if not os.path.isabs(path) and not os.path.splitdrive(path)[0] and project:
+        path = os.path.join(project, path)
+    return os.path.normpath(path)
+
+def _expand(path):
+    """Every file a (possibly tokenized) texture path stands for."""
+    if not _TOKEN.search(path):
+        return [path]
+    matches = glob.glob(_TOKEN.sub('*', path))
+    return sorted(matches) or [path]
+
+def scan_maya_ascii(scene, project=None, _seen=None):
+    """
+    Returns the sorted paths a .ma scene (and the .ma scenes it references)
+    reads, including the referenced scenes but not `scene` itself.  Paths
+    that don't exist are returned too, so they can be reported.
+    """
+    seen = _seen if _seen is not None else set()
+    seen.add(os.path.normcase(os.path.normpath(scene)))
+    paths = set()
+    node_type = None
+    cache_dir = cache_name = None
+    def add_cache():
+        if cache_dir and cache_name:
+            base = os.path.join(resolve_path(cache_dir, project), cache_name)
+            paths.update(glob.glob(base + '*.mc') + glob.glob(base + '*.mcx'))
+            paths.add(os.path.normpath(base + '.xml'))
+    with open(scene, 'rb') as fh:
+        for line in _statements(fh):
+            match = _CREATE_NODE.match(line)
+            if match:
+                if node_type == 'cacheFile':
+                    add_cache()
+                node_type, cache_dir, cache_name = match.group(1), None, None
+                continue
+            match = _SET_STRING.match(line)
+            if match:
+                attr, value = match.group(1), _unescape(match.group(2))
+                if not value:
+                    continue
+                if node_type == 'cacheFile':
+                    if attr in MAYA_CACHE_DIR:
+                        cache_dir = value
+                    elif attr in MAYA_CACHE_NAME:
+                        cache_name = value
+                elif attr in MAYA_PATH_ATTRS.get(node_type, ()):
+                    paths.update(_expand(resolve_path(value, project)))
+                continue
+            match = _REFERENCE.match(line)
+            if match:
+                paths.add(resolve_path(_unescape(match.group(1)), project))
+    if node_type == 'cacheFile':
+        add_cache()
+    for path in sorted(paths):
+        key = os.path.normcase(path)
+        if path.lower().endswith('.ma') and key not in seen and os.path.isfile(path):
+            paths.update(scan_maya_ascii(path, project, seen))
+    return sorted(paths)
+
+def file_hash(path, buffer_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        while True:
+            data = fh.read(buffer_size)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+def manifest_entries(paths, hashes=MANIFEST_HASHES):
+    """
+    Stats (and hashes) each path for a manifest.  Returns (entries, missing).
+    """
+    entries, missing = [], []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            entry = {'path': path, 'size': st.st_size, 'mtime': int(st.st_mtime)}
+            if hashes:
+                entry['hash'] = file_hash(path)
+        except (IOError, OSError), e:
+            LOG.debug("Can't read %s: %s" % (path, e))
+            missing.append(path)
+            continue
+        entries.append(entry)
+    return entries, missing
+
+def archive_entries(archive):
+    """Manifest entries for every file in a Max archive (zip)."""
+    entries = []
+    for info in get_index().infolist(archive):
+        if info.filename.endswith('/'):
+            continue
+        entries.append({'path': info.filename, 'size': info.file_size,
+                        'mtime': int(time.mktime(info.date_time + (0, 0, -1))),
+                        'hash': 'crc32:%08x' % (info.CRC & 0xffffffff)})
+    return entries
+
+def scene_manifest(scene, project, hashes=MANIFEST_HASHES):
+    """
+    Manifest entries for a job's scene: `project` is the archive for Max
+    jobs.  Returns (entries, missing), or None when the scene can't be
+    scanned outside of maya (binary scenes).
+    """
+    if project and project.lower().endswith('.zip'):
+        return archive_entries(project), []
+    if not scene.lower().endswith('.ma'):
+        return None
+    return manifest_entries(scan_maya_ascii(scene, project), hashes)
+
+def main(argv=None):
+    """
+    rrt-deps: lists the files a scene needs.
+    """
+    parser = OptionParser(usage="%prog [options] scene.ma|archive.zip",
+                          description="Lists the textures, caches and references a Maya ASCII scene "
+                                      "uses, or the members of a Max archive.")
+    parser.add_option('-p', '--project', default=None,
+                      help="the scene's project directory (default: the scene's parent's parent)")
+    parser.add_option('-m', '--manifest', metavar='PATH', default=None,
+                      help="write a job manifest to PATH")
+    parser.add_option('--no-hash', action='store_false', dest='hashes', default=MANIFEST_HASHES,
+                      help="don't hash the files")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("give one scene")
+    scene = os.path.abspath(args[0])
+    if scene.lower().endswith('.zip'):
+        project = scene
+    else:
+        project = options.project or os.path.dirname(os.path.dirname(scene))
+    result = scene_manifest(scene, project, options.hashes)
+    if result is None:
+        parser.error("only maya ascii scenes and max archives can be scanned")
+    entries, missing = result
+    for entry in entries:
+        print "%12d %s" % (entry['size'], entry['path'])
+    for path in missing:
+        print "%12s %s" % ('missing', path)
+    if options.manifest:
+        write_manifest(options.manifest, entries)
+    sys.exit(3 if missing else 0)
+
+if '__main__' == __name__:
+    main()
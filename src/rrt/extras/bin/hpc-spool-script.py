@@ -4,10 +4,27 @@ with any additional arguments -- you should not call this script directly!
 
 This standalone script must be run with IronPython (ipy.exe) since it relies on
 the Microsoft Hpc .Net assemblies. It will not work if you run it using the 
-regular python interpreter. 
+regular python interpreter (except with --dry-run, which submits nothing).
+
+Usage: hpc-spool [--dry-run|--local] job.ini [more.ini|dir|glob ...]
+       hpc-spool [--dry-run|--local] --serve [--port N] [--drop DIR]
 """
 
-import clr, sys, os, getpass, logging, re, datetime
+import sys, os, site, getpass, logging, glob, json
+from optparse import OptionParser
+
+# rrt lives on the PYTHONPATH used by the compute nodes, which IronPython
+# ignores.  addsitedir also picks up the easy_install .pth files there.
+for path in os.getenv('PYTHONPATH', '').split(os.pathsep):
+    if path and os.path.isdir(path):
+        site.addsitedir(path)
+from rrt.frames import auto_chunk_size, chunk_ranges, parse_chunk, \
+    longest_first, interleave, FrameSet, AUTO_CHUNK, ORDER_LONGEST, ORDER_INTERLEAVE
+from rrt.scheduler import get_backend
+from rrt import jobfile
+from rrt.ids import new_id, job_dir
+from rrt.spoolservice import SpoolService
+from rrt.settings import SPOOL_PORT, SPOOL_DROP_DIR
 
 RRT_DEBUG = os.getenv('RRT_DEBUG',False)
 RRT_USE_DESMOND = os.getenv('RRT_USE_DESMOND', False)
@@ -20,11 +37,24 @@ formatter = logging.Formatter("%(levelname)s: %(message)s")
 handler.setFormatter(formatter)
 LOG.addHandler(handler)
 
-clr.AddReference("Microsoft.Hpc.Scheduler")
-clr.AddReference("Microsoft.Hpc.Scheduler.Properties")
+# filled in by UseBackend() - see rrt.scheduler
+Scheduler = TaskType = JobUnitType = None
+
+def UseBackend(name):
+    global Scheduler, TaskType, JobUnitType
+    backend = get_backend(name)
+    Scheduler = backend.Scheduler
+    TaskType = backend.TaskType
+    JobUnitType = backend.JobUnitType
 
-from Microsoft.Hpc.Scheduler import *
-from Microsoft.Hpc.Scheduler.Properties import *
+
+def HeadNode():
+    host = os.getenv("HEAD_NODE", None)
+    if None == host: 
+        LOG.error("HEAD_NODE is null - please set HEAD_NODE.")
+        LOG.info("Exiting...")
+        sys.exit(1)
+    return host.strip()
 
 
 class Spooler(object):
@@ -34,17 +64,15 @@ class Spooler(object):
     
     @property
     def HeadNode(self):
-        host = os.getenv("HEAD_NODE", None)
-        if None == host: 
-            LOG.error("HEAD_NODE is null - please set HEAD_NODE.")
-            LOG.info("Exiting...")
-            sys.exit(1)
-        return host.strip()
+        return HeadNode()
 
     # Looks like Render.exe doesn't like quotes around the remote paths...
-    CMD_MAYA_RENDER_SW = "Render.exe -n {threads} -r sw -s * -e * -proj {node_project} -rd {output} {scene}"
-    CMD_MAYA_RENDER_RMAN = "Render.exe -n {threads} -r rman -s * -e * -proj {node_project} -rd {output} {scene}"
-    CMD_3DSMAX_RENDER = "3dsmaxcmd.exe -frames=*-* -workPath:{node_project} -o:{output} -showRFW:0 {node_project}\{scene}"
+    # frame_start/frame_end are "*" for sweeps, or the bounds of a chunk
+    CMD_MAYA_RENDER_SW = "Render.exe -n {threads} -r sw -s {frame_start} -e {frame_end} -b {step} -proj {node_project} -rd {output} {scene}"
+    CMD_MAYA_RENDER_RMAN = "Render.exe -n {threads} -r rman -s {frame_start} -e {frame_end} -b {step} -proj {node_project} -rd {output} {scene}"
+    CMD_3DSMAX_RENDER = "3dsmaxcmd.exe -frames={frame_start}-{frame_end} -nthFrame:{step} -workPath:{node_project} -o:{output} -showRFW:0 {node_project}\{scene}"
+    # render commands run through hpc-node-run, which records their timings
+    CMD_RENDER_WRAPPER = "hpc-node-run --frames={frame_start}-{frame_end} --step={step} "
     
     _renderers = {
         "max": CMD_3DSMAX_RENDER, 
@@ -65,65 +93,181 @@ class Spooler(object):
         "start": None,
         "end": None,
         "step": "1",
+        "frames": None,
+        "chunk": "1",
+        "order": None,
+        "costs": None,
         "threads": "4",
         "uuid": None,
         "net_share": None,
         "net_drive": None,
+        "manifest": None,
     }
 
     def ParseConf(self, iniPath):
         if os.path.isfile(iniPath): 
-            with open(iniPath, "rb") as iniFile:
-                for strLine in iniFile.readlines():
-                    strLine = strLine.strip().split('#')[0]
-                    if (strLine and '=' in strLine):
-                        parts = strLine.split('=')
-                        key = parts[0].strip()
-                        val = parts[1].strip()
-                        self._conf[key] = val
+            # see rrt.jobfile: '#' and '=' can be part of a value
+            self._conf.update(jobfile.load(iniPath))
         else: 
             raise RuntimeError("Unable to locate " + iniPath)
         if not self._conf['uuid']:
-            self._conf['uuid'] = re.sub('[%s]'% re.escape(' -:'),'', str(datetime.datetime.now()).split('.')[0])
+            self._conf['uuid'] = new_id()
         for k,v in self._conf.items():
             LOG.debug("%s = %s" % (k,v))
 
+    # where NODE_PROJECT is created on the compute nodes
+    NODE_JOB_DIR = os.getenv("RRT_NODE_JOB_DIR", r"D:\hpc")
+
+    # cores assumed for "auto" chunking when the cluster can't tell us
+    DEFAULT_CLUSTER_CORES = 64
+    _cluster_cores = None
+
     def __init__(self, confFile):
         self._confFile = confFile
+        # each spooler gets its own copy of the defaults
+        self._conf = dict(Spooler._conf)
         self.ParseConf(self._confFile)
-    
-    def BuildTaskList(self, job):
-        # this guy will need other methods to delegate to so we don't fork for each renderer available.
-        render_task = job.CreateTask()
-        
-        node_job_dir = r"D:\hpc"
-        self._conf["node_job_dir"] = node_job_dir
 
-        node_project = os.path.join(node_job_dir, self._conf['uuid'])
-        render_task.SetEnvironmentVariable("INIT_WD", node_project)
-        self._conf["node_project"] = node_project
+    def Frames(self):
+        """
+        The job's frames: its frame list, or start to end by step.
+        """
+        if self._conf["frames"]:
+            return FrameSet.parse(self._conf["frames"])
+        return FrameSet.from_range(self._conf["start"], self._conf["end"], self._conf["step"])
 
-        #Main Render Task
-        # basic info
-        render_task.Name = "Render *"
-        render_task.Type = TaskType.ParametricSweep
+    def Costs(self):
+        """
+        {frame: seconds} estimates written by the planner, if there are any.
+        """
+        if not self._conf["costs"]:
+            return {}
+        try:
+            with open(self._conf["costs"], "rb") as fh:
+                return dict((int(f), float(c)) for f, c in json.load(fh).items())
+        except Exception, e:
+            LOG.warning("Unable to read frame costs from %s: %s" % (self._conf["costs"], e))
+            return {}
 
-        #task iteration
-        render_task.StartValue = int(self._conf["start"])
-        render_task.EndValue = int(self._conf["end"])
-        render_task.IncrementValue = int(self._conf["step"])
+    def ChunkSize(self):
+        """
+        Frames per render task, resolving "auto" against the cluster size.
+        """
+        chunk = parse_chunk(self._conf["chunk"])
+        if chunk == AUTO_CHUNK:
+            cores = self._cluster_cores or self.DEFAULT_CLUSTER_CORES
+            threads = 1 if self._conf["renderer"] == "max" else int(self._conf["threads"])
+            count = len(self.Frames())
+            chunk = auto_chunk_size(count, cores, threads)
+            LOG.info("Auto chunk: %d frames per task (%d frames, %d cores)" % (chunk, count, cores))
+        return chunk
+
+    def _CreateRenderTask(self, job, frame_start, frame_end, step):
+        render_task = job.CreateTask()
+        render_task.SetEnvironmentVariable("INIT_WD", self._conf["node_project"])
 
         # thread/node limits
         if not self._conf["renderer"] == "max":
             render_task.MinimumNumberOfCores = int(self._conf["threads"])
             render_task.MaximumNumberOfCores = int(self._conf["threads"])            
 
-        # log redirection
-        render_task.StdErrFilePath = self._conf["logs"]
-        render_task.StdOutFilePath = self._conf["logs"]
-
         # run the render command
-        render_task.CommandLine = self._renderers[self._conf["renderer"]].format(**self._conf)
+        command = self.CMD_RENDER_WRAPPER + self._renderers[self._conf["renderer"]]
+        conf = dict(self._conf, step=step)
+        render_task.CommandLine = command.format(
+            frame_start=frame_start, frame_end=frame_end, **conf)
+        return render_task
+
+    def BuildRenderTasks(self, job):
+        """
+        Splits the frames into as few evenly stepped ranges as possible, then
+        makes one parametric sweep (a task per frame) per range when chunk is
+        1, otherwise a task per chunk of frames so the scene is loaded once
+        per chunk.  Every range goes in the same job, so nodes only prep once.
+        """
+        frames = self.Frames()
+        ranges = frames.ranges()
+        chunk = self.ChunkSize()
+        if self._conf["order"] == ORDER_LONGEST:
+            costs = self.Costs()
+            if costs:
+                return self.BuildOrderedTasks(job, ranges, chunk, costs)
+            LOG.warning("No frame costs for this job, rendering in order.")
+        if self._conf["order"] == ORDER_INTERLEAVE:
+            return self.BuildInterleavedTasks(job, frames, chunk)
+        return self._BuildRangeTasks(job, ranges, chunk)
+
+    def _BuildRangeTasks(self, job, ranges, chunk, label="Render"):
+        tasks = []
+        for start, end, step in ranges:
+            if chunk == 1:
+                render_task = self._CreateRenderTask(job, "*", "*", step)
+                if len(ranges) == 1:
+                    render_task.Name = "%s *" % label
+                else:
+                    render_task.Name = "%s %s: *" % (label, FrameSet.from_range(start, end, step))
+                render_task.Type = TaskType.ParametricSweep
+                #task iteration
+                render_task.StartValue = start
+                render_task.EndValue = end
+                render_task.IncrementValue = step
+                # log redirection
+                render_task.StdErrFilePath = self._conf["logs"]
+                render_task.StdOutFilePath = self._conf["logs"]
+                tasks.append(render_task)
+                continue
+            for first, last in chunk_ranges(start, end, step, chunk):
+                tasks.append(self._CreateChunkTask(job, first, last, step, label))
+        return tasks
+
+    def _CreateChunkTask(self, job, first, last, step, label="Render"):
+        render_task = self._CreateRenderTask(job, first, last, step)
+        render_task.Name = "%s %d-%d" % (label, first, last)
+        # the log name is keyed by the first frame in the chunk
+        render_task.StdErrFilePath = self._conf["logs"].replace("*", str(first))
+        render_task.StdOutFilePath = self._conf["logs"].replace("*", str(first))
+        return render_task
+
+    def BuildOrderedTasks(self, job, ranges, chunk, costs):
+        """
+        A task per chunk (or frame), most expensive first.  The cluster
+        starts a job's tasks in the order they were added, so the slowest
+        frames don't end up running alone at the end of the job.
+        """
+        chunks = []
+        for start, end, step in ranges:
+            chunks.extend([(first, last, step) for first, last in
+                           chunk_ranges(start, end, step, chunk)])
+        return [self._CreateChunkTask(job, first, last, step)
+                for first, last, step in longest_first(chunks, costs)]
+
+    def BuildInterleavedTasks(self, job, frames, chunk):
+        """
+        Renders the frames in coarse to fine passes (see rrt.frames.interleave),
+        each pass's tasks named "Pass N" and added after the pass before it.
+        Tasks within a job can't be given their own priority, but the cluster
+        starts them in the order they were added, so every frame of pass 1 is
+        running before any of pass 2 and the passes finish roughly in order.
+        """
+        passes = interleave(frames)
+        tasks = []
+        for number, pass_frames in enumerate(passes):
+            LOG.info("Pass %d of %d: %s" % (number + 1, len(passes), pass_frames))
+            tasks.extend(self._BuildRangeTasks(job, pass_frames.ranges(), chunk,
+                                               "Pass %d" % (number + 1)))
+        return tasks
+
+    def BuildTaskList(self, job):
+        # this guy will need other methods to delegate to so we don't fork for each renderer available.
+        node_job_dir = self.NODE_JOB_DIR
+        self._conf["node_job_dir"] = node_job_dir
+
+        # in a date directory, like the job's logs and output (see rrt.ids)
+        node_project = job_dir(node_job_dir, self._conf['uuid'])
+        self._conf["node_project"] = node_project
+
+        #Main Render Task(s)
+        render_tasks = self.BuildRenderTasks(job)
 
         # Setup Task
         setup_task = job.CreateTask()
@@ -139,12 +283,14 @@ class Spooler(object):
 
         # Add Env Vars
         self.SetJobEnv(setup_task)
-        self.SetJobEnv(render_task)
+        for render_task in render_tasks:
+            self.SetJobEnv(render_task)
         self.SetJobEnv(cleanup_task)
 
         # Task Assignment
         job.AddTask(setup_task)
-        job.AddTask(render_task)
+        for render_task in render_tasks:
+            job.AddTask(render_task)
         job.AddTask(cleanup_task)
 
     def SetJobEnv(self,task):
@@ -167,43 +313,77 @@ class Spooler(object):
         task.SetEnvironmentVariable("OUTPUT", self._conf["output"])
         task.SetEnvironmentVariable("NET_SHARE", self._conf["net_share"])
         task.SetEnvironmentVariable("NET_DRIVE", self._conf["net_drive"])
+        task.SetEnvironmentVariable("JOB_UUID", self._conf["uuid"])
+        if self._conf["manifest"]:
+            task.SetEnvironmentVariable("MANIFEST", self._conf["manifest"])
+
+    @classmethod
+    def Connect(cls, scheduler, head_node):
+        """
+        Connects to the head node and checks the cluster api version.
+        Returns the cluster's core count (or None if it can't be read).
+        The connection is closed again if the version check fails.
+        """
+        LOG.info("Connecting to cluster at: %s" % head_node)
+        try:
+            scheduler.Connect(head_node)
+        except Exception, e:
+            LOG.error("Unable to reach cluster head node: %s" % head_node)
+            raise
+        # check the cluster api version
+        try:
+            server_version = scheduler.GetServerVersion()
+            serv = '.'.join([str(d) for d in (server_version.Major,
+                              server_version.Minor,
+                              server_version.Build,
+                              server_version.Revision)])
+            reqv = '.'.join([str(d) for d in cls.REQUIRED_SERVER_VERSION])
+            if serv != reqv:
+                raise RuntimeError('HPC API mismatch: got %s, but required %s' % (serv, reqv))
+        except Exception:
+            scheduler.Close()
+            raise
+        try:
+            return scheduler.GetCounters().TotalCores
+        except Exception, e:
+            LOG.debug("Could not read cluster counters: %s" % e)
+            return None
+
+    def Submit(self, scheduler, cluster_cores=None):
+        """
+        Builds and submits this job on an already connected scheduler.
+        Returns the new job id.
+        """
+        self._cluster_cores = cluster_cores
+        job = scheduler.CreateJob()
+        # set the job properties
+        job.Name = self._conf["name"]
+        # task by node granularity setting for 3ds Max
+        if self._conf["renderer"] == "max": 
+            job.UnitType = JobUnitType.Node
+        else:
+            job.UnitType = JobUnitType.Core
+        #job.NodeGroups.Add("ComputeNodes")
+        job.IsExclusive = True
+        self.BuildTaskList(job) # attach tasks to job
+        
+        scheduler.SubmitJob(job, self.RUNAS_USER, self.RUNAS_PASSWORD) # ship it out to the head node
+        return job.Id
 
     def DoIt(self):
         scheduler = Scheduler()
         try:
             # make a connection to the cluster
-            LOG.info("Connecting to cluster at: %s" % self.HeadNode)
             try:
-                scheduler.Connect(self.HeadNode)
+                cores = self.Connect(scheduler, self.HeadNode)
+            except RuntimeError:
+                raise
             except Exception, e:
-                LOG.error("Unable to reach cluster head node: %s" % self.HeadNode)
                 LOG.error(e)
                 LOG.info("Exiting...")
                 sys.exit(2)
-            # check the cluster api version
-            server_version = scheduler.GetServerVersion()
-            serv = '.'.join([str(d) for d in (server_version.Major,
-                              server_version.Minor,
-                              server_version.Build,
-                              server_version.Revision)])
-            reqv = '.'.join([str(d) for d in self.REQUIRED_SERVER_VERSION])
-            if serv != reqv:
-                scheduler.Close()
-                raise RuntimeError('HPC API mismatch: got %s, but required %s' % (serv, reqv))
-            job = scheduler.CreateJob()
-            # set the job properties
-            job.Name = self._conf["name"]
-            # task by node granularity setting for 3ds Max
-            if self._conf["renderer"] == "max": 
-                job.UnitType = JobUnitType.Node
-            else:
-                job.UnitType = JobUnitType.Core
-            #job.NodeGroups.Add("ComputeNodes")
-            job.IsExclusive = True
-            self.BuildTaskList(job) # attach tasks to job
-            
-            scheduler.SubmitJob(job, self.RUNAS_USER, self.RUNAS_PASSWORD) # ship it out to the head node
-            LOG.info("Submitted job %d to %s." % (job.Id, self.HeadNode))
+            job_id = self.Submit(scheduler, cores)
+            LOG.info("Submitted job %d to %s." % (job_id, self.HeadNode))
             scheduler.Close()
         except Exception, e:
             LOG.error(e)
@@ -214,23 +394,170 @@ class Spooler(object):
         sys.exit(0)
 
 
+def ExpandConfPaths(args):
+    """
+    Turns command line arguments (ini files, directories of ini files or
+    glob patterns) into a sorted, de-duplicated list of ini paths.
+    """
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            found = glob.glob(os.path.join(arg, '*.ini'))
+        elif os.path.isfile(arg):
+            found = [arg]
+        else:
+            found = glob.glob(arg)
+            if not found:
+                LOG.warning("No ini files match %s" % arg)
+        for path in sorted(found):
+            path = os.path.abspath(path)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def SpoolBatch(conf_paths, head_node, scheduler=None):
+    """
+    Submits every ini in conf_paths over one scheduler connection (see
+    SubmitAll).
+    Returns a list of (conf_path, job_id, error) in conf_paths order.
+    """
+    scheduler = scheduler or Scheduler()
+    try:
+        try:
+            cores = Spooler.Connect(scheduler, head_node)
+        except Exception, e:
+            return [(path, None, "not submitted: %s" % e) for path in conf_paths]
+        results = SubmitAll(scheduler, cores, conf_paths)
+        scheduler.Close()
+    finally:
+        scheduler.Dispose()
+    return results
+
+def SubmitAll(scheduler, cores, conf_paths):
+    """
+    Submits every ini in conf_paths on an already connected scheduler, one
+    job at a time: the scheduler isn't thread safe.  Every ini is read
+    first, so a bad one is reported without holding up the rest.
+    Returns a list of (conf_path, job_id, error) in conf_paths order.
+    """
+    spoolers = []
+    for path in conf_paths:
+        try:
+            spoolers.append((path, Spooler(path), None))
+        except Exception, e:
+            spoolers.append((path, None, str(e)))
+    results = []
+    for path, spooler, error in spoolers:
+        if spooler is not None:
+            try:
+                results.append((path, spooler.Submit(scheduler, cores), None))
+                continue
+            except Exception, e:
+                error = str(e)
+        results.append((path, None, error))
+    return results
+
+class ServiceSpooler(object):
+    """
+    Holds the scheduler connection for `hpc-spool --serve` (see
+    rrt.spoolservice), so jobs are submitted without connecting each time.
+    """
+
+    def __init__(self, head_node, scheduler_factory=None):
+        self.head_node = head_node
+        self.scheduler_factory = scheduler_factory
+        self.scheduler = None
+        self.cores = None
+
+    def connect(self):
+        self.scheduler = (self.scheduler_factory or Scheduler)()
+        try:
+            self.cores = Spooler.Connect(self.scheduler, self.head_node)
+        except Exception:
+            self.scheduler.Dispose()
+            self.scheduler = None
+            raise
+
+    def check(self):
+        self.scheduler.GetServerVersion()
+
+    def submit(self, conf_paths):
+        results = SubmitAll(self.scheduler, self.cores, conf_paths)
+        for path, job_id, error in results:
+            if error:
+                LOG.error("%s: %s" % (os.path.basename(path), error))
+            else:
+                LOG.info("Submitted job %d to %s." % (job_id, self.head_node))
+        return results
+
+    def close(self):
+        scheduler, self.scheduler = self.scheduler, None
+        if scheduler is not None:
+            try:
+                scheduler.Close()
+            finally:
+                scheduler.Dispose()
+
+def Serve(head_node, port=SPOOL_PORT, drop_dir=SPOOL_DROP_DIR):
+    """Submits jobs from the socket and drop folder until interrupted."""
+    service = SpoolService(ServiceSpooler(head_node), port=port, drop_dir=drop_dir)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        LOG.info("Stopping the spool service.")
+
+
 # Command Line Entry Point
 def main():
+    parser = OptionParser(usage="%prog [options] job.ini [more.ini|dir|glob ...]")
+    parser.add_option("--dry-run", action="store_const", dest="backend",
+                      const="dryrun", default="hpc",
+                      help="build the jobs but don't submit them")
+    parser.add_option("--local", action="store_const", dest="backend",
+                      const="local", help="run the jobs on this machine")
+    parser.add_option("--serve", action="store_true", default=False,
+                      help="keep running, submitting jobs sent to --port or saved in --drop")
+    parser.add_option("--port", type="int", default=SPOOL_PORT,
+                      help="port to serve on, 0 for none (default %default)")
+    parser.add_option("--drop", default=SPOOL_DROP_DIR,
+                      help="drop folder to serve, '' for none (default %default)")
+    options, args = parser.parse_args()
     LOG.info('Starting hpc-spool for MS HPC v'+'.'.join([str(v) for v in Spooler.REQUIRED_SERVER_VERSION]))
-    conf_path = None
-    try:
-        conf_path = os.path.abspath(sys.argv[1])
-    except IndexError:
+    if options.backend != 'hpc':
+        os.environ.setdefault("HEAD_NODE", "localhost")
+    if options.serve:
+        UseBackend(options.backend)
+        Serve(HeadNode(), options.port or None, options.drop or None)
+        sys.exit(0)
+    if not args:
         LOG.error("Must specify an ini file.")
         LOG.info("Exiting...")
         sys.exit(3)
-    LOG.info("Spooling job from %s" % conf_path)
-    try:
-        spool = Spooler(conf_path)
-        spool.DoIt()
-    except Exception, e:
-        LOG.error(e)
-        sys.exit(-1)
+    UseBackend(options.backend)
+    conf_paths = ExpandConfPaths(args)
+    if not conf_paths:
+        LOG.error("No ini files found.")
+        LOG.info("Exiting...")
+        sys.exit(3)
+    if len(conf_paths) == 1:
+        LOG.info("Spooling job from %s" % conf_paths[0])
+        try:
+            spool = Spooler(conf_paths[0])
+            spool.DoIt()
+        except Exception, e:
+            LOG.error(e)
+            sys.exit(-1)
+    LOG.info("Spooling %d jobs" % len(conf_paths))
+    results = SpoolBatch(conf_paths, HeadNode())
+    failed = 0
+    for path, job_id, error in results:
+        if error:
+            failed += 1
+            LOG.error("%s: %s" % (os.path.basename(path), error))
+        else:
+            LOG.info("%s: job %d" % (os.path.basename(path), job_id))
+    LOG.info("%d submitted, %d failed." % (len(results) - failed, failed))
+    sys.exit(5 if failed else 0)
 
 if '__main__' == __name__:
     main()
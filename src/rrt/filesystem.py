@@ -1,28 +1,314 @@
-import ntpath, re
+import ntpath, re, os, time, json, threading, shutil
 from subprocess import Popen, PIPE
 from rrt import RinglingException, get_log
+from rrt.settings import UNC_HOST_RULES, SHARE_CACHE_TTL, SHARE_CACHE_FILE,\
+    SHARE_MAP_FILE
 LOG = get_log()
-def get_share(path):
+
+def _normalize_drive(drive):
+    return drive.strip().upper()
+
+class ShareBackend(object):
     """
-    Maps windows drive letters to unc paths.
+    Source of drive letter -> unc share mappings.
+    Backends return raw unc paths; `ShareResolver` handles caching and
+    rewriting.
     """
-    drive_letter = ntpath.splitdrive(path)[0]
-    try:
+    def shares(self):
+        """Returns a dict of every known mapping, keyed by drive ('Z:')."""
+        raise NotImplementedError
+
+    def share(self, drive):
+        """Returns the unc path for a single drive (or None)."""
+        return self.shares().get(_normalize_drive(drive))
+
+class NetUseBackend(ShareBackend):
+    """
+    Asks windows via `net use`.  A bare `net use` lists every connection, so
+    the whole drive table costs a single subprocess.
+    """
+    # Status is blank for some connections, so it is optional
+    _row_pattern = re.compile(r'^\s*(?:\S+\s+)?([A-Za-z]:)\s+(\\\\\S+)')
+
+    def _net_use(self, *args):
         # See http://bugs.python.org/issue3905 for why we pipe stdin and close it right away
-        p = Popen(['net use', drive_letter], stdin=PIPE, stdout=PIPE, 
+        p = Popen(' '.join(('net use',) + args), stdin=PIPE, stdout=PIPE,
                   stderr=PIPE, shell=True)
         p.stdin.close()
         (out, err) = p.communicate()
         if p.returncode != 0:
             LOG.error(err)
-            raise RinglingException("Can't find network share for drive %s" % drive_letter)
-        unc = out.splitlines()[1].split()[2].strip().lower()
-        
-        """
-        TODO: decide if we want to hold off on these transformations until we're 
-        in hpc-spool-script...
-        """
-        # on the cluster vlan, our file-server hosts have a 1 appended to their names        
-        return re.sub("(hamming|minsky|perlis|shannon|wilkes|wilkinson)", '\g<1>1', unc, 1)
-    except Exception, e:
-        raise e
+            return None
+        return out
+
+    def shares(self):
+        out = self._net_use()
+        if out is None:
+            return {}
+        return self.parse_listing(out)
+
+    @classmethod
+    def parse_listing(cls, out):
+        """Parses the table printed by a bare `net use`."""
+        table = {}
+        for line in out.splitlines():
+            match = cls._row_pattern.match(line)
+            if match:
+                table[_normalize_drive(match.group(1))] = match.group(2)
+        return table
+
+    def share(self, drive):
+        out = self._net_use(drive)
+        if out is None:
+            return None
+        try:
+            return out.splitlines()[1].split()[2].strip()
+        except IndexError:
+            return None
+
+class MappingFileBackend(ShareBackend):
+    """
+    Reads mappings from a plain text file, one "Z: = \\\\host\\share" per
+    line ('#' starts a comment).  Handy for testing away from windows.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def shares(self):
+        table = {}
+        with open(self.path, 'rb') as fh:
+            for line in fh:
+                line = line.split('#')[0].strip()
+                if '=' not in line:
+                    continue
+                drive, unc = line.split('=', 1)
+                table[_normalize_drive(drive)] = unc.strip()
+        return table
+
+class ShareResolver(object):
+    """
+    Caches drive letter -> unc lookups in process (for `ttl` seconds) and,
+    optionally, in a json file shared with other processes.  Drives that
+    aren't mapped are remembered for `ttl` seconds too, in process only.
+    The host rewrite rules are applied once, when an entry enters the cache.
+    """
+    def __init__(self, backend, ttl=SHARE_CACHE_TTL, cache_file=None,
+                 rules=UNC_HOST_RULES, clock=time.time):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.rules = [(re.compile(p), r) for p, r in rules]
+        self.clock = clock
+        self._table = {}
+        self._lock = threading.Lock()
+        if self.cache_file:
+            self._load()
+
+    def rewrite(self, unc):
+        unc = unc.strip().lower()
+        for pattern, replacement in self.rules:
+            unc = pattern.sub(replacement, unc, 1)
+        return unc
+
+    def _fresh(self, entry):
+        return entry is not None and self.clock() - entry[1] < self.ttl
+
+    def _load(self):
+        try:
+            with open(self.cache_file, 'rb') as fh:
+                stored = json.load(fh)
+            for drive, entry in stored.items():
+                self._table[str(drive)] = (str(entry['unc']), float(entry['time']))
+        except Exception, e:
+            LOG.debug("Ignoring share cache %s: %s" % (self.cache_file, e))
+
+    def _save(self):
+        stored = dict((d, {'unc': e[0], 'time': e[1]}) for d, e in self._table.items()
+                      if e[0] is not None)
+        try:
+            tmp = self.cache_file + '.tmp'
+            with open(tmp, 'wb') as fh:
+                json.dump(stored, fh)
+            if os.path.exists(self.cache_file):
+                os.remove(self.cache_file)
+            os.rename(tmp, self.cache_file)
+        except Exception, e:
+            LOG.debug("Could not write share cache %s: %s" % (self.cache_file, e))
+
+    def refresh(self):
+        """Reloads the whole drive table from the backend."""
+        now = self.clock()
+        with self._lock:
+            for drive, unc in self.backend.shares().items():
+                self._table[drive] = (self.rewrite(unc), now)
+            if self.cache_file:
+                self._save()
+
+    def invalidate(self, drive=None):
+        with self._lock:
+            if drive is None:
+                self._table.clear()
+            else:
+                self._table.pop(_normalize_drive(drive), None)
+
+    def resolve(self, drive):
+        drive = _normalize_drive(drive)
+        if not self._fresh(self._table.get(drive)):
+            self.refresh()
+        if not self._fresh(self._table.get(drive)):
+            # not in the bulk listing, so ask for the drive by itself
+            unc = self.backend.share(drive)
+            with self._lock:
+                if unc:
+                    self._table[drive] = (self.rewrite(unc), self.clock())
+                    if self.cache_file:
+                        self._save()
+                else:
+                    # so an unmapped drive isn't looked up again on every call
+                    self._table[drive] = (None, self.clock())
+        entry = self._table.get(drive)
+        if not self._fresh(entry) or entry[0] is None:
+            raise RinglingException("Can't find network share for drive %s" % drive)
+        return entry[0]
+
+_resolver = None
+
+def get_resolver():
+    """
+    Returns the process wide resolver, built from `rrt.settings` on first use.
+    """
+    global _resolver
+    if _resolver is None:
+        if SHARE_MAP_FILE:
+            backend = MappingFileBackend(SHARE_MAP_FILE)
+        else:
+            backend = NetUseBackend()
+        _resolver = ShareResolver(backend, cache_file=SHARE_CACHE_FILE)
+    return _resolver
+
+def set_resolver(resolver):
+    """Swaps in a different resolver (or None to rebuild from settings)."""
+    global _resolver
+    _resolver = resolver
+
+def get_share(path):
+    """
+    Maps windows drive letters to unc paths.
+    """
+    drive_letter = ntpath.splitdrive(path)[0]
+    if not drive_letter:
+        raise RinglingException("Can't find network share for path %s" % path)
+    return get_resolver().resolve(drive_letter)
+
+try:
+    import msvcrt
+    def _try_lock(fh):
+        fh.seek(0)
+        try:
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except IOError:
+            return False
+    def _unlock(fh):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+except ImportError:
+    import fcntl
+    def _try_lock(fh):
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except IOError:
+            return False
+    def _unlock(fh):
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+class LockTimeout(RinglingException): pass
+
+class FileLock(object):
+    """
+    An exclusive lock on `path`, shared between processes on the same
+    machine.  The OS drops the lock if the holder dies, so there is no stale
+    lock file to clean up after a killed task.
+    """
+    def __init__(self, path, timeout=None, poll=0.5):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self._fh = None
+
+    def acquire(self, blocking=True):
+        fh = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT), 'r+b')
+        started = time.time()
+        while not _try_lock(fh):
+            if not blocking or (self.timeout is not None and
+                                time.time() - started > self.timeout):
+                fh.close()
+                if not blocking:
+                    return False
+                raise LockTimeout("Timed out waiting for %s" % self.path)
+            time.sleep(self.poll)
+        self._fh = fh
+        return True
+
+    def release(self):
+        if self._fh is not None:
+            _unlock(self._fh)
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def _create_hard_link():
+    if hasattr(os, 'link'):
+        return os.link
+    try:
+        # python 2 only has os.link on posix
+        import ctypes
+        CreateHardLinkW = ctypes.windll.kernel32.CreateHardLinkW
+    except (ImportError, AttributeError):
+        return None
+    def link(src, dst):
+        if not CreateHardLinkW(unicode(dst), unicode(src), None):
+            raise OSError(ctypes.GetLastError(), "Could not link %s -> %s" % (src, dst))
+    return link
+
+hard_link = _create_hard_link()
+
+def link_or_copy(src, dst, link=True):
+    """
+    Hardlinks src to dst when possible (same volume), otherwise copies it.
+    Returns True if a link was made.
+    """
+    if link and hard_link is not None:
+        try:
+            hard_link(src, dst)
+            return True
+        except OSError, e:
+            LOG.debug("Copying, could not link %s: %s" % (src, e))
+    shutil.copy2(src, dst)
+    return False
+
+def link_tree(src, dst, link=True, exclude=()):
+    """
+    Mirrors the tree under src into dst with `link_or_copy`, skipping file
+    names in `exclude`.  Returns a (files, bytes) tuple.
+    """
+    files, size = 0, 0
+    for root, dirs, names in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for name in names:
+            if name in exclude:
+                continue
+            path = os.path.join(root, name)
+            link_or_copy(path, os.path.join(target, name), link)
+            files += 1
+            size += os.path.getsize(path)
+    return files, size
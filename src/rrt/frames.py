@@ -0,0 +1,205 @@
+"""
+Frame range helpers shared by the submit tools and hpc-spool.
+
+hpc-spool runs under IronPython, so this module must stay pure python and
+free of anything outside the standard library.
+"""
+import re
+
+AUTO_CHUNK = 'auto'
+
+# automatic chunking aims for this many tasks per render slot so slow frames
+# at the end of a job can still be balanced across the cluster
+AUTO_TASKS_PER_SLOT = 3
+# and never lets a single task hold more than this many frames
+AUTO_MAX_CHUNK = 10
+
+def frame_count(start, end, step=1):
+    """Number of frames rendered for start..end (inclusive) by step."""
+    start, end, step = int(start), int(end), int(step)
+    if end < start:
+        return 0
+    return (end - start) // step + 1
+
+def auto_chunk_size(count, cores, threads=1):
+    """
+    Picks frames per task from the frame count and the cores available.
+    Small jobs get one frame per task (all frames start at once); large jobs
+    pay the scene load once every few frames.
+    """
+    slots = max(1, int(cores) // max(1, int(threads)))
+    chunk = int(count) // (slots * AUTO_TASKS_PER_SLOT)
+    return max(1, min(AUTO_MAX_CHUNK, chunk))
+
+def parse_chunk(value):
+    """
+    Normalizes a chunk setting: AUTO_CHUNK or a positive int.
+    Raises ValueError for anything else.
+    """
+    if str(value).strip().lower() == AUTO_CHUNK:
+        return AUTO_CHUNK
+    chunk = int(value)
+    if chunk < 1:
+        raise ValueError("chunk must be at least 1, got %d" % chunk)
+    return chunk
+
+def chunk_ranges(start, end, step=1, chunk=1):
+    """
+    Splits start..end by step into (first, last) frame pairs holding at most
+    `chunk` frames each.  The final pair is short when the frames don't
+    divide evenly, and `last` is always a frame that would be rendered.
+    """
+    start, end, step, chunk = int(start), int(end), int(step), int(chunk)
+    ranges = []
+    first = start
+    while first <= end:
+        last = min(first + (chunk - 1) * step, end)
+        # keep `last` on the step grid when `end` isn't
+        last -= (last - first) % step
+        ranges.append((first, last))
+        first = last + step
+    return ranges
+
+class FrameSet(object):
+    """
+    A set of frame numbers, written as a comma separated list of frames
+    and ranges with an optional step: ``1-100x2,150,200-230``.
+    """
+    _ITEM = re.compile(r'^(-?\d+)(?:\s*-\s*(-?\d+)(?:\s*[xX:]\s*(\d+))?)?$')
+
+    def __init__(self, frames=()):
+        self._frames = sorted(set([int(f) for f in frames]))
+
+    @classmethod
+    def parse(cls, expression):
+        """Raises ValueError for anything that isn't a frame expression."""
+        frames = set()
+        for item in str(expression).split(','):
+            item = item.strip()
+            if not item:
+                continue
+            match = cls._ITEM.match(item)
+            if not match:
+                raise ValueError("not a frame or frame range: '%s'" % item)
+            first, last, step = match.groups()
+            last = last if last is not None else first
+            step = int(step or 1)
+            if int(last) < int(first) or step < 1:
+                raise ValueError("bad frame range: '%s'" % item)
+            frames.update(range(int(first), int(last) + 1, step))
+        if not frames:
+            raise ValueError("no frames in '%s'" % expression)
+        return cls(frames)
+
+    @classmethod
+    def from_range(cls, start, end, step=1):
+        return cls(range(int(start), int(end) + 1, int(step)))
+
+    def ranges(self, min_run=2):
+        """
+        Splits the set into as few (first, last, step) progressions as it
+        can, greedily.  A run shorter than `min_run` is broken into single
+        frames so that it can't steal the start of a longer run.
+        """
+        frames = self._frames
+        ranges = []
+        i = 0
+        while i < len(frames):
+            j = i + 1
+            if j < len(frames):
+                step = frames[j] - frames[i]
+                while j + 1 < len(frames) and frames[j + 1] - frames[j] == step:
+                    j += 1
+                if j - i + 1 >= max(2, min_run):
+                    ranges.append((frames[i], frames[j], step))
+                    i = j + 1
+                    continue
+            ranges.append((frames[i], frames[i], 1))
+            i += 1
+        return ranges
+
+    @property
+    def first(self):
+        return self._frames[0]
+
+    @property
+    def last(self):
+        return self._frames[-1]
+
+    def __iter__(self):
+        return iter(self._frames)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, frame):
+        return int(frame) in self._frames
+
+    def __eq__(self, other):
+        return isinstance(other, FrameSet) and self._frames == other._frames
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __str__(self):
+        items = []
+        for first, last, step in self.ranges(min_run=3):
+            if first == last:
+                items.append('%d' % first)
+            elif step == 1:
+                items.append('%d-%d' % (first, last))
+            else:
+                items.append('%d-%dx%d' % (first, last, step))
+        return ','.join(items)
+
+    def __repr__(self):
+        return 'FrameSet(%r)' % str(self)
+
+# the order render tasks are handed to the cluster in
+ORDER_ASCENDING = 'ascending'
+# most expensive tasks first (needs per-frame costs, see rrt.planner)
+ORDER_LONGEST = 'longest'
+# coarse to fine preview passes: every 16th frame, then the 8ths between...
+ORDER_INTERLEAVE = 'interleave'
+ORDERS = (ORDER_ASCENDING, ORDER_LONGEST, ORDER_INTERLEAVE)
+
+# the first interleaved pass renders every INTERLEAVE_STRIDE'th frame
+INTERLEAVE_STRIDE = 16
+
+def task_cost(first, last, step, costs, default=0.0):
+    """Summed cost of the frames first..last by step; unknown frames cost `default`."""
+    total = 0.0
+    for frame in range(int(first), int(last) + 1, int(step)):
+        total += costs.get(frame, default)
+    return total
+
+def longest_first(tasks, costs):
+    """
+    Sorts (first, last, step) tasks by their cost, most expensive first.
+    Frames without a cost are assumed to take the median known frame time.
+    """
+    known = sorted(costs.values())
+    default = known and known[len(known) // 2] or 0.0
+    return sorted(tasks, key=lambda t: (-task_cost(t[0], t[1], t[2], costs, default), t[0]))
+
+def interleave(frames, stride=INTERLEAVE_STRIDE):
+    """
+    Splits a FrameSet into coarse to fine passes: every `stride`'th frame,
+    then the frames halfway between those, and so on down to every frame.
+    Each pass halves the gaps left by the ones before it, so the whole
+    shot can be scrubbed (at a lower frame rate) once a pass is done.
+    Returns the non-empty passes as FrameSets.
+    """
+    frames = list(frames)
+    indices = [range(0, len(frames), max(1, int(stride)))]
+    gap = max(1, int(stride))
+    while gap > 1:
+        indices.append(range(gap // 2, len(frames), gap))
+        gap //= 2
+    passes, taken = [], set()
+    for pass_indices in indices + [range(len(frames))]:
+        pass_frames = [frames[i] for i in pass_indices if i not in taken]
+        taken.update(pass_indices)
+        if pass_frames:
+            passes.append(FrameSet(pass_frames))
+    return passes
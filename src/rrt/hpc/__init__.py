@@ -11,4 +11,7 @@ def env():
             'NODE_PROJECT': os.getenv('NODE_PROJECT', None),
             'RENDERER': os.getenv('RENDERER', None),
             'LOGS': os.getenv('LOGS', None),
-            'OUTPUT': os.getenv('OUTPUT', None)}
\ No newline at end of file
+            'OUTPUT': os.getenv('OUTPUT', None),
+            'MANIFEST': os.getenv('MANIFEST', None),
+            'NET_SHARE': os.getenv('NET_SHARE', None),
+            'JOB_UUID': os.getenv('JOB_UUID', None)}
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Streams zip members straight from the project share to the node.
+
+The central directory is read once (through a large read buffer), then a
+pool of threads seek to each member's local header with their own file
+handles and inflate it directly into place - no local copy of the archive.
+"""
+import os, time, struct, zlib, zipfile, threading
+from multiprocessing.pool import ThreadPool
+from rrt import RinglingException
+from rrt.settings import EXTRACT_THREADS, EXTRACT_BUFFER
+from rrt.hpc.scripts import LOG
+
+# zip local file header, see zipfile.structFileHeader
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIGNATURE = "PK\003\004"
+_NAME_LENGTH = 10
+_EXTRA_LENGTH = 11
+
+class ArchiveError(RinglingException): pass
+
+def safe_member_path(dest, name):
+    """
+    Maps an archive member name to a path under dest, dropping drive
+    letters, absolute roots and '..' the same way zipfile.extract does.
+    """
+    parts = [p for p in name.replace('\\', '/').split('/')
+             if p and p not in ('.', '..') and not p.endswith(':')]
+    return os.path.join(dest, *parts)
+
+def _make_dirs(path):
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # another worker made it first
+            if not os.path.isdir(path):
+                raise
+
+class StreamingExtractor(object):
+
+    def __init__(self, source, threads=EXTRACT_THREADS, buffer_size=EXTRACT_BUFFER, infolist=None):
+        self.source = source
+        self.threads = max(1, threads)
+        self.buffer_size = buffer_size
+        self._local = threading.local()
+        self._handles = []
+        self._handles_lock = threading.Lock()
+        self._infolist = infolist
+
+    def infolist(self):
+        """
+        Member info from the central directory (read once, unless it was
+        passed in, e.g. from an `rrt.archiveindex.ArchiveIndex`).
+        """
+        if self._infolist is None:
+            fh = open(self.source, 'rb', self.buffer_size)
+            try:
+                zf = zipfile.ZipFile(fh)
+                self._infolist = zf.infolist()
+                zf.close()
+            finally:
+                fh.close()
+        return self._infolist
+
+    def _handle(self):
+        fh = getattr(self._local, 'fh', None)
+        if fh is None:
+            fh = self._local.fh = open(self.source, 'rb', self.buffer_size)
+            with self._handles_lock:
+                self._handles.append(fh)
+        return fh
+
+    def _close_handles(self):
+        with self._handles_lock:
+            for fh in self._handles:
+                fh.close()
+            self._handles = []
+        self._local = threading.local()
+
+    def _open_member(self, fh, info):
+        fh.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(fh.read(_LOCAL_HEADER.size))
+        if header[0] != _LOCAL_SIGNATURE:
+            raise ArchiveError("Bad local header for %s in %s" % (info.filename, self.source))
+        fh.seek(header[_NAME_LENGTH] + header[_EXTRA_LENGTH], os.SEEK_CUR)
+
+    def _extract_member(self, info, dest):
+        target = safe_member_path(dest, info.filename)
+        if info.filename.endswith('/'):
+            _make_dirs(target)
+            return 0
+        _make_dirs(os.path.dirname(target))
+        if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            # encrypted or unusual compression, let zipfile deal with it
+            zf = zipfile.ZipFile(self._handle())
+            with open(target, 'wb') as out:
+                out.write(zf.read(info))
+            return info.file_size
+        fh = self._handle()
+        self._open_member(fh, info)
+        inflater = None
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            inflater = zlib.decompressobj(-15)
+        crc = 0
+        remaining = info.compress_size
+        with open(target, 'wb', self.buffer_size) as out:
+            while remaining > 0:
+                block = fh.read(min(self.buffer_size, remaining))
+                if not block:
+                    raise ArchiveError("%s is truncated" % self.source)
+                remaining -= len(block)
+                if inflater is not None:
+                    block = inflater.decompress(block)
+                crc = zlib.crc32(block, crc)
+                out.write(block)
+            if inflater is not None:
+                block = inflater.flush()
+                crc = zlib.crc32(block, crc)
+                out.write(block)
+        if crc & 0xffffffff != info.CRC:
+            raise ArchiveError("Bad CRC for %s in %s" % (info.filename, self.source))
+        return info.file_size
+
+    def extract(self, dest, names=None):
+        """
+        Extracts every member (or only those in `names`) under dest.
+        Returns a dict with the bytes/files extracted and elapsed seconds.
+        """
+        members = self.infolist()
+        if names is not None:
+            wanted = set([n.replace('\\', '/').lower() for n in names])
+            members = [m for m in members if m.filename.lower() in wanted]
+            missing = len(wanted) - len(members)
+            if missing:
+                LOG.warning("%d manifest entries are not in %s" % (missing, self.source))
+        started = time.time()
+        pool = ThreadPool(self.threads)
+        try:
+            sizes = pool.map(lambda m: self._extract_member(m, dest), members, 1)
+        finally:
+            pool.close()
+            pool.join()
+            self._close_handles()
+        elapsed = max(time.time() - started, 1e-6)
+        files = len([m for m in members if not m.filename.endswith('/')])
+        stats = {'files': files, 'bytes': sum(sizes), 'seconds': elapsed}
+        LOG.info("Extracted %d files (%0.1f MB) in %0.1fs: %0.1f MB/s, %0.1f files/s" %
+                 (stats['files'], stats['bytes'] / (1024 * 1024.0), elapsed,
+                  stats['bytes'] / (1024 * 1024.0) / elapsed, stats['files'] / elapsed))
+        return stats
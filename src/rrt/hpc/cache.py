@@ -0,0 +1,267 @@
+"""
+Node local, content addressed cache for project data.
+
+Entries live under `rrt.settings.NODE_CACHE_DIR` as::
+
+    <key>/tree/...      the cached files
+    <key>/entry.json    written last; its mtime is the entry's last use
+    <key>.lock          held while an entry is filled, used or evicted
+
+Jobs on the same node share entries, and NODE_PROJECT gets copies (or,
+with NODE_CACHE_HARDLINKS, hardlinks) of a cached tree instead of another
+trip to the file server.  entry.json records every cached file's size and
+mtime, and an entry whose files don't match any more is filled again.
+
+`BlobCache` keeps single files from the asset store (see `rrt.assetstore`)
+the same way, under `rrt.settings.NODE_BLOB_DIR`.
+"""
+import os, json, hashlib, shutil, binascii
+from rrt.settings import NODE_CACHE_DIR, NODE_CACHE_BUDGET, NODE_CACHE_HARDLINKS, \
+    NODE_BLOB_DIR, NODE_BLOB_BUDGET
+from rrt.filesystem import FileLock, link_tree, link_or_copy
+from rrt.assetstore import AssetStore
+from rrt.hpc.scripts import LOG
+from rrt.hpc import fanout
+
+# bytes hashed from the end of an archive, which covers the zip central
+# directory (names, sizes and crcs of every member) for typical projects
+KEY_TAIL_BYTES = 64 * 1024
+
+def archive_key(path):
+    """
+    Keys an archive by size + mtime + a hash of its tail, without reading
+    the whole file over the network.
+    """
+    st = os.stat(path)
+    digest = hashlib.sha1("%d:%d:" % (st.st_size, int(st.st_mtime)))
+    with open(path, 'rb') as fh:
+        fh.seek(max(0, st.st_size - KEY_TAIL_BYTES))
+        digest.update(fh.read(KEY_TAIL_BYTES))
+    return digest.hexdigest()
+
+def _tree_stats(path):
+    """{relative path: [size, mtime]} for every file under path."""
+    found = {}
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            found[os.path.relpath(full, path)] = [st.st_size, int(st.st_mtime)]
+    return found
+
+class NodeCache(object):
+
+    def __init__(self, root=NODE_CACHE_DIR, budget=NODE_CACHE_BUDGET,
+                 hardlinks=NODE_CACHE_HARDLINKS):
+        self.root = root
+        self.budget = budget
+        self.hardlinks = hardlinks
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _marker(self, key):
+        return os.path.join(self._entry_dir(key), 'entry.json')
+
+    def _lock(self, key):
+        return FileLock(self._entry_dir(key) + '.lock')
+
+    def _fill(self, key, populate):
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            # left over from a fill that didn't finish
+            shutil.rmtree(entry_dir)
+        tree = os.path.join(entry_dir, 'tree')
+        os.makedirs(tree)
+        populate(tree)
+        stats = _tree_stats(tree)
+        files, size = len(stats), sum([s for s, m in stats.values()])
+        with open(self._marker(key), 'wb') as fh:
+            json.dump({'files': files, 'bytes': size, 'tree': stats}, fh)
+        LOG.info("Cached %d files (%0.1f MB) as %s" % (files, size / (1024 * 1024.0), key))
+
+    def _intact(self, key):
+        """Whether an entry's files are still the size and mtime they were cached at."""
+        try:
+            with open(self._marker(key), 'rb') as fh:
+                recorded = json.load(fh).get('tree')
+        except (IOError, OSError, ValueError):
+            return False
+        return recorded == _tree_stats(os.path.join(self._entry_dir(key), 'tree'))
+
+    def fetch(self, key, populate, dest):
+        """
+        Materializes the entry for `key` into `dest`.  On a miss,
+        `populate(path)` is called to fill the entry first.
+        Returns True on a cache hit.
+        """
+        with self._lock(key):
+            marker = self._marker(key)
+            hit = os.path.isfile(marker)
+            if hit and not self._intact(key):
+                # e.g. a render rewrote a hardlinked project file in place
+                LOG.warning("Node cache entry %s has changed since it was cached" % key)
+                hit = False
+            if hit:
+                LOG.info("Node cache hit: %s" % key)
+                os.utime(marker, None)
+            else:
+                LOG.info("Node cache miss: %s" % key)
+                self._fill(key, populate)
+            files, size = link_tree(os.path.join(self._entry_dir(key), 'tree'),
+                                    dest, self.hardlinks)
+            LOG.debug("Materialized %d files (%d bytes) in %s" % (files, size, dest))
+        self.evict(keep=key)
+        return hit
+
+    def entries(self):
+        """Returns (last_used, bytes, key) for every complete entry."""
+        found = []
+        for key in os.listdir(self.root):
+            marker = self._marker(key)
+            if not os.path.isfile(marker):
+                continue
+            try:
+                with open(marker, 'rb') as fh:
+                    size = json.load(fh)['bytes']
+                found.append((os.path.getmtime(marker), size, key))
+            except Exception, e:
+                LOG.debug("Skipping cache entry %s: %s" % (key, e))
+        return found
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used entries until the cache fits the budget.
+        Entries in use by another job (locked) are skipped.
+        """
+        found = sorted(self.entries())
+        total = sum([size for used, size, key in found])
+        for used, size, key in found:
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            lock = self._lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                LOG.info("Evicting cache entry %s (%0.1f MB)" % (key, size / (1024 * 1024.0)))
+                # drop the marker first so a partial delete reads as a miss
+                os.remove(self._marker(key))
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                total -= size
+            finally:
+                lock.release()
+
+class BlobCache(object):
+    """
+    Node local copies of asset store blobs, shared by every job on a node.
+    A blob's mtime is its last use.  Each blob has its own lock, held while
+    it's written into the cache or evicted, so jobs only wait for each other
+    on the same blob.  Blobs missing from the node come from `peers` (see
+    `rrt.hpc.fanout`) when the job has any, else from the store.
+    """
+
+    def __init__(self, store=None, root=NODE_BLOB_DIR, budget=NODE_BLOB_BUDGET,
+                 hardlinks=NODE_CACHE_HARDLINKS, peers=None):
+        self.store = store or AssetStore()
+        self.peers = peers if peers is not None else fanout.current()
+        self.root = root
+        self.budget = budget
+        self.hardlinks = hardlinks
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+    def _lock(self, digest):
+        return FileLock(self.path(digest) + '.lock')
+
+    def path(self, digest):
+        return fanout.blob_path(self.root, digest)
+
+    def _fetch(self, digest):
+        """Returns (local path, bytes fetched)."""
+        local = self.path(digest)
+        if os.path.isfile(local):
+            os.utime(local, None)
+            return local, 0
+        if not os.path.isdir(os.path.dirname(local)):
+            os.makedirs(os.path.dirname(local))
+        with self._lock(digest):
+            if os.path.isfile(local):
+                # another job fetched it while this one waited
+                os.utime(local, None)
+                return local, 0
+            part = '%s.%s.part' % (local, binascii.hexlify(os.urandom(4)))
+            if self.peers is None or not self.peers.fetch(digest, part):
+                shutil.copyfile(self.store.blob_path(digest), part)
+            os.rename(part, local)
+        return local, os.path.getsize(local)
+
+    def _link(self, digest, target):
+        """Links a fetched blob to target; returns the bytes fetched again, if
+        another job evicted it in between."""
+        try:
+            link_or_copy(self.path(digest), target, self.hardlinks)
+            return 0
+        except (IOError, OSError):
+            if os.path.isfile(self.path(digest)):
+                raise
+        local, fetched = self._fetch(digest)
+        link_or_copy(local, target, self.hardlinks)
+        return fetched
+
+    def materialize(self, blobs, dest):
+        """
+        Links (or copies) each (digest, relative path) in `blobs` into dest,
+        fetching what isn't on the node yet.  Returns a dict of hits,
+        misses and bytes fetched.
+        """
+        stats = {'blob_hits': 0, 'blob_misses': 0, 'bytes_fetched': 0}
+        for digest, rel in blobs:
+            local, fetched = self._fetch(digest)
+            if fetched:
+                stats['blob_misses'] += 1
+                stats['bytes_fetched'] += fetched
+            else:
+                stats['blob_hits'] += 1
+            target = os.path.join(dest, rel)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            if os.path.exists(target):
+                os.remove(target)
+            stats['bytes_fetched'] += self._link(digest, target)
+        self._evict()
+        LOG.info("Blob cache: %(blob_hits)d hits, %(blob_misses)d misses, "
+                 "%(bytes_fetched)d bytes fetched" % stats)
+        return stats
+
+    def _evict(self):
+        found = []
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                if name.endswith('.part') or name.endswith('.lock'):
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, st.st_size, path))
+        total = sum([size for used, size, blob in found])
+        for used, size, path in sorted(found):
+            if total <= self.budget:
+                break
+            # skip blobs another job is writing
+            lock = self._lock(os.path.basename(path))
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                LOG.debug("Evicting blob %s" % os.path.basename(path))
+                os.remove(path)
+                total -= size
+            except OSError, e:
+                LOG.debug("Could not evict %s: %s" % (path, e))
+            finally:
+                lock.release()
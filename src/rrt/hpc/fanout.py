@@ -0,0 +1,367 @@
+"""
+Peer to peer fan out of asset store files between the nodes of a job.
+
+When a job starts, every node's prep asks the file server for the same
+files at the same moment.  With fan out only the first FANOUT_SEEDS nodes
+fetch from the asset store (see `rrt.assetstore`); the rest fetch from nodes
+that already have the files, so the number of sources grows as nodes get
+through prep instead of every node queueing on one server.
+
+Nodes find each other through the job's coordination directory on the log
+share, ``<job log dir>/peers/<node>.json``, where each node writes only its
+own file.  Each node serves its blob cache (see `rrt.hpc.cache.BlobCache`)
+from a small HTTP server, shared by every job on the node, which exits
+after FANOUT_IDLE seconds without a request::
+
+    GET /ping               is the server up
+    GET /blobs/<sha1>       a blob; 404 if the node doesn't have it, 503 if busy
+
+Downloads are checked against their sha1 name, so a bad peer only costs a
+fetch from the store, never a bad file.
+"""
+import os, sys, json, time, random, socket, shutil, hashlib, threading, urllib2
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from optparse import OptionParser
+from rrt.assetstore import is_blob_name
+from rrt.filesystem import FileLock
+from rrt.settings import NODE_BLOB_DIR, FANOUT_PORT, FANOUT_SEEDS, FANOUT_WAIT, \
+    FANOUT_MAX_CLIENTS, FANOUT_IDLE, EXTRACT_BUFFER
+from rrt.hpc.scripts import LOG, spawn_detached
+
+PEERS_DIR = 'peers'
+STATE_FETCHING = 'fetching'
+STATE_COMPLETE = 'complete'
+# seconds to wait on one peer before trying the next
+PEER_TIMEOUT = 30
+# seconds between looks at the coordination directory while waiting
+POLL = 2.0
+
+def blob_path(root, digest):
+    """Where a blob lives in a node's blob cache."""
+    return os.path.join(root, digest[:2], digest)
+
+def _write_json(path, data):
+    # readers on other nodes must never see half a file
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as fh:
+        json.dump(data, fh)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+
+class _BlobHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        server.touch()
+        if self.path == '/ping':
+            return self._reply(200, 'rrt')
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'blobs' or not is_blob_name(parts[1]):
+            return self._reply(404, 'not found')
+        if not server.enter():
+            return self._reply(503, 'busy')
+        try:
+            try:
+                fh = open(blob_path(server.root, parts[1]), 'rb')
+            except IOError:
+                return self._reply(404, 'not found')
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(os.fstat(fh.fileno()).st_size))
+                self.end_headers()
+                shutil.copyfileobj(fh, self.wfile, EXTRACT_BUFFER)
+            finally:
+                fh.close()
+        finally:
+            server.leave()
+
+    def _reply(self, code, text):
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, format, *args):
+        LOG.debug("%s %s" % (self.client_address[0], format % args))
+
+class BlobServer(ThreadingMixIn, HTTPServer):
+    """Serves a node's blob cache to the other nodes of its jobs."""
+    daemon_threads = True
+
+    def __init__(self, root=NODE_BLOB_DIR, port=FANOUT_PORT, host=None,
+                 max_clients=FANOUT_MAX_CLIENTS, idle=FANOUT_IDLE):
+        HTTPServer.__init__(self, ('', port), _BlobHandler)
+        self.root = root
+        self.host = host or socket.gethostname()
+        self.max_clients = max_clients
+        self.idle = idle
+        self._active = 0
+        self._lock = threading.Lock()
+        self.last_request = time.time()
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % (self.host, self.server_address[1])
+
+    def touch(self):
+        self.last_request = time.time()
+
+    def enter(self):
+        with self._lock:
+            if self._active >= self.max_clients:
+                return False
+            self._active += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._active -= 1
+        self.touch()
+
+    def _watch(self):
+        while True:
+            time.sleep(min(self.idle, 5))
+            if not self._active and time.time() - self.last_request > self.idle:
+                LOG.info("Blob server idle for %ds, stopping." % self.idle)
+                self.shutdown()
+                return
+
+    def serve_until_idle(self):
+        watcher = threading.Thread(target=self._watch)
+        watcher.setDaemon(True)
+        watcher.start()
+        self.serve_forever(poll_interval=0.5)
+
+def _state_file(root):
+    return root + '.server.json'
+
+def ping(url, timeout=2):
+    try:
+        return urllib2.urlopen(url + '/ping', timeout=timeout).read() == 'rrt'
+    except (urllib2.URLError, socket.error, IOError):
+        return False
+
+def server_url(root=NODE_BLOB_DIR):
+    """The url of the node's running blob server, or None."""
+    try:
+        with open(_state_file(root), 'rb') as fh:
+            url = json.load(fh)['url']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    return url if ping(url) else None
+
+def ensure_server(root=NODE_BLOB_DIR, port=FANOUT_PORT, host=None, wait=10):
+    """
+    Returns the url of the node's blob server, starting one (as a process
+    that outlives this task) if it isn't running.
+    """
+    url = server_url(root)
+    if url:
+        return url
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    with FileLock(root + '.server.lock'):
+        url = server_url(root)
+        if url:
+            return url
+        cmd = [sys.executable, '-m', 'rrt.hpc.fanout', '--root', root, '--port', str(port)]
+        if host:
+            cmd.extend(['--host', host])
+        LOG.info("Starting blob server for %s" % root)
+        spawn_detached(cmd)
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(0.1)
+            url = server_url(root)
+            if url:
+                return url
+    raise RuntimeError("Blob server for %s didn't start" % root)
+
+class Swarm(object):
+    """One node's view of the other nodes prepping the same job."""
+
+    def __init__(self, coordination, node, url, seeds=FANOUT_SEEDS, wait=FANOUT_WAIT):
+        self.coordination = coordination
+        self.node = node
+        self.url = url
+        self.seeds = seeds
+        self.wait = wait
+        self.seed = False
+        self.deadline = None
+        self.stats = {'peer_fetches': 0, 'peer_bytes': 0}
+
+    def _path(self, node):
+        return os.path.join(self.coordination, node + '.json')
+
+    def _write(self, state):
+        if not os.path.isdir(self.coordination):
+            try:
+                os.makedirs(self.coordination)
+            except OSError:
+                if not os.path.isdir(self.coordination):
+                    raise
+        _write_json(self._path(self.node), {'node': self.node, 'url': self.url,
+                                            'state': state, 'time': time.time()})
+
+    def peers(self):
+        """The other nodes that have joined, as dicts of node, url and state."""
+        found = []
+        try:
+            names = os.listdir(self.coordination)
+        except OSError:
+            return found
+        for name in names:
+            if not name.endswith('.json') or name == self.node + '.json':
+                continue
+            try:
+                with open(os.path.join(self.coordination, name), 'rb') as fh:
+                    found.append(json.load(fh))
+            except (IOError, OSError, ValueError), e:
+                LOG.debug("Skipping peer %s: %s" % (name, e))
+        return found
+
+    def join(self):
+        # the first few nodes to get here fetch from the store
+        self.seed = len(self.peers()) < self.seeds
+        self._write(STATE_FETCHING)
+        self.deadline = time.time() + self.wait
+        LOG.info("Joined %s as %s (%s)" % (self.coordination, self.url,
+                 'fetching from the store' if self.seed else 'fetching from peers'))
+
+    def complete(self):
+        self._write(STATE_COMPLETE)
+
+    def leave(self):
+        try:
+            os.remove(self._path(self.node))
+        except OSError:
+            pass
+
+    def _download(self, url, digest, dest):
+        """Returns the bytes downloaded, or None if the peer couldn't help."""
+        try:
+            response = urllib2.urlopen('%s/blobs/%s' % (url, digest), timeout=PEER_TIMEOUT)
+        except (urllib2.URLError, socket.error, IOError), e:
+            LOG.debug("%s can't send %s: %s" % (url, digest, e))
+            return None
+        check = hashlib.sha1()
+        size = 0
+        try:
+            with open(dest, 'wb') as fh:
+                while True:
+                    data = response.read(EXTRACT_BUFFER)
+                    if not data:
+                        break
+                    check.update(data)
+                    fh.write(data)
+                    size += len(data)
+        except (socket.error, IOError), e:
+            LOG.debug("Download of %s from %s failed: %s" % (digest, url, e))
+            return None
+        finally:
+            response.close()
+        if check.hexdigest() != digest:
+            LOG.warning("%s sent a bad copy of %s" % (url, digest))
+            os.remove(dest)
+            return None
+        return size
+
+    def fetch(self, digest, dest):
+        """
+        Downloads a blob from a peer into dest, waiting (until the swarm's
+        deadline) while peers that might get it are still fetching.
+        Returns False when the blob should come from the store instead.
+        """
+        if self.seed:
+            return False
+        while True:
+            peers = self.peers()
+            complete = [p for p in peers if p.get('state') == STATE_COMPLETE]
+            fetching = [p for p in peers if p.get('state') != STATE_COMPLETE]
+            # spread the load: any complete node first, then anyone
+            random.shuffle(complete)
+            random.shuffle(fetching)
+            for peer in complete + fetching:
+                size = self._download(peer['url'], digest, dest)
+                if size is not None:
+                    self.stats['peer_fetches'] += 1
+                    self.stats['peer_bytes'] += size
+                    return True
+            if not fetching or time.time() >= self.deadline:
+                return False
+            time.sleep(POLL)
+
+_swarm = None
+
+def current():
+    """The swarm joined by this prep, if any."""
+    return _swarm
+
+def join(log_dir, node=None, root=NODE_BLOB_DIR):
+    """
+    Joins the swarm of the job whose logs are in log_dir.  Returns the Swarm,
+    or None if this node can't serve (the job still preps from the store).
+    """
+    global _swarm
+    try:
+        url = ensure_server(root)
+        _swarm = Swarm(os.path.join(log_dir, PEERS_DIR), node or socket.gethostname(), url)
+        _swarm.join()
+    except Exception, e:
+        LOG.warning("Not sharing files with other nodes: %s" % e)
+        _swarm = None
+    return _swarm
+
+def finish(ok=True):
+    """
+    Tells the other nodes this one has everything (or leaves the swarm if
+    prep failed).  Returns the peer download counts.
+    """
+    global _swarm
+    swarm, _swarm = _swarm, None
+    if swarm is None:
+        return {}
+    try:
+        if ok:
+            swarm.complete()
+        else:
+            swarm.leave()
+    except (IOError, OSError), e:
+        LOG.warning("Could not update %s: %s" % (swarm.coordination, e))
+    return dict(swarm.stats)
+
+def leave(log_dir, node=None):
+    """Removes this node from a job's swarm, at release."""
+    Swarm(os.path.join(log_dir, PEERS_DIR), node or socket.gethostname(), None).leave()
+
+def main(argv=None):
+    """
+    Runs a node's blob server: ``python -m rrt.hpc.fanout``, started by
+    `ensure_server`.
+    """
+    parser = OptionParser(usage="%prog [--root DIR] [--port N] [--host NAME]")
+    parser.add_option('--root', default=NODE_BLOB_DIR)
+    parser.add_option('--port', type='int', default=FANOUT_PORT)
+    parser.add_option('--host', default=None)
+    parser.add_option('--idle', type='int', default=FANOUT_IDLE)
+    options, args = parser.parse_args(argv)
+    server = BlobServer(options.root, options.port, options.host, idle=options.idle)
+    state = _state_file(options.root)
+    _write_json(state, {'pid': os.getpid(), 'url': server.url})
+    LOG.info("Serving %s at %s" % (options.root, server.url))
+    try:
+        server.serve_until_idle()
+    finally:
+        try:
+            with open(state, 'rb') as fh:
+                if json.load(fh).get('pid') == os.getpid():
+                    os.remove(state)
+        except (IOError, OSError, ValueError):
+            pass
+
+if '__main__' == __name__:
+    main()
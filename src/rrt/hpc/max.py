@@ -1,27 +1,88 @@
 """
 Node Prep/Release script entry points for jobs ran with `3dsmaxcmd.exe ...`
-In Max jobs, PROJECT is a path to an archive zip file, which we extract to the 
+In Max jobs, PROJECT is a path to an archive zip file, which we extract to the
 NODE_PROJECT directory.
 """
 
-import os, tempfile, zipfile
-from shutil import copyfile
+import os, hashlib
 from rrt.hpc import env
 from rrt.hpc.scripts import LOG
+from rrt.hpc.cache import NodeCache, BlobCache, archive_key
+from rrt.hpc.archive import StreamingExtractor, safe_member_path
+from rrt.manifest import manifest_paths, read_manifest
+from rrt.archiveindex import ArchiveIndex
+from rrt.settings import NODE_ARCHIVE_INDEX_DIR
 ENV = env()
 
+def _stored_members():
+    """
+    [(blob, member name)] when every file in the job's manifest is in the
+    asset store, otherwise None.
+    """
+    if not ENV['MANIFEST']:
+        return None
+    entries = read_manifest(ENV['MANIFEST'])
+    if not entries or [e for e in entries if not e.get('blob')]:
+        return None
+    return [(e['blob'], e['path']) for e in entries]
+
+def _prep_from_store(blobs):
+    """
+    Builds the project from asset store blobs instead of the archive: the
+    node cache entry is keyed by contents, so a re-zipped archive with the
+    same files is still a hit.  files_extracted counts the files linked
+    or copied into NODE_PROJECT; blob hits and misses (and bytes fetched)
+    are only counted by the job that filled the entry.
+    """
+    key = hashlib.sha1('\n'.join(['%s %s' % b for b in sorted(blobs)])).hexdigest()
+    stats = {'blob_hits': 0, 'blob_misses': 0, 'bytes_fetched': 0}
+    def populate(dest):
+        paths = [(blob, os.path.relpath(safe_member_path(dest, name), dest))
+                 for blob, name in blobs]
+        stats.update(BlobCache().materialize(paths, dest))
+    hit = NodeCache().fetch(key, populate, ENV['NODE_PROJECT'])
+    return {'cache_hit': hit, 'files_extracted': len(blobs), 'blob_hits': stats['blob_hits'],
+            'blob_misses': stats['blob_misses'], 'bytes_fetched': stats['bytes_fetched']}
+
+def _wanted_members():
+    """
+    Archive members listed in the job's manifest (plus the scene itself),
+    or None to extract everything.
+    """
+    if not ENV['MANIFEST']:
+        return None
+    names = manifest_paths(ENV['MANIFEST'])
+    names.add(ENV['SCENE'])
+    LOG.info("Extracting %d members listed in %s" % (len(names), ENV['MANIFEST']))
+    return sorted(names)
+
 def prep():
-    with tempfile.NamedTemporaryFile(dir=ENV['NODE_PROJECT'], 
-                                     prefix='max', suffix='.zip') as tmp:
-        # I'm just using tempfile to generate a name, we don't want to keep 
-        # the tempfile
-        tmpzip = tmp.name
-        tmp.close() # file is deleted when closed
-    copyfile(ENV['PROJECT'], tmpzip)
-    os.chdir(ENV['NODE_PROJECT'])
-    zipfile.ZipFile(tmpzip).extractall()
-    os.remove(tmpzip)
+    blobs = _stored_members()
+    if blobs is not None:
+        LOG.info("Building the project from %d asset store files" % len(blobs))
+        return _prep_from_store(blobs)
+    names = _wanted_members()
+    # every job on the node from the same archive shares its member list
+    index = ArchiveIndex(NODE_ARCHIVE_INDEX_DIR)
+    for problem in index.problems(ENV['PROJECT']):
+        # the extraction itself fails if one of these really is fatal
+        LOG.warning(problem)
+    key = archive_key(ENV['PROJECT'])
+    extractor = StreamingExtractor(ENV['PROJECT'], infolist=index.infolist(ENV['PROJECT']))
+    if names is not None and set(names).issuperset(index.names(ENV['PROJECT'])):
+        # manifests from the submit window list the whole archive
+        names = None
+    if names is not None:
+        # a partial extraction is its own cache entry
+        key = hashlib.sha1(key + '\n'.join(names)).hexdigest()
+    stats = {'files': 0, 'bytes': 0}
+    def populate(dest):
+        stats.update(extractor.extract(dest, names))
+    # archives are extracted once per node, then linked into each job
+    hit = NodeCache().fetch(key, populate, ENV['NODE_PROJECT'])
     # from here, we will render using %NODE_PROJECT%\\sceneName.max
-    
+    return {'cache_hit': hit, 'files_extracted': stats['files'],
+            'bytes_extracted': stats['bytes']}
+
 def release():
     pass
@@ -0,0 +1,78 @@
+"""
+Maya dirmap rules for jobs rendering from a node local project.
+
+Scenes reference files by their project share paths (and, from older
+workspaces, by ``//dirname`` style paths), which have to be mapped back
+onto the share for anything that wasn't synced to the node.  Working the
+rules out means listing the project root over smb, so it is done once per
+node in prep and saved to ``DIRMAP_FILE`` in the node project, where the
+userSetup.mel startup script picks it up for every Render.exe launch.
+"""
+import os, json
+from rrt import get_log
+# also imported by the maya startup script, so it doesn't use the prep log
+LOG = get_log(__name__)
+
+DIRMAP_FILE = 'dirmap.json'
+
+posix = lambda s: s.replace('\\', '/')
+
+def project_dirs(project):
+    """
+    Names of the directories in the project root: a listing and a stat per
+    entry, all over smb, so only prep should call this.
+    """
+    names = []
+    for name in os.listdir(project):
+        if os.path.isdir(os.path.join(project, name)):
+            names.append(name)
+    return sorted(names)
+
+def dirmap_rules(project, node_project, names):
+    """
+    Returns the (from, to) dirmap pairs for a project and its top level
+    directory `names`.  Rules with a source already mapped (paths compare
+    case insensitively, as maya does on windows) or that map a path onto
+    itself are left out.
+    """
+    proj = posix(project).rstrip('/')
+    node_proj = posix(node_project).rstrip('/')
+    pairs = [(node_proj, proj)]
+    for name in names:
+        full = proj + '/' + name
+        pairs.append(('//' + name, full))
+        pairs.append((node_proj + '/' + name, full))
+        pairs.append((node_proj + '//' + name, full))
+    rules, seen = [], set()
+    for src, dst in pairs:
+        key = src.lower()
+        if key in seen or key == dst.lower():
+            continue
+        seen.add(key)
+        rules.append((src, dst))
+    return rules
+
+def write_dirmap(project, node_project):
+    """Works out the job's dirmap rules and saves them in the node project."""
+    rules = dirmap_rules(project, node_project, project_dirs(project))
+    path = os.path.join(node_project, DIRMAP_FILE)
+    with open(path, 'wb') as fh:
+        json.dump({'project': project, 'rules': rules}, fh, indent=1)
+    LOG.debug("Wrote %d dirmap rules to %s" % (len(rules), path))
+    return rules
+
+def load_dirmap(project, node_project):
+    """
+    The rules saved by prep, or worked out from the share if prep didn't
+    save any (a node prepped by an older release).
+    """
+    path = os.path.join(node_project, DIRMAP_FILE)
+    try:
+        with open(path, 'rb') as fh:
+            data = json.load(fh)
+        if data.get('project') == project:
+            return [tuple(pair) for pair in data['rules']]
+        LOG.warning("%s is for %s, not %s" % (path, data.get('project'), project))
+    except (IOError, OSError, ValueError, KeyError), e:
+        LOG.warning("No saved dirmap (%s), listing %s" % (e, project))
+    return dirmap_rules(project, node_project, project_dirs(project))
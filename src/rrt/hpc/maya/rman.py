@@ -8,7 +8,7 @@ Right now, we don't have any renderman specific tasks to execute, but we do
 need to make sure all the maya.sw stuff happens regardless.
 """
 def prep():
-    sw_prep()
+    return sw_prep()
 
 def release():
     sw_release()
\ No newline at end of file
@@ -1,4 +1,3 @@
-import os
 import rrt
 LOG = rrt.get_log()
 LOG.info("Starting %s" % rrt.get_version())
@@ -8,21 +7,10 @@ ENV = env()
 
 from maya import cmds
 
-posix = lambda s: s.replace('\\', '/')
+from rrt.hpc.maya.dirmap import load_dirmap
 
-proj = posix(ENV['PROJECT'])
-node_proj = posix(ENV['NODE_PROJECT'])
-
-map_pairs = [
-    (node_proj, proj),
-]
-
-for name in os.listdir(ENV['PROJECT']):
-    full = os.path.join(ENV['PROJECT'], name)
-    if os.path.isdir(full):
-        map_pairs.append(('//'+name, posix(full)))
-        map_pairs.append((node_proj+'/'+name, posix(full)))
-        map_pairs.append((node_proj+'//'+name, posix(full)))
+# worked out once per node by prep, see rrt.hpc.maya.dirmap
+map_pairs = load_dirmap(ENV['PROJECT'], ENV['NODE_PROJECT'])
 
 LOG.debug("Dirmaps:")
 for m in map_pairs:
@@ -2,11 +2,43 @@
 Node Prep/Release script entry points for jobs ran with `Render.exe -r sw ...`
 """
 import os
-from shutil import copyfile, copytree
+from shutil import copyfile
 from rrt.hpc import env
 from rrt.hpc.scripts import LOG
+from rrt.hpc.sync import sync_tree, link_mirror, mirror_dir, prune_mirrors
+from rrt.hpc.maya.dirmap import write_dirmap
+from rrt.hpc.cache import BlobCache
+from rrt.filesystem import FileLock
+from rrt.manifest import read_manifest
+from rrt.settings import SYNC_INCLUDE, NODE_CACHE_HARDLINKS
 ENV = env()
 
+def _manifest_files():
+    """
+    The project files listed in the job's manifest, as ({relative path: 
+    hash}, [relative paths], [(blob, relative path)]); files in the asset 
+    store are only in the last list.  Files outside the project are read 
+    from the share at render time, like before.
+    """
+    if not ENV['MANIFEST']:
+        return {}, [], []
+    project = os.path.normcase(os.path.normpath(ENV['PROJECT']))
+    hashes, files, blobs = {}, [], []
+    for entry in read_manifest(ENV['MANIFEST']):
+        path = os.path.normpath(entry['path'])
+        if not os.path.normcase(path).startswith(project + os.sep):
+            continue
+        rel = path[len(project) + 1:]
+        if entry.get('blob'):
+            blobs.append((entry['blob'], rel))
+            continue
+        files.append(rel)
+        if entry.get('hash'):
+            hashes[rel] = entry['hash']
+    LOG.info("%d project files listed in %s, %d in the asset store" % (
+             len(files) + len(blobs), ENV['MANIFEST'], len(blobs)))
+    return hashes, files, blobs
+
 def _setup_node_project():
     LOG.info("Setting up node project directory: %s" % ENV['NODE_PROJECT'])
     if not os.path.isdir(ENV['NODE_PROJECT']):
@@ -18,13 +50,24 @@ def _setup_node_project():
     LOG.debug("node local workspace:")
     LOG.debug(open(dst).read())
     
-    LOG.info("Copying any fur data...")
-    for name in os.listdir(ENV['PROJECT']):
-        src = os.path.join(ENV['PROJECT'], name)
-        if name.startswith('fur') and os.path.isdir(src):
-            dst = os.path.join(ENV['NODE_PROJECT'], name)
-            copytree(src, dst)
-            LOG.debug("File copied: %s -> %s" % (src,dst))
+    LOG.info("Syncing project data matching %s..." % ';'.join(SYNC_INCLUDE))
+    prune_mirrors()
+    # the mirror outlives the job, so later jobs only copy what changed
+    mirror = mirror_dir('%s|%s' % (ENV['NET_SHARE'], ENV['PROJECT']))
+    if not os.path.isdir(mirror):
+        os.makedirs(mirror)
+    hashes, files, blobs = _manifest_files()
+    with FileLock(mirror + '.lock'):
+        stats = sync_tree(ENV['PROJECT'], mirror, SYNC_INCLUDE, hashes, files=files)
+        # not the files other jobs' manifests brought into the mirror
+        linked, size = link_mirror(mirror, ENV['NODE_PROJECT'], SYNC_INCLUDE, files,
+                                   NODE_CACHE_HARDLINKS)
+        LOG.debug("Linked %d files from %s" % (linked, mirror))
+    if blobs:
+        blob_stats = BlobCache().materialize(blobs, ENV['NODE_PROJECT'])
+        stats['copied_files'] += blob_stats['blob_misses']
+        stats['copied_bytes'] += blob_stats['bytes_fetched']
+    return stats
 
 def _create_startup_script():
     dst = os.path.join(ENV['NODE_PROJECT'],'scripts','userSetup.mel')
@@ -36,8 +79,11 @@ def _create_startup_script():
 
 
 def prep():
-    _setup_node_project()
+    stats = _setup_node_project()
+    rules = write_dirmap(ENV['PROJECT'], ENV['NODE_PROJECT'])
     _create_startup_script()
+    return {'files_copied': stats['copied_files'], 'bytes_copied': stats['copied_bytes'],
+            'dirmap_rules': len(rules)}
 
 
 def release():pass
@@ -0,0 +1,189 @@
+"""
+Deletes node project directories, counting what was removed on the way.
+
+The tree is walked once: each file is measured and removed in the same
+pass, and top level subdirectories are handed to a pool of threads.
+Files that can't be deleted (still open in a render that has only just
+exited, say) are logged and left behind, and the rest of the tree is
+deleted anyway.
+In async mode the project is renamed into NODE_TRASH_DIR and a detached
+`python -m rrt.hpc.release` process empties the trash after the node has
+already been given back to the scheduler.  Date directories the node
+projects were in (see `rrt.ids`) are removed once they're empty.
+"""
+import os, sys, stat, time, datetime
+from multiprocessing.pool import ThreadPool
+from rrt.settings import RELEASE_THREADS, NODE_TRASH_DIR, NODE_JOB_DIR
+from rrt.ids import SHARD_DIGITS
+from rrt.filesystem import FileLock
+from rrt.hpc.scripts import LOG, spawn_detached
+
+def _long_path(path):
+    # lets windows delete trees deeper than MAX_PATH
+    if os.name == 'nt' and not path.startswith('\\\\?\\'):
+        path = os.path.abspath(path)
+        if path.startswith('\\\\'):
+            return u'\\\\?\\UNC\\' + path[2:]
+        return u'\\\\?\\' + path
+    return path
+
+def _remove(path, rm):
+    """Removes path with rm; returns False (and logs why) if it can't be."""
+    try:
+        rm(path)
+        return True
+    except OSError:
+        pass
+    try:
+        # read-only files/dirs can't be deleted on windows
+        os.chmod(path, stat.S_IWRITE)
+        rm(path)
+        return True
+    except OSError, e:
+        LOG.warning("Could not delete %s: %s" % (path, e))
+        return False
+
+def _purge_entries(path, names, into):
+    """
+    Removes the files `names` in path and purges the directories into the
+    `into` list.  Returns (files, bytes, entries that couldn't be removed).
+    """
+    files, size, failed = 0, 0, 0
+    for name in names:
+        full = os.path.join(path, name)
+        try:
+            st = os.lstat(full)
+        except OSError:
+            # already gone
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            into.append(full)
+        elif _remove(full, os.remove):
+            files += 1
+            size += st.st_size
+        else:
+            failed += 1
+    return files, size, failed
+
+def _purge(path):
+    """
+    Removes everything under path (and path) that it can.
+    Returns (files, bytes, entries left behind).
+    """
+    try:
+        names = os.listdir(path)
+    except OSError, e:
+        LOG.warning("Could not list %s: %s" % (path, e))
+        return 0, 0, 1
+    subdirs = []
+    files, size, failed = _purge_entries(path, names, subdirs)
+    for subdir in subdirs:
+        f, s, n = _purge(subdir)
+        files += f
+        size += s
+        failed += n
+    # a directory with something left in it can't go either
+    if not failed and not _remove(path, os.rmdir):
+        failed += 1
+    return files, size, failed
+
+def remove_tree(path, threads=RELEASE_THREADS):
+    """
+    Deletes path in a single pass, working on top level subdirectories in
+    parallel.  Returns a dict of the files/bytes removed, the entries that
+    couldn't be ('failed', logged and left in place) and elapsed seconds.
+    """
+    started = time.time()
+    path = _long_path(path)
+    files, size, failed = 0, 0, 0
+    if os.path.isdir(path):
+        subdirs = []
+        files, size, failed = _purge_entries(path, os.listdir(path), subdirs)
+        pool = ThreadPool(max(1, min(threads, len(subdirs))))
+        try:
+            for f, s, n in pool.map(_purge, subdirs, 1):
+                files += f
+                size += s
+                failed += n
+        finally:
+            pool.close()
+            pool.join()
+        if failed:
+            LOG.warning("%d entries under %s could not be deleted" % (failed, path))
+        elif not _remove(path, os.rmdir):
+            failed += 1
+    return {'files': files, 'bytes': size, 'failed': failed, 'seconds': time.time() - started}
+
+def empty_trash(trash=NODE_TRASH_DIR):
+    """
+    Deletes everything in the trash.  Only one process does this at a time;
+    others return right away and leave it to the one already running.
+    """
+    if not os.path.isdir(trash):
+        return
+    lock = FileLock(trash + '.lock')
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        # keep going until nothing new has been dropped in
+        while os.listdir(trash):
+            for name in os.listdir(trash):
+                try:
+                    stats = remove_tree(os.path.join(trash, name))
+                    LOG.debug("Purged %s: %d files" % (name, stats['files']))
+                except Exception, e:
+                    LOG.error("Could not purge %s: %s" % (name, e))
+                    return
+                if stats['failed']:
+                    # left for the next purge to try again
+                    return
+    finally:
+        lock.release()
+
+def prune_shards(root=NODE_JOB_DIR, today=None):
+    """
+    Removes empty date directories from before today (today's could be
+    about to get another job) under the node job directory.
+    """
+    today = today or datetime.date.today().strftime('%Y%m%d')
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        if len(name) == SHARD_DIGITS and name.isdigit() and name < today:
+            try:
+                os.rmdir(os.path.join(root, name))
+            except OSError:
+                pass
+
+def _spawn_purge():
+    spawn_detached([sys.executable, '-m', 'rrt.hpc.release'])
+
+def trash_tree(path, trash=NODE_TRASH_DIR):
+    """
+    Moves path into the trash and starts a background purge.  Falls back to
+    deleting path right away if it can't be moved or the purge can't start.
+    Returns the same dict as `remove_tree` (counts are unknown, so zero).
+    """
+    started = time.time()
+    if not os.path.isdir(path):
+        return {'files': 0, 'bytes': 0, 'failed': 0, 'seconds': 0.0}
+    if not os.path.isdir(trash):
+        os.makedirs(trash)
+    stamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+    target = os.path.join(trash, '%s.%s' % (os.path.basename(path.rstrip('\\/')), stamp))
+    try:
+        os.rename(path, target)
+    except OSError, e:
+        LOG.warning("Could not move %s to the trash (%s), deleting it now" % (path, e))
+        return remove_tree(path)
+    try:
+        _spawn_purge()
+    except OSError, e:
+        LOG.warning("Could not start background purge (%s), deleting now" % e)
+        return remove_tree(target)
+    return {'files': 0, 'bytes': 0, 'failed': 0, 'seconds': time.time() - started}
+
+if '__main__' == __name__:
+    empty_trash()
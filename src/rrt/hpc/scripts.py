@@ -3,16 +3,37 @@ These functions serve as script entry points.
 They identify the job style based on the environment, then pass the request off
 to application specific implementations.
 """
-import os, sys, shutil, platform, datetime, rrt
-from subprocess import call
-from pkg_resources import Requirement, resource_filename
+import os, re, sys, shutil, socket, datetime, rrt
+from subprocess import call, Popen
+from optparse import OptionParser
 
 from rrt import RinglingException, get_log
 from rrt.hpc import env
-LOG = get_log(platform.uname()[1], True)
+from rrt.settings import RELEASE_ASYNC, FANOUT
+from rrt.telemetry import Phase
+# platform.uname() shells out to `ver` (or `uname -p`), the hostname is all we need
+LOG = get_log(socket.gethostname(), True)
 
 class MissingDelegateError(RinglingException):pass
 
+DETACHED_PROCESS = 0x00000008
+CREATE_NEW_PROCESS_GROUP = 0x00000200
+CREATE_BREAKAWAY_FROM_JOB = 0x01000000
+
+def spawn_detached(cmd):
+    """
+    Starts a process that outlives the task (the scheduler kills whatever 
+    a task leaves running in its job object).
+    """
+    if os.name != 'nt':
+        return Popen(cmd, close_fds=True)
+    flags = DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP
+    try:
+        # escape the task's job object
+        return Popen(cmd, close_fds=True, creationflags=flags | CREATE_BREAKAWAY_FROM_JOB)
+    except OSError:
+        return Popen(cmd, close_fds=True, creationflags=flags)
+
 class Delegator(object):
     _env = env()
     __delegates__ = {
@@ -50,26 +71,47 @@ class Delegator(object):
             except Exception, e:
                 LOG.debug(e)
                     
-        # Delegate access to implementation
-        return sys.modules[self._delegate].prep()
+        # share the asset store files this node fetches with the job's other nodes
+        from rrt.hpc import fanout
+        if FANOUT and self._env['MANIFEST']:
+            fanout.join(log_dir)
+        # Delegate access to implementation, which reports what it copied
+        try:
+            stats = sys.modules[self._delegate].prep() or {}
+        except:
+            fanout.finish(ok=False)
+            raise
+        stats.update(fanout.finish())
+        return stats
 
     def release(self):
         # Generic release
+        from rrt.hpc.release import remove_tree, trash_tree, prune_shards
         LOG.info("Cleaning up node project: %s" % self._env['NODE_PROJECT'])
-        LOG.info("\tCalculating size...")
-        LOG.info("\tThis could take a while...")
-        size = sum([os.path.getsize(os.path.join(root,f)) for root,dirs,files in os.walk(self._env['NODE_PROJECT']) for f in files])
-        LOG.info("\t%0.1f MB" % (size/(1024*1024.0)))
-        call('rmdir /S /Q %s' % self._env['NODE_PROJECT'], shell=True)
+        if RELEASE_ASYNC:
+            LOG.info("\tMoving to the trash, it will be deleted in the background.")
+            stats = trash_tree(self._env['NODE_PROJECT'])
+        else:
+            stats = remove_tree(self._env['NODE_PROJECT'])
+            LOG.info("\t%d files, %0.1f MB in %0.1fs" % (stats['files'],
+                     stats['bytes']/(1024*1024.0), stats['seconds']))
+            if stats['failed']:
+                # the background purge tries what's left again later
+                trash_tree(self._env['NODE_PROJECT'])
         
+        prune_shards()
+        from rrt.hpc import fanout
+        fanout.leave(os.path.dirname(self._env['LOGS']))
         # Delegate access to implementation
-        return sys.modules[self._delegate].release()
+        sys.modules[self._delegate].release()
+        return {'files_deleted': stats['files'], 'bytes_deleted': stats['bytes']}
 
 
 def prep_delegator():
     start = datetime.datetime.now()
     LOG.info("Starting node prep. %s" % str(start))
-    Delegator().prep()
+    with Phase('prep') as phase:
+        phase.update(**Delegator().prep())
     end = datetime.datetime.now()
     LOG.info("Elapsed time: %s" % str(end - start))
     LOG.info("Done.")
@@ -78,13 +120,56 @@ def prep_delegator():
 def release_delegator():
     start = datetime.datetime.now()
     LOG.info("Starting node release. %s" % str(start))
-    Delegator().release()
+    with Phase('release') as phase:
+        phase.update(**Delegator().release())
     end = datetime.datetime.now()
     LOG.info("Elapsed time: %s" % str(end - start))
     LOG.info("Done.")
     sys.exit(0)
     
+# hpc-node-run's --frames, which can be negative (pre-roll): -5--1
+_FRAME_RANGE = re.compile(r'^(-?\d+)-(-?\d+)$')
+
+def parse_frame_range(text):
+    """(first, last) from FIRST-LAST, or None if it isn't a range."""
+    match = _FRAME_RANGE.match(text.strip())
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def run_delegator(argv=None):
+    """
+    Runs a render command and records how long it took, exiting with the
+    command's exit code::
+
+        hpc-node-run --frames=1-10 --step=1 Render.exe -r sw ...
+    """
+    parser = OptionParser(usage="%prog [--frames=FIRST-LAST] [--step=N] command [args ...]")
+    # everything after the command belongs to the command
+    parser.disable_interspersed_args()
+    parser.add_option('--frames', default=None)
+    parser.add_option('--step', type='int', default=1)
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error("no command given")
+    fields = {}
+    frames = options.frames and parse_frame_range(options.frames)
+    if options.frames and frames is None:
+        # only the timings need the range; the render still runs
+        LOG.warning("Not a frame range: %s" % options.frames)
+    if frames:
+        first, last = frames
+        fields = {'first_frame': first, 'last_frame': last,
+                  'frames': len(range(first, last + 1, max(1, options.step)))}
+    # the render's output is the task log, so stay quiet
+    with Phase('render', **fields) as phase:
+        code = call(args)
+        phase.update(exit_code=code, ok=code == 0)
+    sys.exit(code)
+
 def deploy_extras():
+    # imported here since pkg_resources is slow to load on every node task
+    from pkg_resources import Requirement, resource_filename
     DEPLOY_LOCATION = r'C:\Ringling\HPC'
     extras = resource_filename(Requirement.parse("ringling-render-tools"),"rrt/extras")
     if os.path.exists(DEPLOY_LOCATION): shutil.rmtree(DEPLOY_LOCATION)
@@ -0,0 +1,217 @@
+"""
+Incremental project -> node copies.
+
+A node keeps a mirror of the project entries it has synced before (see
+`rrt.settings.SYNC_MIRROR_DIR`); each prep only copies files whose size or
+mtime changed (or whose hash differs, when the job manifest has one), then
+links what the job needs from the mirror into NODE_PROJECT.
+"""
+import os, time, json, shutil, fnmatch, hashlib
+from multiprocessing.pool import ThreadPool
+from rrt.settings import SYNC_THREADS, SYNC_LARGE_FILE, SYNC_MIRROR_DIR, \
+    SYNC_MIRROR_MAX_AGE, EXTRACT_BUFFER
+from rrt.filesystem import FileLock, link_or_copy
+from rrt.hpc.scripts import LOG
+
+STATE_FILE = '.rrt-sync.json'
+
+def matches(name, patterns):
+    name = name.lower()
+    for pattern in patterns:
+        if fnmatch.fnmatch(name, pattern.lower()):
+            return True
+    return False
+
+def mirror_dir(key, root=SYNC_MIRROR_DIR):
+    """The node local mirror for a project (keyed by its share and path)."""
+    return os.path.join(root, hashlib.sha1(key.lower()).hexdigest()[:16])
+
+def _copy_large(src, dst, buffer_size=EXTRACT_BUFFER):
+    with open(src, 'rb', buffer_size) as fsrc:
+        with open(dst, 'wb', buffer_size) as fdst:
+            shutil.copyfileobj(fsrc, fdst, buffer_size)
+    shutil.copystat(src, dst)
+
+def _copy(src, dst, large=False):
+    parent = os.path.dirname(dst)
+    if not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            if not os.path.isdir(parent):
+                raise
+    # copy beside the target so an interrupted copy never looks current
+    part = dst + '.part'
+    if large:
+        _copy_large(src, part)
+    else:
+        shutil.copy2(src, part)
+    if os.path.exists(dst):
+        os.remove(dst)
+    os.rename(part, dst)
+
+def _scan(src, patterns):
+    """Returns {relative path: (size, mtime)} for included source files."""
+    found = {}
+    for name in os.listdir(src):
+        if not matches(name, patterns):
+            continue
+        full = os.path.join(src, name)
+        if os.path.isdir(full):
+            for root, dirs, files in os.walk(full):
+                for f in files:
+                    path = os.path.join(root, f)
+                    st = os.stat(path)
+                    found[os.path.relpath(path, src)] = (st.st_size, int(st.st_mtime))
+        else:
+            st = os.stat(full)
+            found[name] = (st.st_size, int(st.st_mtime))
+    return found
+
+def _unchanged(path, known):
+    """
+    Whether the mirror's copy of a file is still what was copied there: a
+    hardlinked NODE_PROJECT file can be rewritten in place.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    # states written before the mirror's own mtime was kept
+    local = known[3] if len(known) > 3 else known[1]
+    return st.st_size == known[0] and int(st.st_mtime) == local
+
+def _local_mtime(path):
+    try:
+        return int(os.stat(path).st_mtime)
+    except OSError:
+        return None
+
+def _stat_files(src, files):
+    """{relative path: (size, mtime)} for the listed files that exist."""
+    found = {}
+    for rel in files:
+        try:
+            st = os.stat(os.path.join(src, rel))
+        except OSError:
+            LOG.warning("Manifest file missing from %s: %s" % (src, rel))
+            continue
+        found[rel] = (st.st_size, int(st.st_mtime))
+    return found
+
+def sync_tree(src, dst, patterns, hashes=None, threads=SYNC_THREADS, prune=True,
+              files=None):
+    """
+    Brings dst up to date with the entries of src matching `patterns`, and
+    the relative paths in `files` (from a job manifest).
+    `hashes` optionally maps relative paths to content hashes (from a job
+    manifest); a file whose hash matches what dst last received is skipped
+    even if its mtime moved.
+    Only pattern matched files are pruned: other jobs' manifests may have
+    listed other files, which stay in the mirror until it's removed.
+    Returns a dict of copied/skipped files and bytes, and elapsed seconds.
+    """
+    started = time.time()
+    hashes = hashes or {}
+    if not os.path.isdir(dst):
+        os.makedirs(dst)
+    state_path = os.path.join(dst, STATE_FILE)
+    try:
+        with open(state_path, 'rb') as fh:
+            state = json.load(fh)
+    except Exception:
+        state = {}
+    stats = {'copied_files': 0, 'copied_bytes': 0,
+             'skipped_files': 0, 'skipped_bytes': 0}
+    small, large = [], []
+    source = _scan(src, patterns)
+    if files:
+        source.update(_stat_files(src, files))
+    for rel, (size, mtime) in source.items():
+        known = state.get(rel)
+        if known and _unchanged(os.path.join(dst, rel), known):
+            if known[0] == size and (known[1] == mtime or
+                                     (rel in hashes and known[2] == hashes[rel])):
+                stats['skipped_files'] += 1
+                stats['skipped_bytes'] += size
+                continue
+        (large if size >= SYNC_LARGE_FILE else small).append(rel)
+        stats['copied_files'] += 1
+        stats['copied_bytes'] += size
+    # many small files go through the pool while big ones stream in this thread
+    pool = ThreadPool(max(1, threads))
+    try:
+        pending = pool.map_async(lambda rel: _copy(os.path.join(src, rel),
+                                                   os.path.join(dst, rel)), small, 4)
+        for rel in large:
+            _copy(os.path.join(src, rel), os.path.join(dst, rel), large=True)
+        pending.get()
+    finally:
+        pool.close()
+        pool.join()
+    kept = {}
+    for rel in set(state) - set(source):
+        if not prune or not matches(rel.replace('\\', '/').split('/')[0], patterns):
+            kept[rel] = state[rel]
+            continue
+        try:
+            os.remove(os.path.join(dst, rel))
+        except OSError:
+            pass
+    # [source size, source mtime, hash, mirror mtime]
+    state = dict((rel, [size, mtime, hashes.get(rel), _local_mtime(os.path.join(dst, rel))])
+                 for rel, (size, mtime) in source.items())
+    state.update(kept)
+    with open(state_path, 'wb') as fh:
+        json.dump(state, fh)
+    stats['seconds'] = time.time() - started
+    LOG.info("Synced %s: copied %d files (%0.1f MB), skipped %d files (%0.1f MB) in %0.1fs" %
+             (src, stats['copied_files'], stats['copied_bytes'] / (1024 * 1024.0),
+              stats['skipped_files'], stats['skipped_bytes'] / (1024 * 1024.0),
+              stats['seconds']))
+    return stats
+
+def link_mirror(mirror, dst, patterns, files=(), link=True):
+    """
+    Links (or copies) a job's files from a mirror into dst: the entries
+    matching `patterns` and the job's own manifest `files`.  The sync state,
+    interrupted copies and files only other jobs' manifests listed are left
+    out.  Returns (files, bytes).
+    """
+    wanted = set([os.path.normcase(os.path.normpath(rel)) for rel in files])
+    count, size = 0, 0
+    for root, dirs, names in os.walk(mirror):
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, mirror)
+            if rel == STATE_FILE or name.endswith('.part'):
+                continue
+            if not matches(rel.split(os.sep)[0], patterns) and os.path.normcase(rel) not in wanted:
+                continue
+            target = os.path.join(dst, rel)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            link_or_copy(path, target, link)
+            count += 1
+            size += os.path.getsize(path)
+    return count, size
+
+def prune_mirrors(root=SYNC_MIRROR_DIR, max_age=SYNC_MIRROR_MAX_AGE):
+    """Removes mirrors that haven't been synced in `max_age` days."""
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - max_age * 24 * 60 * 60
+    for name in os.listdir(root):
+        mirror = os.path.join(root, name)
+        state = os.path.join(mirror, STATE_FILE)
+        if not os.path.isdir(mirror) or not os.path.isfile(state):
+            continue
+        if os.path.getmtime(state) >= cutoff:
+            continue
+        lock = FileLock(mirror + '.lock')
+        if lock.acquire(blocking=False):
+            try:
+                LOG.info("Removing stale mirror %s" % mirror)
+                shutil.rmtree(mirror, ignore_errors=True)
+            finally:
+                lock.release()
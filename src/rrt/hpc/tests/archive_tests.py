@@ -0,0 +1,54 @@
+import os, shutil, tempfile, unittest, zipfile
+from rrt.hpc.archive import StreamingExtractor, ArchiveError, safe_member_path
+
+MEMBERS = {
+    'scenes/shot01.max': 'max scene ' * 5000,
+    'maps/wood.tga': ''.join([chr(i % 256) for i in range(70000)]),
+    'maps/empty.txt': '',
+    'readme.txt': 'hello',
+}
+
+class TestStreamingExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmp, 'project.zip')
+        zf = zipfile.ZipFile(self.archive, 'w')
+        zf.writestr(zipfile.ZipInfo('maps/'), '')
+        for i, name in enumerate(sorted(MEMBERS)):
+            info = zipfile.ZipInfo(name)
+            info.compress_type = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)[i % 2]
+            zf.writestr(info, MEMBERS[name])
+        zf.close()
+        self.dest = os.path.join(self.tmp, 'node')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _read(self, name):
+        with open(os.path.join(self.dest, *name.split('/')), 'rb') as fh:
+            return fh.read()
+
+    def test_extract_all(self):
+        stats = StreamingExtractor(self.archive, threads=3, buffer_size=4096).extract(self.dest)
+        self.assertEqual(stats['files'], len(MEMBERS))
+        self.assertEqual(stats['bytes'], sum([len(v) for v in MEMBERS.values()]))
+        for name, data in MEMBERS.items():
+            self.assertEqual(self._read(name), data)
+
+    def test_extract_subset(self):
+        StreamingExtractor(self.archive).extract(self.dest, ['scenes\\shot01.max'])
+        self.assertEqual(self._read('scenes/shot01.max'), MEMBERS['scenes/shot01.max'])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'maps')))
+
+    def test_bad_crc(self):
+        extractor = StreamingExtractor(self.archive)
+        for info in extractor.infolist():
+            info.CRC ^= 1
+        self.assertRaises(ArchiveError, extractor.extract, self.dest)
+
+    def test_safe_member_path(self):
+        self.assertEqual(safe_member_path('D:/hpc', '../../evil.txt'),
+                         os.path.join('D:/hpc', 'evil.txt'))
+        self.assertEqual(safe_member_path('D:/hpc', 'C:\\maps\\a.tga'),
+                         os.path.join('D:/hpc', 'maps', 'a.tga'))
@@ -0,0 +1,145 @@
+import os, shutil, tempfile, unittest
+from StringIO import StringIO
+from rrt.assetstore import AssetStore
+from rrt.filesystem import FileLock
+from rrt.hpc.cache import NodeCache, BlobCache, archive_key
+
+class TestNodeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = NodeCache(os.path.join(self.tmp, 'cache'), budget=1024)
+        self.fills = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _populate(self, size):
+        def populate(path):
+            self.fills.append(path)
+            os.makedirs(os.path.join(path, 'maps'))
+            with open(os.path.join(path, 'maps', 'wood.tga'), 'wb') as fh:
+                fh.write('x' * size)
+            with open(os.path.join(path, 'scene.max'), 'wb') as fh:
+                fh.write('max')
+        return populate
+
+    def _dest(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_miss_then_hit(self):
+        self.assertFalse(self.cache.fetch('a', self._populate(10), self._dest('job1')))
+        self.assertTrue(self.cache.fetch('a', self._populate(10), self._dest('job2')))
+        self.assertEqual(len(self.fills), 1)
+        for job in ('job1', 'job2'):
+            self.assertTrue(os.path.isfile(os.path.join(self._dest(job), 'maps', 'wood.tga')))
+
+    def test_copies_by_default(self):
+        self.cache.fetch('a', self._populate(10), self._dest('job1'))
+        self.assertEqual(os.stat(os.path.join(self._dest('job1'), 'scene.max')).st_nlink, 1)
+
+    def test_changed_entry_is_refilled(self):
+        cache = NodeCache(os.path.join(self.tmp, 'linked'), budget=1024, hardlinks=True)
+        cache.fetch('a', self._populate(10), self._dest('job1'))
+        # a render rewrites a (linked) project file in place
+        scene = os.path.join(self._dest('job1'), 'scene.max')
+        with open(scene, 'r+b') as fh:
+            fh.write('MAX')
+        os.utime(scene, (1000, 1000))
+        self.assertFalse(cache.fetch('a', self._populate(10), self._dest('job2')))
+        self.assertEqual(len(self.fills), 2)
+        with open(os.path.join(self._dest('job2'), 'scene.max'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'max')
+        self.assertTrue(cache.fetch('a', self._populate(10), self._dest('job3')))
+
+    def test_lru_eviction(self):
+        self.cache.fetch('old', self._populate(400), self._dest('job1'))
+        self.cache.fetch('new', self._populate(400), self._dest('job2'))
+        # touch 'old' so 'new' becomes the least recently used entry
+        os.utime(os.path.join(self.cache.root, 'new', 'entry.json'), (0, 0))
+        self.cache.fetch('third', self._populate(400), self._dest('job3'))
+        keys = sorted([key for used, size, key in self.cache.entries()])
+        self.assertEqual(keys, ['old', 'third'])
+
+    def test_locked_entries_survive_eviction(self):
+        self.cache.fetch('busy', self._populate(800), self._dest('job1'))
+        lock = FileLock(os.path.join(self.cache.root, 'busy.lock'))
+        lock.acquire()
+        try:
+            self.cache.fetch('next', self._populate(800), self._dest('job2'))
+            keys = sorted([key for used, size, key in self.cache.entries()])
+            self.assertEqual(keys, ['busy', 'next'])
+        finally:
+            lock.release()
+
+    def test_archive_key_tracks_content(self):
+        path = os.path.join(self.tmp, 'project.zip')
+        with open(path, 'wb') as fh:
+            fh.write('PK' * 100)
+        key = archive_key(path)
+        self.assertEqual(key, archive_key(path))
+        with open(path, 'ab') as fh:
+            fh.write('more')
+        self.assertNotEqual(key, archive_key(path))
+
+class TestFileLock(unittest.TestCase):
+
+    def test_exclusive(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with FileLock(path):
+                self.assertFalse(FileLock(path).acquire(blocking=False))
+            other = FileLock(path)
+            self.assertTrue(other.acquire(blocking=False))
+            other.release()
+        finally:
+            os.remove(path)
+
+class TestBlobCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = AssetStore(os.path.join(self.tmp, 'store'))
+        self.cache = BlobCache(self.store, os.path.join(self.tmp, 'blobs'), budget=1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _blob(self, data):
+        return self.store.put(lambda: StringIO(data))[0]
+
+    def test_materialize(self):
+        wood, scene = self._blob('w' * 600), self._blob('scene')
+        blobs = [(wood, os.path.join('maps', 'wood.tga')), (scene, 'scene.max')]
+        stats = self.cache.materialize(blobs, os.path.join(self.tmp, 'job1'))
+        self.assertEqual((stats['blob_misses'], stats['bytes_fetched']), (2, 605))
+        stats = self.cache.materialize(blobs, os.path.join(self.tmp, 'job2'))
+        self.assertEqual((stats['blob_hits'], stats['blob_misses']), (2, 0))
+        with open(os.path.join(self.tmp, 'job2', 'maps', 'wood.tga'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'w' * 600)
+
+    def test_locks_per_blob(self):
+        busy, free = self._blob('b' * 600), self._blob('f' * 600)
+        self.cache.materialize([(busy, 'busy')], os.path.join(self.tmp, 'job1'))
+        os.utime(self.cache.path(busy), (0, 0))
+        # another job is writing the busy blob
+        lock = FileLock(self.cache.path(busy) + '.lock')
+        lock.acquire()
+        try:
+            stats = self.cache.materialize([(free, 'free')], os.path.join(self.tmp, 'job2'))
+            self.assertEqual(stats['blob_misses'], 1)
+            # and it isn't evicted from under that job
+            self.assertTrue(os.path.isfile(self.cache.path(busy)))
+        finally:
+            lock.release()
+
+    def test_eviction(self):
+        old, new = self._blob('o' * 600), self._blob('n' * 600)
+        self.cache.materialize([(old, 'old')], os.path.join(self.tmp, 'job1'))
+        os.utime(self.cache.path(old), (0, 0))
+        self.cache.materialize([(new, 'new')], os.path.join(self.tmp, 'job2'))
+        self.assertFalse(os.path.exists(self.cache.path(old)))
+        self.assertTrue(os.path.exists(self.cache.path(new)))
+        # the job's copy outlives the cached one
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp, 'job1', 'old')))
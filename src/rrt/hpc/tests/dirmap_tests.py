@@ -0,0 +1,80 @@
+import os, time, shutil, tempfile, unittest
+from rrt import get_log
+from rrt.hpc.maya import dirmap
+from rrt.hpc.maya.dirmap import dirmap_rules, write_dirmap, load_dirmap, DIRMAP_FILE
+
+LOG = get_log(__name__)
+
+class TestDirmap(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.project = os.path.join(self.tmp, 'project')
+        self.node_project = os.path.join(self.tmp, 'node')
+        os.makedirs(self.node_project)
+        self._project_dirs = dirmap.project_dirs
+
+    def tearDown(self):
+        dirmap.project_dirs = self._project_dirs
+        shutil.rmtree(self.tmp)
+
+    def _project(self, count):
+        for i in range(count):
+            os.makedirs(os.path.join(self.project, 'dir%04d' % i))
+        with open(os.path.join(self.project, 'workspace.mel'), 'wb') as fh:
+            fh.write('')
+
+    def test_rules(self):
+        rules = dirmap_rules('S:\\projects\\shot', 'C:\\jobs\\1', ['scenes', 'Scenes', 'images'])
+        self.assertEqual(rules[0], ('C:/jobs/1', 'S:/projects/shot'))
+        self.assertTrue(('//scenes', 'S:/projects/shot/scenes') in rules)
+        self.assertTrue(('C:/jobs/1//images', 'S:/projects/shot/images') in rules)
+        # the differently cased duplicate adds nothing
+        self.assertEqual(len(rules), 1 + 3 * 2)
+        # a project rendered in place maps nothing onto itself
+        self.assertEqual(dirmap_rules('S:\\shot', 'S:\\shot', ['a']),
+                         [('//a', 'S:/shot/a'), ('S:/shot//a', 'S:/shot/a')])
+
+    def test_saved_rules_are_used(self):
+        self._project(3)
+        rules = write_dirmap(self.project, self.node_project)
+        self.assertEqual(len(rules), 1 + 3 * 3)
+        self.assertTrue(os.path.isfile(os.path.join(self.node_project, DIRMAP_FILE)))
+        def listing(project):
+            raise AssertionError("startup listed the project share")
+        dirmap.project_dirs = listing
+        self.assertEqual(load_dirmap(self.project, self.node_project), rules)
+
+    def test_fallback(self):
+        self._project(2)
+        # nothing saved, or saved for another project
+        self.assertEqual(len(load_dirmap(self.project, self.node_project)), 7)
+        write_dirmap(self.project, self.node_project)
+        os.makedirs(os.path.join(self.tmp, 'other', 'maps'))
+        rules = load_dirmap(os.path.join(self.tmp, 'other'), self.node_project)
+        self.assertEqual(len(rules), 4)
+
+    def test_startup_benchmark(self):
+        """
+        Maya startup time against project size: listing the share every
+        launch (the old startup script) vs. loading the rules saved by prep.
+        Local disk hides most of the smb round trips, so this is the floor.
+        """
+        results = []
+        for count in (10, 100, 1000):
+            shutil.rmtree(self.project, True)
+            self._project(count)
+            start = time.time()
+            for i in range(10):
+                scanned = dirmap_rules(self.project, self.node_project,
+                                       dirmap.project_dirs(self.project))
+            scan = (time.time() - start) / 10
+            write_dirmap(self.project, self.node_project)
+            start = time.time()
+            for i in range(10):
+                loaded = load_dirmap(self.project, self.node_project)
+            load = (time.time() - start) / 10
+            self.assertEqual(loaded, scanned)
+            results.append((count, scan * 1000, load * 1000))
+        for count, scan, load in results:
+            LOG.info("%5d dirs: scan %.2fms, saved rules %.2fms" % (count, scan, load))
@@ -0,0 +1,128 @@
+import os, sys, json, time, signal, shutil, tempfile, threading, unittest
+from StringIO import StringIO
+from subprocess import Popen
+from rrt.assetstore import AssetStore
+from rrt.hpc import fanout
+from rrt.hpc.cache import BlobCache
+
+SRC = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+def run_node(store, root, coordination, node, digests):
+    """One node's prep, run in its own process by `test_nodes`."""
+    fanout.POLL = 0.1
+    url = fanout.ensure_server(root, port=0, host='127.0.0.1')
+    swarm = fanout.Swarm(coordination, node, url, seeds=1, wait=30)
+    swarm.join()
+    cache = BlobCache(AssetStore(store), root, peers=swarm)
+    stats = cache.materialize([(d, d) for d in digests], root + '.job')
+    swarm.complete()
+    stats.update(swarm.stats)
+    stats['seed'] = swarm.seed
+    with open(root + '.result.json', 'wb') as fh:
+        json.dump(stats, fh)
+
+class TestFanout(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = AssetStore(os.path.join(self.tmp, 'store'))
+        self.coordination = os.path.join(self.tmp, 'logs', fanout.PEERS_DIR)
+        self.servers = []
+        self.digests = [self.store.put(lambda data=data: StringIO(data))[0]
+                        for data in ('scene', 'w' * 5000, 't' * 300)]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        for name in os.listdir(self.tmp):
+            if name.endswith('.server.json'):
+                with open(os.path.join(self.tmp, name), 'rb') as fh:
+                    try:
+                        os.kill(json.load(fh)['pid'], signal.SIGTERM)
+                    except OSError:
+                        pass
+        shutil.rmtree(self.tmp)
+
+    def _node(self, name, **kw):
+        root = os.path.join(self.tmp, name)
+        server = fanout.BlobServer(root, 0, '127.0.0.1', **kw)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1})
+        thread.setDaemon(True)
+        thread.start()
+        self.servers.append(server)
+        swarm = fanout.Swarm(self.coordination, name, server.url, seeds=1, wait=1)
+        return BlobCache(self.store, root, peers=swarm), swarm
+
+    def _store_fetches(self, stats):
+        return stats['blob_misses'] - stats.get('peer_fetches', 0)
+
+    def test_peers(self):
+        blobs = [(d, d) for d in self.digests]
+        seed_cache, seed = self._node('node1')
+        seed.join()
+        self.assertTrue(seed.seed)
+        seed_cache.materialize(blobs, os.path.join(self.tmp, 'job1'))
+        seed.complete()
+        cache, swarm = self._node('node2')
+        swarm.join()
+        self.assertFalse(swarm.seed)
+        self.assertEqual([p['state'] for p in swarm.peers()], [fanout.STATE_COMPLETE])
+        # everything comes from node1, none of it from the store
+        shutil.rmtree(self.store.root)
+        stats = cache.materialize(blobs, os.path.join(self.tmp, 'job2'))
+        self.assertEqual(swarm.stats['peer_fetches'], 3)
+        self.assertEqual(swarm.stats['peer_bytes'], stats['bytes_fetched'])
+        with open(os.path.join(self.tmp, 'job2', self.digests[1]), 'rb') as fh:
+            self.assertEqual(fh.read(), 'w' * 5000)
+        swarm.leave()
+        self.assertEqual(len(seed.peers()), 0)
+
+    def test_bad_peer(self):
+        digest = self.digests[0]
+        seed_cache, seed = self._node('node1')
+        seed.join()
+        seed_cache.materialize([(digest, 'scene')], os.path.join(self.tmp, 'job1'))
+        seed.complete()
+        with open(seed_cache.path(digest), 'wb') as fh:
+            fh.write('not the scene')
+        cache, swarm = self._node('node2')
+        swarm.join()
+        cache.materialize([(digest, 'scene')], os.path.join(self.tmp, 'job2'))
+        self.assertEqual(swarm.stats['peer_fetches'], 0)
+        with open(os.path.join(self.tmp, 'job2', 'scene'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'scene')
+
+    def test_busy(self):
+        cache, swarm = self._node('node1', max_clients=0)
+        swarm.complete()
+        cache.materialize([(self.digests[0], 'scene')], os.path.join(self.tmp, 'job1'))
+        self.assertEqual(fanout.Swarm(self.coordination, 'node2', None)._download(
+                         swarm.url, self.digests[0], os.path.join(self.tmp, 'part')), None)
+        self.assertTrue(fanout.ping(swarm.url))
+
+    def test_nodes(self):
+        """Nodes in their own processes, each with a blob server: only the seed uses the store."""
+        environ = dict(os.environ, PYTHONPATH=SRC)
+        def start(name):
+            args = (self.store.root, os.path.join(self.tmp, name), self.coordination, name, self.digests)
+            code = 'from rrt.hpc.tests.fanout_tests import run_node; run_node(*%r)' % (args,)
+            with open(os.devnull, 'wb') as null:
+                return Popen([sys.executable, '-c', code], env=environ, stdout=null, stderr=null)
+        seed = start('node0')
+        deadline = time.time() + 30
+        while not os.path.exists(os.path.join(self.coordination, 'node0.json')):
+            self.assertTrue(time.time() < deadline, "node0 didn't join")
+            time.sleep(0.05)
+        nodes = [seed] + [start('node%d' % i) for i in range(1, 4)]
+        self.assertEqual([p.wait() for p in nodes], [0] * 4)
+        results = []
+        for i in range(4):
+            with open(os.path.join(self.tmp, 'node%d.result.json' % i), 'rb') as fh:
+                results.append(json.load(fh))
+        self.assertEqual([r['seed'] for r in results], [True, False, False, False])
+        self.assertEqual([self._store_fetches(r) for r in results], [3, 0, 0, 0])
+        self.assertEqual([r['blob_misses'] for r in results], [3] * 4)
+        # each server is reused by later jobs on its node
+        url = fanout.server_url(os.path.join(self.tmp, 'node1'))
+        self.assertEqual(fanout.ensure_server(os.path.join(self.tmp, 'node1')), url)
@@ -0,0 +1,80 @@
+import os, shutil, stat, tempfile, unittest
+from rrt.hpc.release import remove_tree, trash_tree, empty_trash, prune_shards
+import rrt.hpc.release
+
+def make_tree(root, dirs=4, files=5, size=100):
+    total = 0
+    for d in range(dirs):
+        leaf = os.path.join(root, 'fur%d' % d, 'cache')
+        os.makedirs(leaf)
+        for f in range(files):
+            with open(os.path.join(leaf, 'frame.%04d.fur' % f), 'wb') as fh:
+                fh.write('x' * size)
+            total += size
+    with open(os.path.join(root, 'workspace.mel'), 'wb') as fh:
+        fh.write('ws')
+    # read-only files have to be deleted too
+    os.chmod(os.path.join(root, 'workspace.mel'), stat.S_IREAD)
+    return dirs * files + 1, total + 2
+
+class TestRelease(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.project = os.path.join(self.tmp, '20261018120000')
+        os.makedirs(self.project)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_remove_tree_counts_while_deleting(self):
+        files, size = make_tree(self.project)
+        stats = remove_tree(self.project, threads=3)
+        self.assertEqual((stats['files'], stats['bytes']), (files, size))
+        self.assertFalse(os.path.exists(self.project))
+
+    def test_undeletable_entries_are_left(self):
+        files, size = make_tree(self.project)
+        locked = os.path.join(self.project, 'fur1', 'cache', 'frame.0002.fur')
+        remove = os.remove
+        def still_open(path):
+            if path == locked:
+                raise OSError(13, "Permission denied", path)
+            remove(path)
+        os.remove = still_open
+        try:
+            stats = remove_tree(self.project, threads=3)
+        finally:
+            os.remove = remove
+        self.assertEqual((stats['files'], stats['bytes'], stats['failed']), (files - 1, size - 100, 1))
+        # everything else is gone
+        self.assertEqual(os.listdir(self.project), ['fur1'])
+        self.assertEqual(os.listdir(os.path.dirname(locked)), ['frame.0002.fur'])
+
+    def test_remove_missing_tree(self):
+        stats = remove_tree(os.path.join(self.tmp, 'missing'))
+        self.assertEqual(stats['files'], 0)
+
+    def test_trash_tree(self):
+        make_tree(self.project)
+        trash = os.path.join(self.tmp, '.trash')
+        spawned = []
+        original = rrt.hpc.release._spawn_purge
+        rrt.hpc.release._spawn_purge = lambda: spawned.append(True)
+        try:
+            trash_tree(self.project, trash)
+        finally:
+            rrt.hpc.release._spawn_purge = original
+        self.assertFalse(os.path.exists(self.project))
+        self.assertEqual(len(os.listdir(trash)), 1)
+        self.assertEqual(spawned, [True])
+        empty_trash(trash)
+        self.assertEqual(os.listdir(trash), [])
+
+    def test_prune_shards(self):
+        for name in ('20101016', '20101017', '20101018', 'cache'):
+            os.makedirs(os.path.join(self.tmp, name))
+        open(os.path.join(self.tmp, '20101016', 'busy'), 'wb').close()
+        prune_shards(self.tmp, today='20101018')
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         ['20101016', '20101018', '20261018120000', 'cache'])
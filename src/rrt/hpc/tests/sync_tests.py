@@ -0,0 +1,99 @@
+import os, shutil, tempfile, unittest
+from rrt.hpc.sync import sync_tree, link_mirror, STATE_FILE
+import rrt.hpc.sync
+
+class TestSync(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, 'project')
+        self.dst = os.path.join(self.tmp, 'mirror')
+        for name in ('furFiles/shot1', 'furImages', 'scenes'):
+            os.makedirs(os.path.join(self.src, name))
+        self._write('furFiles/shot1/a.fur', 'a' * 100)
+        self._write('furFiles/shot1/b.fur', 'b' * 200)
+        self._write('furImages/map.tif', 'c' * 300)
+        self._write('scenes/shot1.ma', 'not synced')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, rel, data, mtime=None):
+        path = os.path.join(self.src, *rel.split('/'))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_only_changes_are_copied(self):
+        stats = sync_tree(self.src, self.dst, ['fur*'])
+        self.assertEqual((stats['copied_files'], stats['copied_bytes']), (3, 600))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'scenes')))
+
+        stats = sync_tree(self.src, self.dst, ['fur*'])
+        self.assertEqual((stats['copied_files'], stats['skipped_bytes']), (0, 600))
+
+        self._write('furFiles/shot1/a.fur', 'A' * 150)
+        stats = sync_tree(self.src, self.dst, ['fur*'])
+        self.assertEqual((stats['copied_files'], stats['copied_bytes']), (1, 150))
+        with open(os.path.join(self.dst, 'furFiles', 'shot1', 'a.fur'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'A' * 150)
+
+    def test_changed_mirror_is_copied_again(self):
+        sync_tree(self.src, self.dst, ['fur*'])
+        # a job rewrote its (hardlinked) copy in place
+        with open(os.path.join(self.dst, 'furImages', 'map.tif'), 'wb') as fh:
+            fh.write('x' * 300)
+        os.utime(os.path.join(self.dst, 'furImages', 'map.tif'), (1000, 1000))
+        stats = sync_tree(self.src, self.dst, ['fur*'])
+        self.assertEqual(stats['copied_files'], 1)
+        with open(os.path.join(self.dst, 'furImages', 'map.tif'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'c' * 300)
+        self.assertEqual(sync_tree(self.src, self.dst, ['fur*'])['copied_files'], 0)
+
+    def test_hash_skips_touched_files(self):
+        rel = os.path.join('furImages', 'map.tif')
+        sync_tree(self.src, self.dst, ['furImages'], hashes={rel: 'abc'})
+        self._write('furImages/map.tif', 'c' * 300, mtime=1000)
+        stats = sync_tree(self.src, self.dst, ['furImages'], hashes={rel: 'abc'})
+        self.assertEqual(stats['copied_files'], 0)
+
+    def test_large_files_and_pruning(self):
+        original = rrt.hpc.sync.SYNC_LARGE_FILE
+        rrt.hpc.sync.SYNC_LARGE_FILE = 250
+        try:
+            stats = sync_tree(self.src, self.dst, ['fur*'], threads=2)
+        finally:
+            rrt.hpc.sync.SYNC_LARGE_FILE = original
+        self.assertEqual(stats['copied_files'], 3)
+        os.remove(os.path.join(self.src, 'furImages', 'map.tif'))
+        sync_tree(self.src, self.dst, ['fur*'])
+        self.assertFalse(os.path.exists(os.path.join(self.dst, 'furImages', 'map.tif')))
+
+    def test_manifest_files(self):
+        self._write('scenes/tex.tif', 't' * 50)
+        stats = sync_tree(self.src, self.dst, ['fur*'], files=[os.path.join('scenes', 'tex.tif'),
+                                                               os.path.join('scenes', 'gone.tif')])
+        self.assertEqual((stats['copied_files'], stats['copied_bytes']), (4, 650))
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, 'scenes', 'tex.tif')))
+        # another job's manifest doesn't list it, but it stays in the mirror
+        stats = sync_tree(self.src, self.dst, ['fur*'])
+        self.assertEqual(stats['copied_files'], 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, 'scenes', 'tex.tif')))
+        stats = sync_tree(self.src, self.dst, ['fur*'], files=[os.path.join('scenes', 'tex.tif')])
+        self.assertEqual((stats['copied_files'], stats['skipped_files']), (0, 4))
+
+    def test_link_mirror(self):
+        self._write('scenes/tex.tif', 't' * 50)
+        tex = os.path.join('scenes', 'tex.tif')
+        sync_tree(self.src, self.dst, ['fur*'], files=[tex])
+        open(os.path.join(self.dst, 'furImages', 'map.tif.part'), 'wb').close()
+        job = os.path.join(self.tmp, 'job')
+        self.assertEqual(link_mirror(self.dst, job, ['fur*'], [tex]), (4, 650))
+        self.assertTrue(os.path.isfile(os.path.join(job, tex)))
+        # another job's node project gets neither this job's files nor the bookkeeping
+        other = os.path.join(self.tmp, 'other')
+        self.assertEqual(link_mirror(self.dst, other, ['fur*']), (3, 600))
+        self.assertFalse(os.path.exists(os.path.join(other, 'scenes')))
+        self.assertFalse(os.path.exists(os.path.join(other, STATE_FILE)))
+        self.assertEqual(os.listdir(os.path.join(other, 'furImages')), ['map.tif'])
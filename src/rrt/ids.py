@@ -0,0 +1,113 @@
+"""
+Job ids: unique, and sorted by when they were made.
+
+An id is the time to the millisecond, the node that made it and a sequence
+number::
+
+    20101018120000123-ws042-4f01a2
+
+Ids made by one process never repeat and sort in the order they were made;
+ids from other processes or nodes differ in node name or sequence (which
+starts at a random number), so scripts submitting hundreds of jobs a second
+(`new_ids`) get an id each.  Ids still start with the submit date and time,
+like the older second resolution ids (``20101018120000``), so tools that
+read the date from an id work with both.
+
+Job directories on the log and output shares and on the nodes are sharded
+by submit date (`job_dir`), so no one directory collects every job.
+
+hpc-spool uses this module from IronPython, so it only uses the standard
+library.
+"""
+import os, re, time, socket, random, threading, datetime
+
+# digits of the date at the front of an id, and the name of its shard
+SHARD_DIGITS = 8
+_SEQUENCE_LIMIT = 0xffffff
+
+_ID = re.compile(r'^\d{17}-[a-z0-9]+-[0-9a-f]{6}$')
+_SHARD = re.compile(r'^\d{%d}$' % SHARD_DIGITS)
+_lock = threading.Lock()
+_last = [0, random.randint(0, _SEQUENCE_LIMIT // 2)]
+
+def node_name(host=None):
+    """The host name as it's written in ids: lower case letters and digits."""
+    name = re.sub('[^a-z0-9]', '', (host or socket.gethostname()).lower())
+    return name[:15] or 'node'
+
+def _format(millis, node, sequence):
+    stamp = time.strftime('%Y%m%d%H%M%S', time.localtime(millis // 1000))
+    return '%s%03d-%s-%06x' % (stamp, millis % 1000, node, sequence)
+
+def new_ids(count, node=None):
+    """Returns `count` new ids, in order."""
+    node = node_name(node)
+    ids = []
+    with _lock:
+        millis, sequence = _last
+        now = int(time.time() * 1000)
+        if now > millis:
+            millis = now
+            sequence = random.randint(0, _SEQUENCE_LIMIT // 2)
+        for i in range(count):
+            sequence += 1
+            if sequence > _SEQUENCE_LIMIT:
+                # borrow the next millisecond rather than sort out of order
+                millis += 1
+                sequence = 0
+            ids.append(_format(millis, node, sequence))
+        _last[:] = [millis, sequence]
+    return ids
+
+def new_id(node=None):
+    return new_ids(1, node)[0]
+
+def is_id(value):
+    """True for ids made by `new_ids` (not the older second resolution ones)."""
+    return bool(_ID.match(value or ''))
+
+def id_time(job_id):
+    """When an id (of either kind) was made, to the second."""
+    return datetime.datetime.strptime(job_id[:14], '%Y%m%d%H%M%S')
+
+def shard(job_id):
+    """The date directory a job's directories go in, or None for older ids."""
+    if is_id(job_id):
+        return job_id[:SHARD_DIGITS]
+    return None
+
+def job_dir(root, job_id):
+    """
+    Where a job's directory goes under `root`: ``root\\<date>\\<id>``, or
+    ``root\\<id>`` for older ids.
+    """
+    date = shard(job_id)
+    if date:
+        return os.path.join(root, date, job_id)
+    return os.path.join(root, job_id)
+
+def job_dirs(root, low=None, high=None):
+    """
+    Yields (id, path) for every job directory under `root`, in either
+    layout, newest first.  `low` and `high` ('YYYYMMDD') skip whole dates.
+    """
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    # a date's shard sorts ahead of the older ids from that date
+    names.sort(key=lambda name: _SHARD.match(name) and name + '~' or name, reverse=True)
+    for name in names:
+        date = name[:SHARD_DIGITS]
+        if (low and date < low) or (high and date > high):
+            continue
+        path = os.path.join(root, name)
+        if not _SHARD.match(name):
+            yield name, path
+            continue
+        try:
+            jobs = os.listdir(path)
+        except OSError:
+            continue
+        for job_id in sorted(jobs, reverse=True):
+            yield job_id, os.path.join(path, job_id)
@@ -0,0 +1,158 @@
+"""
+Reads and writes job (ini) files: one ``key = value`` per line, with ``#``
+comment lines::
+
+    # Created for jdoe on 2010-10-18 12:00:00 by rrt-1.0
+    renderer = maya_render_sw
+    name = shot
+    scene = S:\\projects\\shot\\scenes\\shot.ma
+    ...
+
+Values are written as they are, backslashes and all, unless they couldn't
+be read back that way (line breaks, white space at either end, or a leading
+double quote), in which case they're written in double quotes with
+backslash escapes.  Everything after the first ``=`` is the value, so ``#``
+and ``=`` in titles and paths are safe.
+
+Used by `rrt.jobspec` and by hpc-spool, which runs under IronPython, so
+this module only uses the standard library and `rrt.frames`.
+"""
+from rrt.frames import FrameSet, parse_chunk
+
+class Field(object):
+    """How one kind of job file value is read (`decode`) and written (`encode`)."""
+
+    def __init__(self, name, decode=None, encode=None):
+        self.name = name
+        self._decode = decode
+        self._encode = encode
+
+    def decode(self, text):
+        if not text or self._decode is None:
+            return text
+        return self._decode(text)
+
+    def encode(self, value):
+        if value is None:
+            return ''
+        if self._encode is not None:
+            return self._encode(value)
+        return str(value)
+
+    def __repr__(self):
+        return 'Field(%r)' % self.name
+
+TEXT = Field('text')
+# windows paths, written with their backslashes as they are
+PATH = Field('path')
+INT = Field('int', int)
+FRAMES = Field('frames', FrameSet.parse)
+CHUNK = Field('chunk', parse_chunk)
+
+# in the order they're written
+JOB_FIELDS = (
+    ('renderer', TEXT),
+    ('name', TEXT),
+    ('project', PATH),
+    ('output', PATH),
+    ('scene', PATH),
+    ('logs', PATH),
+    ('start', INT),
+    ('end', INT),
+    ('threads', INT),
+    ('step', INT),
+    ('frames', FRAMES),
+    ('chunk', CHUNK),
+    ('order', TEXT),
+    ('costs', PATH),
+    ('uuid', TEXT),
+    ('net_drive', TEXT),
+    ('net_share', PATH),
+    ('manifest', PATH),
+)
+FIELD_TYPES = dict(JOB_FIELDS)
+
+_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_UNESCAPES = {'\\': '\\', '"': '"', 'n': '\n', 'r': '\r', 't': '\t'}
+
+def quote(value):
+    """A value as it's written in a job file."""
+    if value and (value[0] == '"' or value[0].isspace() or value[-1].isspace() or
+                  '\n' in value or '\r' in value):
+        return '"%s"' % ''.join([_ESCAPES.get(c, c) for c in value])
+    return value
+
+def unquote(text):
+    """Reverses `quote`."""
+    if len(text) < 2 or text[0] != '"' or text[-1] != '"':
+        return text
+    chars = []
+    i, end = 1, len(text) - 1
+    while i < end:
+        c = text[i]
+        if c == '\\' and i + 1 < end:
+            i += 1
+            c = _UNESCAPES.get(text[i], '\\' + text[i])
+        chars.append(c)
+        i += 1
+    return ''.join(chars)
+
+def loads(text):
+    """Returns a job file's values, as a dict of strings."""
+    data = {}
+    # not splitlines(), which breaks unicode (IronPython) strings on more than \n
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line or line[0] == '#':
+            continue
+        key, sep, value = line.partition('=')
+        if sep:
+            data[key.strip()] = unquote(value.strip())
+    return data
+
+def dumps(data, comment=None, fields=JOB_FIELDS):
+    """
+    Writes `data` as a job file: every one of `fields` (blank if `data`
+    doesn't have it) then anything else `data` has, sorted.
+    """
+    lines = []
+    if comment:
+        lines.append('# ' + ' '.join(comment.splitlines()))
+    known = set()
+    for key, field in fields:
+        known.add(key)
+        lines.append('%s = %s' % (key, quote(field.encode(data.get(key)))))
+    for key in sorted(data):
+        if key not in known:
+            lines.append('%s = %s' % (key, quote(TEXT.encode(data[key]))))
+    lines.append('')
+    return '\n'.join(lines)
+
+def decode(data, types=FIELD_TYPES):
+    """
+    The typed values of a job file's strings (from `loads`): ints,
+    `FrameSet` frame lists and chunk sizes; blank values are None.
+    Raises ValueError for values that aren't their field's type.
+    """
+    typed = {}
+    for key, text in data.items():
+        field = types.get(key, TEXT)
+        if field is TEXT or field is PATH:
+            typed[key] = text
+        elif text:
+            try:
+                typed[key] = field.decode(text)
+            except ValueError, e:
+                raise ValueError("%s: %s" % (key, e))
+        else:
+            typed[key] = None
+    return typed
+
+def load(path):
+    """Reads a job file, as a dict of strings."""
+    with open(path, 'rb') as fh:
+        return loads(fh.read())
+
+def dump(path, data, comment=None):
+    with open(path, 'wb') as fh:
+        fh.write(dumps(data, comment))
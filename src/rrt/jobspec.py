@@ -1,36 +1,42 @@
-import os, string, getpass, re, datetime
+import os, getpass, datetime
 import rrt
-from rrt.settings import HPC_SPOOL_BIN, JOBSPEC_DIR, JOB_LOGS_UNC
+from rrt.settings import HPC_SPOOL_BIN, JOBSPEC_DIR, JOB_LOGS_UNC, ASSET_STORE_UNC
 from rrt.filesystem import get_share
+from rrt.frames import parse_chunk, FrameSet, AUTO_CHUNK, ORDERS, ORDER_ASCENDING
+from rrt.manifest import write_manifest
+from rrt import jobfile
+from rrt.ids import new_id, job_dir
+from rrt.assetstore import AssetStore
+from rrt.validation import REQUIRED_FIELDS
 from rrt import RinglingException
 
+LOG = rrt.get_log(__name__)
+
 class JobSpecError(RinglingException): pass
 
+# a copy of each submitted job file is kept with the job's logs
+PUBLISHED_JOB_FILE = 'job.ini'
+# and so is its manifest, where the nodes can read it
+PUBLISHED_MANIFEST_FILE = 'manifest.json'
+
+def read_job_file(path):
+    """
+    Returns the key/value pairs in a job (ini) file as a dict of strings.
+    """
+    return jobfile.load(path)
+
 class JobSpec(object):
     @staticmethod
     def new_uuid(): 
-        return re.sub('[%s]'% re.escape(' -:'),
-                  '', 
-                  str(datetime.datetime.now()).split('.')[0])
-    
-    INI_TEMPLATE = string.Template("""
-    # Created for $user on $date by $version
-    renderer = $renderer
-    name = $title
-    project = $project
-    output = $output
-    scene = $scene
-    logs = $logs
-    start = $start
-    end = $end
-    threads = $threads
-    step = $step
-    uuid = $uuid
-    net_drive = $net_drive
-    net_share = $net_share
-    """)
-
+        # unique even for jobs submitted in the same second, see rrt.ids
+        return new_id()
+    
     _job_data = {}
+    # manifest entries, see set_manifest, or what makes them, see defer_manifest
+    _manifest = None
+    _manifest_source = None
+    # what plans the job in the background, see defer_plan
+    _plan_source = None
     
     def _get_data(self):
         return self._job_data
@@ -46,14 +52,33 @@ class JobSpec(object):
         self._job_data['date'] = now
         self._job_data['version'] = rrt.get_version()
         self._job_data['user'] = getpass.getuser()
-        self._job_data['logs'] = os.path.join(JOB_LOGS_UNC, 
-                                                  getpass.getuser(), 
-                                                  self._job_data['uuid'], 
-                                                  self._job_data['title']+'.*.txt')
+        self._job_data.setdefault('manifest', '')
+        self._job_data.setdefault('costs', '')
+        self._job_data['order'] = self._job_data.get('order') or ORDER_ASCENDING
+        if self._job_data['order'] not in ORDERS:
+            raise JobSpecError("Frame order must be one of: %s." % ', '.join(ORDERS))
+        self._job_data['logs'] = os.path.join(job_dir(os.path.join(JOB_LOGS_UNC, getpass.getuser()),
+                                                      self._job_data['uuid']),
+                                              self._job_data['title']+'.*.txt')
+        
+        if self._job_data.get('frames'):
+            # a frame list wins over start/end/step, which are kept in step
+            try:
+                frames = FrameSet.parse(self._job_data['frames'])
+            except ValueError, e:
+                raise JobSpecError("Bad frame list: %s" % e)
+            self._job_data['frames'] = str(frames)
+            self._job_data['start'], self._job_data['end'] = frames.first, frames.last
+        else:
+            self._job_data['frames'] = ''
         
-        for k in ['renderer', 'title', 'project', 'scene', 'start', 'end', 'step', 'output']:
+        for k in REQUIRED_FIELDS:
             if not self._job_data.get(k, False):
                 raise JobSpecError("%s cannot be blank." % k)
+        try:
+            self._job_data['chunk'] = parse_chunk(self._job_data.get('chunk', 1))
+        except ValueError:
+            raise JobSpecError("Frames per task must be a positive number or '%s'." % AUTO_CHUNK)
         try:
             self._job_data['net_share'] = get_share(self._job_data['project'])
         except Exception:
@@ -70,33 +95,194 @@ class JobSpec(object):
         data.update(kwargs)
         self._set_data(data)
     
+    # worked out by _set_data each time, so never read back from a job file
+    _GENERATED_KEYS = ('date', 'version', 'user', 'logs', 'net_share', 'net_drive')
+    
+    @classmethod
+    def ini_to_data(cls, path):
+        """
+        A job (ini) file's values as JobSpec data: the title is saved as
+        `name`, and the generated keys are left out.
+        """
+        data = read_job_file(path)
+        data['title'] = data.pop('name', None)
+        for key in cls._GENERATED_KEYS:
+            data.pop(key, None)
+        return data
+
+    @classmethod
+    def from_ini(cls, path):
+        """
+        Loads a job (ini) file, like the ones written by `_write_ini_file`.
+        """
+        data = cls.ini_to_data(path)
+        try:
+            return cls(**data)
+        except TypeError:
+            raise JobSpecError("%s is not a complete job file." % path)
+    
     def filter_text(self, s):
         return self._filter_text_pattern.sub('', s).strip()
     
     @property
     def ini_data(self):
         """
-        Generates the content for a job (ini) file.
+        Generates the content for a job (ini) file (see `rrt.jobfile`).
         """
-        return self.INI_TEMPLATE.substitute(self._job_data) 
+        data = dict(self._job_data)
+        data['name'] = data.pop('title')
+        comment = "Created for %(user)s on %(date)s by %(version)s" % self._job_data
+        for key in ('user', 'date', 'version'):
+            data.pop(key)
+        return jobfile.dumps(data, comment)
 
-    def _write_ini_file(self):
+    def _write_ini_file(self, directory=None):
         """
         Writes a job definition (ini) string to a file, using the last 
-        generated job_uuid (datetime) and scene name.  
-        The file's dir is specified in `rrt.settings.JOBSPEC_DIR`, and 
-        the creation of that dir is handled by this method (as needed).
+        generated job uuid (see `rrt.ids`).  
+        The file's dir is specified in `rrt.settings.JOBSPEC_DIR` (unless 
+        `directory` is given), and the creation of that dir is handled by 
+        this method (as needed).
         """
-        if not os.path.isdir(JOBSPEC_DIR):
-            os.makedirs(JOBSPEC_DIR)
-        file_path = os.path.join(JOBSPEC_DIR,self._job_data['uuid']+'.ini')
+        directory = directory or JOBSPEC_DIR
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        file_path = os.path.join(directory,self._job_data['uuid']+'.ini')
         with open(file_path,'w+b') as fh:
             fh.write(self.ini_data)
+        if self._manifest is not None:
+            write_manifest(os.path.join(directory, self._job_data['uuid']+'.manifest.json'),
+                           self._manifest)
         return file_path
     
-    def submit_job(self, pause=False):
+    @property
+    def log_dir(self):
+        return os.path.dirname(self._job_data['logs'])
+    
+    def set_manifest(self, entries):
+        """
+        Lists the files the job needs (see `rrt.dependencies`), so node prep 
+        only copies those.  The manifest is written next to the job file, 
+        and published with the logs when the job is submitted.
+        """
+        self._manifest = list(entries)
+        self._manifest_source = None
+        self._job_data['manifest'] = os.path.join(self.log_dir, PUBLISHED_MANIFEST_FILE)
+    
+    def defer_manifest(self, source):
+        """
+        Like `set_manifest`, but the entries are made by `prepare_submit`:
+        `source()` returns (entries, missing paths).  Statting and hashing
+        every file is slow, and the submit windows prepare jobs off their
+        own thread (see `rrt.submitqueue`).
+        """
+        self._manifest_source = source
+        self._job_data['manifest'] = os.path.join(self.log_dir, PUBLISHED_MANIFEST_FILE)
+    
+    def _make_manifest(self, progress):
+        source, self._manifest_source = self._manifest_source, None
+        if source is None:
+            return
+        entries, missing = source()
+        for path in missing:
+            progress("Scene uses a file that doesn't exist: %s" % path)
+        progress("%d files in the job manifest." % len(entries))
+        self._manifest = list(entries)
+    
+    def defer_plan(self, source):
+        """
+        Has `prepare_submit` plan the job from earlier renders and order its
+        frames by the plan (see `rrt.planner`): `source()` returns the Plan,
+        or None without history.  Planning reads the logs of earlier jobs,
+        so it's kept off the submit windows' thread like the manifest.
+        """
+        self._plan_source = source
+    
+    def _make_plan(self, progress):
+        source, self._plan_source = self._plan_source, None
+        if source is None:
+            return
+        from rrt.planner import apply_plan
+        try:
+            plan = source()
+        except Exception, e:
+            # the job still renders, just in order
+            progress("Could not plan the job: %s" % e)
+            return
+        if plan is None:
+            progress("No earlier renders to order frames by, rendering in order.")
+            return
+        progress("Recommended: %s" % plan)
+        apply_plan(self, plan)
+    
+    def _store_assets(self, store=None):
+        """
+        Uploads the manifest's files to the asset store (see `rrt.assetstore`), 
+        unless they're already there, and notes each one's blob in the 
+        manifest.  Files that didn't make it are copied the old way.
+        """
+        if self._manifest is None or not (store or ASSET_STORE_UNC):
+            return None
+        store = store or AssetStore()
+        archive = self._job_data['project'] if self._job_data['renderer'] == 'max' else None
+        try:
+            return store.store_manifest(self._manifest, archive)
+        except Exception, e:
+            LOG.warning("Could not add the job's files to the asset store: %s" % e)
+            return None
+    
+    def _publish_manifest(self):
+        if self._manifest is None:
+            return
+        try:
+            if not os.path.isdir(self.log_dir):
+                os.makedirs(self.log_dir)
+            write_manifest(self._job_data['manifest'], self._manifest)
+        except (IOError, OSError), e:
+            # the nodes fall back to copying everything
+            LOG.warning("Could not publish the job manifest: %s" % e)
+            self._job_data['manifest'] = ''
+    
+    def _publish(self):
+        """
+        Copies the job file in with the job's logs, where later submissions 
+        of the same scene find it (see `rrt.planner`).
+        """
+        try:
+            if not os.path.isdir(self.log_dir):
+                os.makedirs(self.log_dir)
+            with open(os.path.join(self.log_dir, PUBLISHED_JOB_FILE), 'wb') as fh:
+                fh.write(self.ini_data)
+        except (IOError, OSError), e:
+            # only costs us history, never the submission
+            LOG.warning("Could not publish the job file: %s" % e)
+    
+    def prepare_submit(self, progress=None):
+        """
+        Plans the job and makes the manifest (if they were deferred), stores
+        and publishes everything the job needs, and writes its job file.
+        Returns the job file's path, for `spool_command`.  `progress` is
+        given messages for the user (they're logged otherwise).
+        """
+        self._make_plan(progress or LOG.info)
+        self._make_manifest(progress or LOG.info)
+        self._store_assets()
+        # before the job file, which must not point at a missing manifest
+        self._publish_manifest()
         fp = self._write_ini_file()
-        cmd = '%s "%s"' % (HPC_SPOOL_BIN, fp)
+        self._publish()
+        return fp
+    
+    def spool_command(self, fp):
+        return [HPC_SPOOL_BIN, fp]
+    
+    def submit_job(self, pause=False):
+        """
+        Submits the job, waiting for hpc-spool.  The submit windows use 
+        `rrt.submitqueue` instead, which doesn't wait.
+        """
+        fp = self.prepare_submit()
+        cmd = '%s "%s"' % tuple(self.spool_command(fp))
         if pause:
             cmd += " & pause"
         os.system(cmd)
@@ -0,0 +1,25 @@
+"""
+Job manifests: the files a job needs, as json::
+
+    {"version": 1, "files": [{"path": ..., "size": ..., "mtime": ..., "hash": ...}]}
+
+For Max jobs the paths are archive member names, for Maya jobs they are
+paths on the project share.  Only "path" is required.
+"""
+import json
+
+MANIFEST_VERSION = 1
+
+def read_manifest(path):
+    """Returns the list of file entries in a manifest."""
+    with open(path, 'rb') as fh:
+        data = json.load(fh)
+    return data.get('files', [])
+
+def write_manifest(path, entries):
+    with open(path, 'wb') as fh:
+        json.dump({'version': MANIFEST_VERSION, 'files': entries}, fh, indent=1)
+
+def manifest_paths(path):
+    """Returns the set of paths listed in a manifest."""
+    return set([entry['path'] for entry in read_manifest(path)])
@@ -1,35 +1,37 @@
-import sys, os, zipfile, getpass, re, textwrap
+import sys, os, getpass, re, textwrap
 from PyQt4 import QtGui, QtCore
 from rrt.max.ui.submit import Ui_SubmitMainWindow
 from rrt.jobspec import JobSpec
-from rrt.settings import JOB_OUTPUT_UNC
+from rrt.frames import FrameSet, AUTO_CHUNK, ORDER_ASCENDING, ORDER_LONGEST, \
+    ORDER_INTERLEAVE
+from rrt.planner import recommend
+from rrt.dependencies import archive_entries
+from rrt.archiveindex import get_index
+from rrt.settings import JOB_OUTPUT_UNC, NODE_CORES
+from rrt.ids import job_dir
+from rrt.verify import IMAGE_EXT
+from rrt.validation import validate, errors
+from rrt.submitqueue import get_queue, SUBMITTED
+
 
-IMAGE_EXT = [
-#    '.avi', 
-    '.bmp', 
-    '.cin', 
-    '.eps', '.ps', 
-    '.exr', '.fxr', '.hdr', 
-    '.pic', 
-    '.jpg', '.jpe', '.jpeg', 
-    '.png', 
-    '.rgb', '.rgba', 
-    '.sgi', '.int', '.inta', '.bw', 
-    '.rla', 
-    '.rpf', 
-    '.tga', '.vda', '.icb', 
-    '.vst', 
-    '.tif', 
-    '.dds'
-]
 class SubmitGui(QtGui.QDialog, Ui_SubmitMainWindow):
+    # frame order choices, and the job file values they stand for
+    ORDER_LABELS = [('In Order', ORDER_ASCENDING), ('Longest First', ORDER_LONGEST),
+                    ('Preview Passes', ORDER_INTERLEAVE)]
+    # how often (ms) a background submission's progress is shown
+    SUBMIT_POLL = 100
+    _submission = None
+
     def __init__(self, parent=None):
         super(SubmitGui, self).__init__(parent)
         self.setupUi(self)
         self.setWindowTitle('hpc-submit-max')
         self.setWindowIcon(QtGui.QIcon("C:/Ringling/hpc/icons/hpcicon3-01.png"))
         self.output_ext_field.addItems(sorted(IMAGE_EXT))
+        self.order_field.addItems([label for label, order in self.ORDER_LABELS])
         self._setup_validators()
+        self._submit_timer = QtCore.QTimer(self)
+        self.connect(self._submit_timer, QtCore.SIGNAL('timeout()'), self.poll_submission)
 
     def _setup_validators(self):
         """
@@ -43,8 +45,11 @@ class SubmitGui(QtGui.QDialog, Ui_SubmitMainWindow):
         if filename:
             self.scene_field.clear()
             self.project_field.setText(filename)
-            zf = zipfile.ZipFile(open(filename,'rb'))
-            self.scene_field.addItems([f for f in zf.namelist() if f.lower().endswith('.max')])
+            # archives browsed before are listed without reading them again
+            try:
+                self.scene_field.addItems(get_index().scenes(str(filename)))
+            except Exception, e:
+                self.alert("Can't read %s: %s" % (filename, e))
     
     @property
     def job_data(self):
@@ -58,29 +63,91 @@ class SubmitGui(QtGui.QDialog, Ui_SubmitMainWindow):
                 'uuid'      : job_uuid,
                 'project'   : os.path.normpath(str(self.project_field.text())),
                 'scene'     : str(self.scene_field.currentText()),
-                'output'    : os.path.join(JOB_OUTPUT_UNC, getpass.getuser(), 
-                                           job_uuid, 
+                'output'    : os.path.join(job_dir(os.path.join(JOB_OUTPUT_UNC, getpass.getuser()),
+                                                   job_uuid),
                                            image_filename),
                 'start'     : start_frame,
                 'end'       : end_frame,
                 'step'      : str(self.step_field.value()),
+                # the spinbox minimum (0) is displayed as "auto"
+                'chunk'     : self.chunk_field.value() or AUTO_CHUNK,
+                'order'     : self.job_order,
                 'threads'   : 0
                 }
     
+    @property
+    def job_order(self):
+        return self.ORDER_LABELS[self.order_field.currentIndex()][1]
+
+    def _plan_source(self):
+        """
+        Returns a function planning the job from earlier renders of the
+        scene (see `rrt.planner`), which can run on another thread.
+        """
+        data = self.job_data
+        frames = FrameSet.from_range(data['start'], data['end'], data['step'])
+        # max renders a frame with every core on a node
+        return lambda: recommend(data['scene'], data['project'], frames,
+                                 threads_choices=(NODE_CORES,), order=data['order'])
+
+    def plan(self):
+        """
+        Plans the job from earlier renders of the scene (see `rrt.planner`),
+        or returns None if there aren't any.
+        """
+        return self._plan_source()()
+
+    def show_plan(self):
+        try:
+            plan = self.plan()
+        except Exception, e:
+            self.plan_label.setText("Could not plan the job: %s" % e)
+            return
+        if plan is None:
+            self.plan_label.setText("No earlier renders of this scene.")
+        else:
+            self.plan_label.setText("Recommended: %s" % plan)
+
     def submit_job(self):
         try:
-            spec = JobSpec(**self.job_data)
-            # TODO: find a better place to do this.
-            if not str(self.output_base_field.text()):
-                raise RuntimeError("Output cannot be blank.")
-            spec.submit_job()
-            self.quit()
+            data = self.job_data
+            problems = errors(validate(data))
+            if problems:
+                raise RuntimeError('\n'.join([str(p) for p in problems]))
+            spec = JobSpec(**data)
+            if self.job_order == ORDER_LONGEST:
+                # the submit queue reads the history, in the background
+                spec.defer_plan(self._plan_source())
+            # the archive is the scene's dependencies, see rrt.dependencies
+            # listed in the background, by the submit queue
+            archive = spec.data['project']
+            spec.defer_manifest(lambda: (archive_entries(archive), []))
+            # hpc-spool runs in the background, see rrt.submitqueue
+            self._submission = get_queue().submit(spec)
+            self.submit_button.setEnabled(False)
+            self._submit_timer.start(self.SUBMIT_POLL)
         except Exception, e:
-            alert = QtGui.QMessageBox(self)
-            alert.setWindowTitle('Error')
-            alert.setIcon(QtGui.QMessageBox.Warning)
-            alert.setText(str(e))
-            alert.exec_()
+            self.alert(str(e))
+    
+    def poll_submission(self):
+        submission = self._submission
+        for message in submission.poll():
+            self.plan_label.setText(message)
+        if not submission.finished:
+            return
+        self._submit_timer.stop()
+        self.submit_button.setEnabled(True)
+        if submission.state == SUBMITTED:
+            self.quit()
+        else:
+            self.alert(submission.error)
+    
+    def alert(self, text):
+        alert = QtGui.QMessageBox(self)
+        alert.setWindowTitle('Error')
+        alert.setIcon(QtGui.QMessageBox.Warning)
+        alert.setText(text)
+        alert.exec_()
     
     def quit(self): 
         self.done(0)
@@ -89,6 +156,9 @@ def submit_gui():
     app = QtGui.QApplication(sys.argv)
     gui = SubmitGui()
     gui.show()
-    sys.exit(app.exec_())
+    status = app.exec_()
+    # a submission still going when the window closed is seen through
+    get_queue().wait()
+    sys.exit(status)
     
 if __name__ == '__main__': submit_gui()
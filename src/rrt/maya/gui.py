@@ -2,7 +2,7 @@ import os, re, string, getpass
 
 import rrt
 from rrt.maya.shortcuts import scene_is_dirty, get_job_type, get_scene_name,\
-    get_frame_range
+    get_frame_range, get_scene_dependencies
 
 from pymel import versions
 from pymel.core.system import workspace, sceneName
@@ -12,10 +12,26 @@ from pymel.core import frameLayout, button, menuItem, columnLayout,\
     confirmBox
 from pymel.core.language import scriptJob
 from rrt.jobspec import JobSpec
+from rrt.frames import FrameSet, AUTO_CHUNK, ORDER_ASCENDING, ORDER_LONGEST, \
+    ORDER_INTERLEAVE
+from rrt.planner import recommend
+from rrt.dependencies import manifest_entries
+from rrt.validation import validate, errors, ERROR
+from rrt.submitqueue import get_queue, FAILED
+from maya.utils import executeDeferred
 from rrt.settings import JOB_OUTPUT_UNC
+from rrt.ids import job_dir
 
 LOG = rrt.get_log('hpcSubmit')
 
+def _report(submission, message):
+    """
+    Logs a background submission's progress.  Called on the submit queue's 
+    thread, so the logging is handed to maya's.
+    """
+    log = LOG.error if submission.state == FAILED else LOG.info
+    executeDeferred(log, message)
+
 class SubmitGui:
     """ A python singleton """
 
@@ -58,11 +74,13 @@ class SubmitGui:
         _controls = {}
         # a regex used to strip out bad chars in filenames
         _filter_text_pattern = re.compile('[%s]' % re.escape(string.punctuation))
-        _allowed_punctuation = r'/\._-'
-        _illegal_path = re.sub('[%s]' % re.escape(_allowed_punctuation),'',string.punctuation)
         
         def filter_text(self, s):
             return self._filter_text_pattern.sub('', s).strip()
+        
+        # frame order menu labels, and the job file values they stand for
+        _order_labels = [('In Order', ORDER_ASCENDING), ('Longest First', ORDER_LONGEST),
+                         ('Preview Passes', ORDER_INTERLEAVE)]
 
         # references to key controls
         @property
@@ -80,6 +98,18 @@ class SubmitGui:
             """
             return int(self._controls['threads'].getValue())
         
+        @property
+        def job_chunk(self):
+            """
+            Frames rendered per task; 0 in the submit window means "auto".
+            """
+            chunk = int(self._controls['chunk'].getValue())
+            return chunk if chunk > 0 else AUTO_CHUNK
+        
+        @property
+        def job_order(self):
+            return dict(self._order_labels)[self._controls['order'].getValue()]
+        
         @property
         def job_start(self):
             return min((int(self._controls['start'].getValue()),int(self._controls['end'].getValue())))
@@ -95,31 +125,60 @@ class SubmitGui:
                     'renderer': get_job_type(),
                     'title': self.job_title,
                     'project': os.path.normpath(workspace.getPath()),
-                    'output': os.path.join(JOB_OUTPUT_UNC, getpass.getuser(), job_uuid),
+                    'output': job_dir(os.path.join(JOB_OUTPUT_UNC, getpass.getuser()), job_uuid),
                     'scene': os.path.normpath(sceneName()),
                     'start': self.job_start,
                     'end': self.job_end,
                     'threads': self.job_threads,
                     'step': int(Scene().defaultRenderGlobals.byFrameStep.get()),
+                    'chunk': self.job_chunk,
+                    'order': self.job_order,
                     'uuid': job_uuid,
             }
         
+        def _plan_source(self):
+            """
+            Returns a function planning the job from earlier renders of the
+            scene (see `rrt.planner`).  Only asking the scene happens here,
+            so the function can run on another thread.
+            """
+            frames = FrameSet.from_range(self.job_start, self.job_end,
+                                         int(Scene().defaultRenderGlobals.byFrameStep.get()))
+            scene = os.path.normpath(sceneName())
+            project = os.path.normpath(workspace.getPath())
+            order = self.job_order
+            return lambda: recommend(scene, project, frames, order=order)
+        
+        def plan(self):
+            """
+            Plans the job from earlier renders of the scene (see `rrt.planner`),
+            or returns None if there aren't any.
+            """
+            return self._plan_source()()
+        
+        def show_plan(self, *args):
+            try:
+                plan = self.plan()
+            except Exception, e:
+                LOG.warning("Could not plan the job: %s" % e)
+                return
+            if plan is None:
+                message = "No earlier renders of this scene."
+            else:
+                message = "Recommended: %s" % plan
+            LOG.info(message)
+            self._controls['plan'].setLabel(message)
+        
         def _is_valid(self):
             LOG.info("Validating submission:")
-            try:
-                JobSpec(**self.job_data)
-            except Exception, err:
-                LOG.warning('Could not build job file...')
-                LOG.error(err)
-                return False
-            if not self.job_title:
-                LOG.error("Job title must not be blank.")
-                return False
-            if ' ' in sceneName():
-                LOG.error("Scene name or project path contains spaces. Rename/Save As... before submitting.")
-                return False
-            if re.search('[%s]' % re.escape(self._illegal_path), os.path.splitdrive(sceneName())[1]):
-                LOG.error("Scene name or project path contains illegal characters: e.g. %s -- Rename/Save As... before submitting." % self._illegal_path)
+            # every problem is listed, not just the first (see rrt.validation)
+            problems = validate(self.job_data)
+            for problem in problems:
+                if problem.level == ERROR:
+                    LOG.error(problem)
+                else:
+                    LOG.warning(problem)
+            if errors(problems):
                 return False
             if scene_is_dirty():
                 LOG.warning("File has unsaved changes.  Save before submitting.")
@@ -127,12 +186,28 @@ class SubmitGui:
                     return False
             return True
         
+        def add_manifest(self, spec):
+            """
+            Lists the files the scene uses in the job's manifest, so the
+            nodes only copy those (see `rrt.dependencies`).  Only asking
+            the scene happens here; the files are statted and hashed in the
+            background, by the submit queue.
+            """
+            paths = get_scene_dependencies()
+            spec.defer_manifest(lambda: manifest_entries(paths))
+        
         def submit_job(self, *args, **kwargs):
             if self._is_valid():
                 spec = JobSpec(**self.job_data)
-                LOG.debug(spec.ini_data) 
                 try:
-                    spec.submit_job()
+                    if self.job_order == ORDER_LONGEST:
+                        # the submit queue reads the history, in the background
+                        spec.defer_plan(self._plan_source())
+                    self.add_manifest(spec)
+                    LOG.debug(spec.ini_data) 
+                    # hpc-spool runs in the background, see rrt.submitqueue
+                    get_queue().submit(spec, _report)
+                    LOG.info("Submitting %s in the background." % spec.data['title'])
                 except Exception, e:
                     LOG.error(e)
         
@@ -177,12 +252,17 @@ class SubmitGui:
                                     text(label="Start Frame:")
                                     text(label="End Frame:")
                                     text(label="Frame Step:")
+                                    text(label="Frames/Task:")
                                     text(label="Cores:")
+                                    text(label="Frame Order:")
+                                    text(label="")
                                 with columnLayout() as setCol2:
                                     self._controls['title'] = textField(text=get_scene_name())
                                     self._controls['start'] = intField(value=get_frame_range()[0])
                                     self._controls['end'] = intField(value=get_frame_range()[1])
                                     self._controls['step'] = intField(value=int(SCENE.defaultRenderGlobals.byFrameStep.get()))
+                                    self._controls['chunk'] = intField(value=1, minValue=0,
+                                                                       annotation="Frames rendered per task (0 = auto)")
                                     
                                     with columnLayout(adj=False):
                                         self._controls['threads'] = optionMenu(w=40)
@@ -190,6 +270,14 @@ class SubmitGui:
                                             menuItem(label=1)
                                             menuItem(label=2)
                                         self._controls['threads'].setSelect(1)
+                                        self._controls['order'] = optionMenu()
+                                        with self._controls['order']:
+                                            for label, order in self._order_labels:
+                                                menuItem(label=label)
+                                        button(label="Recommend", 
+                                               annotation="Suggest cores and frames/task from earlier renders of this scene", 
+                                               command=self.show_plan)
+                                    self._controls['plan'] = text(label="", align='left')
                             
                             setForm.attachForm(setCol1, 'left', 4)
                             setForm.attachControl(setCol1, 'right', 2, setCol2)
@@ -1,7 +1,7 @@
 import os
 from pymel.core.language import mel
 from pymel.core.general import SCENE
-from pymel.core.system import sceneName
+from pymel.core.system import sceneName, workspace
 
 def scene_is_dirty():
     """Checks to see if the scene has unsaved changes"""
@@ -20,3 +20,13 @@ def get_scene_name():
 def get_frame_range():
     """Returns a tuple of start and end frame numbers"""
     return (int(SCENE.defaultRenderGlobals.startFrame.get()), int(SCENE.defaultRenderGlobals.endFrame.get()))
+
+def get_scene_dependencies():
+    """
+    Returns the paths of every file the open scene uses (the scene, its
+    references, textures and caches) as maya lists them, with relative
+    paths resolved against the workspace.
+    """
+    project = workspace.getPath()
+    return sorted(set([os.path.normpath(os.path.join(project, path))
+                       for path in mel.eval('file -q -l') or []]))
@@ -1,8 +1,8 @@
-import unittest
+import os, unittest
 import pymel
 from ludibrio import Stub
 from rrt.maya.shortcuts import scene_is_dirty, get_job_type, get_scene_name, \
-    get_frame_range
+    get_frame_range, get_scene_dependencies
 
 class TestShortcuts(unittest.TestCase):
     """
@@ -57,3 +57,14 @@ class TestShortcuts(unittest.TestCase):
         self.assertEqual(frange[1],42)
         for val in frange:
             self.assertTrue(isinstance(val, int))
+    
+    def test_get_scene_dependencies(self):
+        with Stub() as pymel.core.language:
+            from pymel.core.language import mel
+            mel.eval('file -q -l') >> ['S:/shot/scenes/a.mb', 'sourceimages/wood.tif', 'S:/shot/scenes/a.mb']
+        with Stub() as pymel.core.system:
+            from pymel.core.system import workspace
+            workspace.getPath() >> 'S:/shot'
+        self.assertEqual(get_scene_dependencies(),
+                         [os.path.normpath('S:/shot/scenes/a.mb'),
+                          os.path.normpath('S:/shot/sourceimages/wood.tif')])
@@ -0,0 +1,184 @@
+"""
+Plans jobs from how long their frames took before.
+
+Every submitted job file is kept with the job's logs (see
+`rrt.jobspec.PUBLISHED_JOB_FILE`) and the logs are indexed per frame by
+`rrt.renderlog`.  For a new submission the planner finds the most recent
+earlier jobs of the same scene (or failing that, the same project; a Max
+scene is an archive member, so only the same member of the same archive
+counts as the same scene), takes
+each frame's render time from them, and simulates the cluster working
+through the job to pick the threads per task and frames per task that
+finish soonest.  Frame costs are also written beside the new job's logs so
+hpc-spool can hand out the most expensive frames first (order = longest).
+"""
+import os, json, heapq, ntpath, getpass
+from rrt import get_log
+from rrt.frames import FrameSet, chunk_ranges, longest_first, interleave, \
+    ORDER_LONGEST, ORDER_INTERLEAVE
+from rrt.jobspec import read_job_file, PUBLISHED_JOB_FILE
+from rrt.renderlog import LogIndex
+from rrt.ids import job_dirs
+from rrt.settings import JOB_LOGS_UNC, CLUSTER_CORES, NODE_CORES, \
+    PLANNER_HISTORY_JOBS, PLANNER_TASK_OVERHEAD, PLANNER_PARALLEL
+
+LOG = get_log(__name__)
+
+COSTS_FILE = 'costs.json'
+THREAD_CHOICES = (1, 2)
+CHUNK_CHOICES = (1, 2, 3, 5, 10)
+
+def _same_path(a, b):
+    return bool(a and b) and \
+        os.path.normcase(os.path.normpath(a)) == os.path.normcase(os.path.normpath(b))
+
+def _same_scene(data, scene, project):
+    if not _same_path(data.get('scene'), scene):
+        return False
+    # archive members like main.max are only the same scene in the same archive
+    return ntpath.isabs(scene) or _same_path(data.get('project'), project)
+
+def job_threads(data):
+    """Threads a job rendered each frame with (max jobs get a whole node)."""
+    threads = int(data.get('threads') or 0)
+    return threads if threads > 0 else NODE_CORES
+
+def speedup(threads, parallel=PLANNER_PARALLEL):
+    """How much faster a frame renders on `threads` than on one (Amdahl)."""
+    return 1.0 / ((1.0 - parallel) + parallel / max(1, threads))
+
+def find_history(scene, project=None, user=None, root=JOB_LOGS_UNC,
+                 limit=PLANNER_HISTORY_JOBS):
+    """
+    Returns up to `limit` (uuid, job data) pairs for the user's latest jobs of
+    `scene`, newest first, or of `project` if the scene was never rendered.
+    """
+    user_dir = os.path.join(root, user or getpass.getuser())
+    by_scene, by_project = [], []
+    for uuid, folder in job_dirs(user_dir):
+        if len(by_scene) >= limit:
+            break
+        path = os.path.join(folder, PUBLISHED_JOB_FILE)
+        if not os.path.isfile(path):
+            continue
+        try:
+            data = read_job_file(path)
+        except (IOError, OSError), e:
+            LOG.debug("Skipping %s: %s" % (path, e))
+            continue
+        if _same_scene(data, scene, project):
+            by_scene.append((uuid, data))
+        elif len(by_project) < limit and _same_path(data.get('project'), project):
+            by_project.append((uuid, data))
+    return by_scene or by_project
+
+def frame_costs(history):
+    """
+    Returns {frame: single thread seconds} from the logs of earlier jobs
+    (newest first, as from `find_history`); newer jobs win.
+    """
+    costs = {}
+    for uuid, data in reversed(history):
+        if not data.get('logs'):
+            continue
+        index = LogIndex(data['logs'], data.get('renderer'))
+        try:
+            index.update()
+        except Exception, e:
+            # someone else's index we can't write; what's saved still counts
+            LOG.debug("Could not update %s: %s" % (index.path, e))
+        scale = speedup(job_threads(data))
+        for frame, record in index.frames():
+            if record['done'] and record['seconds']:
+                costs[frame] = record['seconds'] * scale
+    return costs
+
+def makespan(task_costs, slots):
+    """
+    Seconds until `slots` parallel workers finish tasks handed out in order,
+    each to whichever worker frees up first.
+    """
+    workers = [0.0] * max(1, slots)
+    for cost in task_costs:
+        heapq.heappush(workers, heapq.heappop(workers) + cost)
+    return max(workers)
+
+class Plan(object):
+    """A recommended way to run a job, and how long it should take."""
+    def __init__(self, threads, chunk, seconds, costs, known, jobs):
+        self.threads = threads
+        self.chunk = chunk
+        self.seconds = seconds
+        # {frame: estimated seconds} at `threads`
+        self.costs = costs
+        # how many of the job's frames had history, from how many jobs
+        self.known = known
+        self.jobs = jobs
+
+    def __str__(self):
+        minutes, seconds = divmod(int(self.seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return "%d cores, %d frames/task, about %d:%02d:%02d (from %d frames of %d earlier jobs)" % (
+            self.threads, self.chunk, hours, minutes, seconds, self.known, self.jobs)
+
+    def write_costs(self, path):
+        with open(path, 'wb') as fh:
+            json.dump(dict((str(f), round(c, 2)) for f, c in self.costs.items()), fh)
+
+def plan(frames, costs, cores=CLUSTER_CORES, threads_choices=THREAD_CHOICES,
+         chunk_choices=CHUNK_CHOICES, order=ORDER_LONGEST,
+         overhead=PLANNER_TASK_OVERHEAD, jobs=0):
+    """
+    Tries every threads/chunk combination on `frames` (a FrameSet) with the
+    given single thread `costs` and returns the Plan that finishes first.
+    """
+    known = sorted([costs[f] for f in frames if f in costs])
+    if not known:
+        return None
+    median = known[len(known) // 2]
+    best = None
+    for threads in threads_choices:
+        scale = speedup(threads)
+        estimate = dict((f, costs.get(f, median) / scale) for f in frames)
+        # interleaved jobs hand out each preview pass's tasks in turn
+        groups = interleave(frames) if order == ORDER_INTERLEAVE else [frames]
+        for chunk in chunk_choices:
+            tasks = []
+            for group in groups:
+                for start, end, step in group.ranges():
+                    tasks.extend([(first, last, step) for first, last in
+                                  chunk_ranges(start, end, step, chunk)])
+            if order == ORDER_LONGEST:
+                tasks = longest_first(tasks, estimate)
+            seconds = makespan([overhead + sum([estimate[f] for f in range(first, last + 1, step)])
+                                for first, last, step in tasks], cores // threads)
+            # ties go to fewer threads, then to fewer tasks
+            if best is None or seconds < best.seconds - 1e-6:
+                best = Plan(threads, chunk, seconds, estimate, len(known), jobs)
+    return best
+
+def recommend(scene, project, frames, cores=CLUSTER_CORES, threads_choices=THREAD_CHOICES,
+              order=ORDER_LONGEST, user=None, root=JOB_LOGS_UNC):
+    """
+    Plans a submission of `frames` (a FrameSet or expression) of `scene`
+    from the user's earlier jobs.  Returns None without history.
+    """
+    if not isinstance(frames, FrameSet):
+        frames = FrameSet.parse(frames)
+    history = find_history(scene, project, user, root)
+    if not history:
+        return None
+    return plan(frames, frame_costs(history), cores, threads_choices,
+                order=order, jobs=len(history))
+
+def apply_plan(spec, plan):
+    """
+    Saves the plan's frame costs with the job's logs and points the JobSpec
+    at them, so hpc-spool can order the tasks longest first.
+    """
+    path = os.path.join(spec.log_dir, COSTS_FILE)
+    if not os.path.isdir(spec.log_dir):
+        os.makedirs(spec.log_dir)
+    plan.write_costs(path)
+    spec.data['costs'] = path
+    return path
@@ -0,0 +1,341 @@
+"""
+Per-frame timings from render task logs.
+
+Render tasks write their output to the job's LOGS files (``title.*.txt``).
+`LogIndex` reads them and keeps a small json index beside them (one per
+job) of each frame's render time, peak memory, warnings and errors::
+
+    index = LogIndex(r'\\\\clogs\\clogs\\user\\20100903154215\\shot.*.txt')
+    index.update()          # only reads what was written since last time
+    index.frame(12)         # {'seconds': 84.2, 'memory_mb': 2048.0, ...}
+    index.slowest(10)
+
+Logs are read from where the last update stopped (up to their last full
+line), so running tasks can be indexed as they go.  A frame that has
+started but not finished is kept with ``done`` false.
+"""
+import os, re, sys, time, json, fnmatch, datetime
+from optparse import OptionParser
+from rrt import get_log
+from rrt.filesystem import FileLock
+
+LOG = get_log(__name__)
+
+INDEX_NAME = 'renderlog.json'
+INDEX_VERSION = 1
+# messages kept per frame (the counts are always complete)
+MAX_MESSAGES = 5
+
+_MEMORY = r'(?P<memory>\d+(?:\.\d+)?)\s*(?P<unit>[KMG])B?\b'
+_MAYA_RULES = [
+    ('start', r'^Starting Rendering .*?[._](?P<frame>-?\d+)\.\w+\s*$'),
+    ('end', r'^Finished Rendering .*?[._](?P<frame>-?\d+)\.\w+\.?\s*$'),
+    ('error', r'^(?://\s*)?Error:\s*(?P<message>.*)'),
+    ('warning', r'^(?://\s*)?Warning:\s*(?P<message>.*)'),
+]
+# (event, pattern) pairs tried in order on each line, the first match wins
+RULES = {
+    'maya_render_sw': _MAYA_RULES + [
+        ('time', r'(?i)elapsed time[^:]*:\s*(?P<time>[\d:.]+)'),
+        ('memory', r'(?i)(?:peak|max\w*)?\s*memory[^\d]*' + _MEMORY),
+    ],
+    'maya_render_rman': _MAYA_RULES + [
+        ('start', r'(?i)rendering frame\s+(?P<frame>-?\d+)'),
+        ('error', r'\{(?:ERROR|SEVERE)\}\s*(?P<message>.*)'),
+        ('warning', r'\{WARNING\}\s*(?P<message>.*)'),
+        ('time', r'(?i)(?:real|elapsed) time[^\d]*(?P<time>[\d:.]+)'),
+        ('memory', r'(?i)peak memory[^\d]*' + _MEMORY),
+    ],
+    'max': [
+        ('start', r'(?i)^frame (?P<frame>-?\d+) assigned'),
+        ('end', r'(?i)^frame (?P<frame>-?\d+) (?:completed|rendered|done)'),
+        ('error', r'(?i)^error\b[:\s]*(?P<message>.*)'),
+        ('warning', r'(?i)^warning\b[:\s]*(?P<message>.*)'),
+        ('time', r'(?i)render(?:ing)? time[^\d]*(?P<time>[\d:.]+)'),
+        ('memory', r'(?i)(?:peak|max\w*)\s*memory[^\d]*' + _MEMORY),
+    ],
+}
+RULES = dict((renderer, [(event, re.compile(pattern)) for event, pattern in rules])
+             for renderer, rules in RULES.items())
+
+# 3dsmaxcmd prefixes its lines with "7/29/2010 10:14:05 AM; "
+STAMP = re.compile(r'^(?P<stamp>\d+/\d+/\d+ \d+:\d+:\d+(?: [AP]M)?);\s*')
+STAMP_FORMATS = ('%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %H:%M:%S')
+# sweep logs are named after their frame: title.<frame>.txt
+LOG_FRAME = re.compile(r'\.(-?\d+)\.\w+$')
+UNITS = {'K': 1 / 1024.0, 'M': 1.0, 'G': 1024.0}
+
+def guess_renderer(text):
+    """Picks the rules for a log from its first lines."""
+    for line in text.splitlines()[:50]:
+        if STAMP.match(line):
+            return 'max'
+        if 'rman' in line.lower() or 'renderman' in line.lower():
+            return 'maya_render_rman'
+    return 'maya_render_sw'
+
+def parse_seconds(value):
+    """'1:02:03.5', '02:03' or '12.5' -> seconds"""
+    seconds = 0.0
+    for part in value.strip(':.').split(':'):
+        seconds = seconds * 60 + float(part or 0)
+    return seconds
+
+def parse_stamp(value):
+    for fmt in STAMP_FORMATS:
+        try:
+            return time.mktime(datetime.datetime.strptime(value, fmt).timetuple())
+        except ValueError:
+            continue
+    return None
+
+def _empty_frame(log):
+    return {'log': log, 'done': False, 'seconds': None, 'memory_mb': None,
+            'warnings': 0, 'errors': 0, 'messages': []}
+
+class LogParser(object):
+    """
+    Turns the lines of one log into frame records.  Its state (`state()`)
+    can be saved and handed back, so a log can be parsed a piece at a time.
+    """
+    def __init__(self, name, renderer, frames, state=None):
+        self.name = name
+        self.renderer = renderer
+        self.rules = RULES[renderer]
+        self.frames = frames
+        state = state or {}
+        self.current = state.get('current')
+        self.last = state.get('last')
+        self.started = state.get('started')
+        self.warnings = state.get('warnings', 0)
+        self.errors = state.get('errors', 0)
+
+    def state(self):
+        return {'renderer': self.renderer, 'current': self.current,
+                'last': self.last, 'started': self.started,
+                'warnings': self.warnings, 'errors': self.errors}
+
+    def _frame(self, frame=None):
+        """The record events are attributed to (creating it if needed)."""
+        if frame is None:
+            frame = self.current if self.current is not None else self.last
+        if frame is None:
+            match = LOG_FRAME.search(self.name)
+            if not match:
+                return None
+            frame = int(match.group(1))
+        return self.frames.setdefault(str(frame), _empty_frame(self.name))
+
+    def feed(self, line):
+        stamp = None
+        match = STAMP.match(line)
+        if match:
+            stamp = parse_stamp(match.group('stamp'))
+            line = line[match.end():]
+        line = line.strip()
+        for event, pattern in self.rules:
+            match = pattern.search(line)
+            if match:
+                getattr(self, '_on_' + event)(match, stamp)
+                return event
+        return None
+
+    def _on_start(self, match, stamp):
+        frame = int(match.group('frame'))
+        if frame == self.current:
+            # some renderers announce a frame twice
+            return
+        record = self.frames.get(str(frame))
+        if record is None or record['done'] or record['log'] != self.name:
+            # a rerun frame starts over
+            self.frames[str(frame)] = _empty_frame(self.name)
+        self.current = frame
+        self.started = stamp
+
+    def _on_end(self, match, stamp):
+        frame = int(match.group('frame'))
+        record = self._frame(frame)
+        record['done'] = True
+        if record['seconds'] is None and stamp and self.started:
+            record['seconds'] = stamp - self.started
+        self.current, self.last, self.started = None, frame, None
+
+    def _on_time(self, match, stamp):
+        record = self._frame()
+        if record is not None:
+            record['seconds'] = parse_seconds(match.group('time'))
+
+    def _on_memory(self, match, stamp):
+        record = self._frame()
+        if record is not None:
+            mb = float(match.group('memory')) * UNITS[match.group('unit').upper()]
+            record['memory_mb'] = max(mb, record['memory_mb'] or 0)
+
+    def _message(self, kind, match):
+        record = self._frame()
+        if record is None:
+            # before the first frame (e.g. while loading the scene)
+            setattr(self, kind, getattr(self, kind) + 1)
+            return
+        record[kind] += 1
+        if len(record['messages']) < MAX_MESSAGES:
+            record['messages'].append(match.group('message')[:200])
+
+    def _on_warning(self, match, stamp):
+        self._message('warnings', match)
+
+    def _on_error(self, match, stamp):
+        self._message('errors', match)
+
+class LogIndex(object):
+    """
+    The frame index of one job, built from the logs matching its LOGS
+    pattern and saved beside them as INDEX_NAME.
+    """
+    def __init__(self, logs, renderer=None, path=None):
+        self.logs = logs
+        self.renderer = renderer
+        self.path = path or os.path.join(os.path.dirname(logs), INDEX_NAME)
+        self.data = {'version': INDEX_VERSION, 'logs': {}, 'frames': {}}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as fh:
+                data = json.load(fh)
+        except (IOError, ValueError):
+            return
+        if data.get('version') == INDEX_VERSION:
+            self.data = data
+
+    def save(self):
+        part = self.path + '.part'
+        with open(part, 'wb') as fh:
+            json.dump(self.data, fh, separators=(',', ':'))
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(part, self.path)
+
+    def log_files(self):
+        """Names of the logs matching the pattern (one directory listing)."""
+        folder, pattern = os.path.split(self.logs)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(fnmatch.filter(os.listdir(folder), pattern))
+
+    def _forget(self, name):
+        for frame, record in self.data['frames'].items():
+            if record['log'] == name:
+                del self.data['frames'][frame]
+
+    def _parse(self, name, known):
+        path = os.path.join(os.path.dirname(self.logs), name)
+        size = os.path.getsize(path)
+        offset = known.get('offset', 0)
+        if size < offset:
+            # the log was rewritten (the task was rerun)
+            self._forget(name)
+            known, offset = {}, 0
+        if size == offset:
+            return known, False
+        with open(path, 'rb') as fh:
+            fh.seek(offset)
+            chunk = fh.read(size - offset)
+        # leave a partly written last line for next time
+        end = chunk.rfind('\n') + 1
+        if not end:
+            return known, False
+        state = known.get('state')
+        renderer = (state and state['renderer']) or self.renderer or \
+            guess_renderer(chunk[:end])
+        parser = LogParser(name, renderer, self.data['frames'], state)
+        for line in chunk[:end].splitlines():
+            parser.feed(line)
+        return {'offset': offset + end, 'state': parser.state()}, True
+
+    def update(self):
+        """
+        Reads whatever the logs gained since the last update and saves the
+        index.  Returns the number of logs that had something new.
+        """
+        changed = 0
+        with FileLock(self.path + '.lock', timeout=60):
+            self.load()
+            for name in self.log_files():
+                try:
+                    known, grew = self._parse(name, self.data['logs'].get(name, {}))
+                except (IOError, OSError), e:
+                    LOG.warning("Could not read %s: %s" % (name, e))
+                    continue
+                self.data['logs'][name] = known
+                changed += grew
+            if changed:
+                self.save()
+        return changed
+
+    def frame(self, frame):
+        return self.data['frames'].get(str(frame))
+
+    def frames(self):
+        """[(frame, record)] in frame order."""
+        return sorted([(int(f), r) for f, r in self.data['frames'].items()])
+
+    def slowest(self, count=10):
+        timed = [(f, r) for f, r in self.frames() if r['seconds'] is not None]
+        return sorted(timed, key=lambda item: -item[1]['seconds'])[:count]
+
+    def over_memory(self, mb):
+        return [(f, r) for f, r in self.frames() if (r['memory_mb'] or 0) > mb]
+
+    def failed(self):
+        return [(f, r) for f, r in self.frames() if r['errors'] or not r['done']]
+
+def _format(frame, record):
+    seconds = record['seconds'] is not None and '%0.1fs' % record['seconds'] or '-'
+    memory = record['memory_mb'] is not None and '%0.0fMB' % record['memory_mb'] or '-'
+    status = record['done'] and 'done' or 'running'
+    return '%6d %10s %10s %8s %4d warnings %4d errors  %s' % (
+        frame, seconds, memory, status, record['warnings'], record['errors'], record['log'])
+
+def main(argv=None):
+    """
+    rrt-logs: indexes a job's render logs and prints frame timings.
+    """
+    parser = OptionParser(usage="%prog [options] LOGS",
+                          description="LOGS is a job's log pattern (title.*.txt) or its log directory.")
+    parser.add_option('-r', '--renderer', choices=sorted(RULES.keys()),
+                      help="log format [default: guessed from each log]")
+    parser.add_option('-f', '--frame', type='int', action='append', dest='frames',
+                      help="show this frame (may be repeated)")
+    parser.add_option('-s', '--slowest', type='int', metavar='N',
+                      help="show the N slowest frames")
+    parser.add_option('-m', '--memory', type='float', metavar='MB',
+                      help="show frames that peaked above MB")
+    parser.add_option('-e', '--errors', action='store_true', default=False,
+                      help="show frames with errors or that never finished")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("give one job log pattern or directory")
+    logs = args[0]
+    if os.path.isdir(logs):
+        logs = os.path.join(logs, '*.txt')
+    index = LogIndex(logs, options.renderer)
+    index.update()
+    if options.frames:
+        rows = [(f, index.frame(f)) for f in options.frames if index.frame(f)]
+    elif options.slowest:
+        rows = index.slowest(options.slowest)
+    elif options.memory is not None:
+        rows = index.over_memory(options.memory)
+    elif options.errors:
+        rows = index.failed()
+    else:
+        rows = index.frames()
+    for frame, record in rows:
+        print _format(frame, record)
+        for message in record['messages']:
+            print '\t' + message
+    sys.exit(0)
+
+if '__main__' == __name__:
+    main()
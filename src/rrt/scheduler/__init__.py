@@ -0,0 +1,117 @@
+"""
+Scheduler backends for hpc-spool.
+
+Each backend module exposes `Scheduler`, `TaskType` and `JobUnitType` with
+the same names and members as `Microsoft.Hpc.Scheduler`, so the spooler
+builds jobs the same way no matter where they are sent:
+
+* hpc    - the real Windows HPC scheduler (IronPython only)
+* dryrun - records jobs in memory and logs what would have been submitted
+* local  - runs jobs on this machine (NodePrep, render tasks, NodeRelease)
+
+The classes below are the interface the spooler relies on; the pure python
+backends build on them.
+"""
+import threading
+
+BACKENDS = {
+    'hpc': 'rrt.scheduler.hpc',
+    'dryrun': 'rrt.scheduler.dryrun',
+    'local': 'rrt.scheduler.local',
+}
+
+class TaskType(object):
+    """Stand-in for Microsoft.Hpc.Scheduler.Properties.TaskType"""
+    Basic = 'Basic'
+    ParametricSweep = 'ParametricSweep'
+    NodePrep = 'NodePrep'
+    NodeRelease = 'NodeRelease'
+
+class JobUnitType(object):
+    """Stand-in for Microsoft.Hpc.Scheduler.Properties.JobUnitType"""
+    Core = 'Core'
+    Socket = 'Socket'
+    Node = 'Node'
+
+class Version(object):
+    def __init__(self, major, minor, build, revision):
+        self.Major, self.Minor, self.Build, self.Revision = major, minor, build, revision
+
+class Counters(object):
+    def __init__(self, cores):
+        self.TotalCores = cores
+
+class Task(object):
+    """The ISchedulerTask properties hpc-spool sets."""
+    def __init__(self):
+        self.Name = None
+        self.Type = TaskType.Basic
+        self.CommandLine = None
+        self.StartValue = self.EndValue = None
+        self.IncrementValue = 1
+        self.MinimumNumberOfCores = self.MaximumNumberOfCores = 1
+        self.StdOutFilePath = self.StdErrFilePath = None
+        self.Environment = {}
+
+    def SetEnvironmentVariable(self, name, value):
+        self.Environment[name] = value
+
+class Job(object):
+    """The ISchedulerJob properties hpc-spool sets."""
+    def __init__(self):
+        self.Id = 0
+        self.Name = None
+        self.UnitType = JobUnitType.Core
+        self.IsExclusive = False
+        self.Tasks = []
+
+    def CreateTask(self):
+        return Task()
+
+    def AddTask(self, task):
+        self.Tasks.append(task)
+
+class Scheduler(object):
+    """
+    The IScheduler calls hpc-spool makes.  Submitted jobs are numbered from
+    1 and kept in `jobs`; subclasses decide what submitting means.
+    """
+    # matches what Spooler.REQUIRED_SERVER_VERSION expects by default
+    SERVER_VERSION = (3, 0, 2369, 0)
+    TOTAL_CORES = 64
+
+    def __init__(self):
+        self.jobs = []
+        self.host = None
+        self._lock = threading.Lock()
+
+    def Connect(self, host):
+        self.host = host
+
+    def GetServerVersion(self):
+        return Version(*self.SERVER_VERSION)
+
+    def GetCounters(self):
+        return Counters(self.TOTAL_CORES)
+
+    def CreateJob(self):
+        return Job()
+
+    def SubmitJob(self, job, username, password):
+        with self._lock:
+            self.jobs.append(job)
+            job.Id = len(self.jobs)
+
+    def Close(self):
+        pass
+
+    def Dispose(self):
+        pass
+
+def get_backend(name):
+    """Imports and returns the backend module registered as `name`."""
+    if name not in BACKENDS:
+        raise ValueError("Unknown scheduler backend '%s' (expected one of %s)" %
+                         (name, ', '.join(sorted(BACKENDS))))
+    module = BACKENDS[name]
+    return __import__(module, globals(), locals(), ['Scheduler'])
@@ -0,0 +1,17 @@
+"""
+A scheduler that submits nothing.  Jobs are numbered, kept in
+`Scheduler.jobs` and logged, so hpc-spool can be exercised without the
+HPC assemblies (or a cluster).
+"""
+import logging
+from rrt.scheduler import TaskType, JobUnitType, Scheduler as BaseScheduler
+
+LOG = logging.getLogger('hpc-spool')
+
+class Scheduler(BaseScheduler):
+
+    def SubmitJob(self, job, username, password):
+        BaseScheduler.SubmitJob(self, job, username, password)
+        LOG.info("[dry run] job %d '%s': %d tasks" % (job.Id, job.Name, len(job.Tasks)))
+        for task in job.Tasks:
+            LOG.debug("[dry run]   %s (%s): %s" % (task.Name, task.Type, task.CommandLine))
@@ -0,0 +1,10 @@
+"""
+The Windows HPC Pack scheduler, through the .Net assemblies.
+Only importable under IronPython with the HPC client utilities installed.
+"""
+import clr
+clr.AddReference("Microsoft.Hpc.Scheduler")
+clr.AddReference("Microsoft.Hpc.Scheduler.Properties")
+
+from Microsoft.Hpc.Scheduler import Scheduler
+from Microsoft.Hpc.Scheduler.Properties import TaskType, JobUnitType
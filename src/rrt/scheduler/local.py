@@ -0,0 +1,169 @@
+"""
+Runs jobs on this machine, standing in for a one node cluster.
+
+Each submitted job runs in the background: its NodePrep tasks, then every
+render task (sweeps are expanded into one process per value) with as many
+processes at once as the machine's cores allow, then its NodeRelease tasks.
+Core requests and stdout/stderr redirection behave like the real scheduler,
+and every process is timed in `job.Results` so spool throughput and
+prep/release overhead can be measured against fake renderers.
+"""
+import os, time, logging, threading
+from subprocess import Popen, STDOUT
+from multiprocessing import cpu_count
+from rrt.scheduler import TaskType, JobUnitType, Counters, \
+    Scheduler as BaseScheduler
+
+LOG = logging.getLogger('hpc-spool')
+
+class TaskResult(object):
+    def __init__(self, task, value, cores):
+        self.Name = task.Name
+        self.Type = task.Type
+        self.Value = value
+        self.Cores = cores
+        self.ExitCode = None
+        self.StartTime = self.EndTime = None
+
+    @property
+    def Elapsed(self):
+        return self.EndTime - self.StartTime
+
+class Scheduler(BaseScheduler):
+
+    def __init__(self, cores=None):
+        BaseScheduler.__init__(self)
+        self.cores = cores or cpu_count()
+        self._free = self.cores
+        self._slots = threading.Condition()
+        self._runners = []
+
+    def GetCounters(self):
+        return Counters(self.cores)
+
+    def SubmitJob(self, job, username, password):
+        BaseScheduler.SubmitJob(self, job, username, password)
+        job.State = 'Queued'
+        job.Results = []
+        runner = threading.Thread(target=self._run_job, args=(job,))
+        runner.start()
+        self._runners.append(runner)
+
+    def Wait(self):
+        """Blocks until every submitted job has finished."""
+        for runner in list(self._runners):
+            runner.join()
+
+    def Close(self):
+        self.Wait()
+
+    def _cores_for(self, job, task):
+        if job.UnitType == JobUnitType.Node:
+            # node granularity takes the whole machine
+            return self.cores, self.cores
+        low = min(self.cores, max(1, int(task.MinimumNumberOfCores or 1)))
+        high = min(self.cores, max(low, int(task.MaximumNumberOfCores or low)))
+        return low, high
+
+    def _acquire(self, low, high):
+        with self._slots:
+            while self._free < low:
+                self._slots.wait()
+            cores = min(high, self._free)
+            self._free -= cores
+            return cores
+
+    def _release(self, cores):
+        with self._slots:
+            self._free += cores
+            self._slots.notifyAll()
+
+    def _expand(self, task):
+        if task.Type == TaskType.ParametricSweep:
+            return [(task, v) for v in range(int(task.StartValue),
+                                             int(task.EndValue) + 1,
+                                             int(task.IncrementValue or 1))]
+        return [(task, None)]
+
+    def _execute(self, job, task, value, cores):
+        result = TaskResult(task, value, cores)
+        sub = lambda s: s if s is None or value is None else s.replace('*', str(value))
+        env = dict(os.environ)
+        for k, v in task.Environment.items():
+            env[str(k)] = str(v)
+        env['CCP_JOBID'] = str(job.Id)
+        env['CCP_NUMCPUS'] = str(cores)
+        out_path, err_path = sub(task.StdOutFilePath), sub(task.StdErrFilePath)
+        handles = {}
+        for path in (out_path, err_path):
+            if path and path not in handles:
+                parent = os.path.dirname(path)
+                if parent and not os.path.isdir(parent):
+                    try:
+                        os.makedirs(parent)
+                    except OSError:
+                        pass
+                handles[path] = open(path, 'wb')
+        stdout = handles.get(out_path)
+        stderr = STDOUT if err_path and err_path == out_path else handles.get(err_path)
+        command = sub(task.CommandLine)
+        if os.name != 'nt':
+            # cmd.exe runs `a & b` one after the other, sh would background `a`
+            command = command.replace(' & ', ' ; ')
+        result.StartTime = time.time()
+        try:
+            p = Popen(command, shell=True, env=env,
+                      stdout=stdout, stderr=stderr)
+            result.ExitCode = p.wait()
+        finally:
+            result.EndTime = time.time()
+            for fh in handles.values():
+                fh.close()
+        job.Results.append(result)
+        LOG.debug("[local] job %d %s%s exited %s in %0.2fs" %
+                  (job.Id, task.Name, '' if value is None else ' (%s)' % value,
+                   result.ExitCode, result.Elapsed))
+        return result
+
+    def _run_parallel(self, job, instances):
+        def run(task, value, cores):
+            try:
+                self._execute(job, task, value, cores)
+            finally:
+                self._release(cores)
+        workers = []
+        for task, value in instances:
+            cores = self._acquire(*self._cores_for(job, task))
+            t = threading.Thread(target=run, args=(task, value, cores))
+            t.start()
+            workers.append(t)
+        for t in workers:
+            t.join()
+
+    def _run_job(self, job):
+        job.State = 'Running'
+        prep = [t for t in job.Tasks if t.Type == TaskType.NodePrep]
+        release = [t for t in job.Tasks if t.Type == TaskType.NodeRelease]
+        work = [t for t in job.Tasks if t not in prep and t not in release]
+        LOG.info("[local] starting job %d '%s'" % (job.Id, job.Name))
+        ok = True
+        for task in prep:
+            cores = self._acquire(1, 1)
+            try:
+                ok = self._execute(job, task, None, cores).ExitCode == 0 and ok
+            finally:
+                self._release(cores)
+        if ok:
+            instances = []
+            for task in work:
+                instances.extend(self._expand(task))
+            self._run_parallel(job, instances)
+        for task in release:
+            cores = self._acquire(1, 1)
+            try:
+                self._execute(job, task, None, cores)
+            finally:
+                self._release(cores)
+        failed = [r for r in job.Results if r.ExitCode != 0]
+        job.State = 'Failed' if failed else 'Finished'
+        LOG.info("[local] job %d %s" % (job.Id, job.State.lower()))
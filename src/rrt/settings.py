@@ -11,8 +11,126 @@ HPC_SPOOL_BIN = r'C:\Ringling\HPC\bin\hpc-spool.bat'
 
 JOB_LOGS_UNC = "\\\\clogs\\clogs"
 JOB_OUTPUT_UNC = "\\\\coutput\\coutput"
+# content addressed store of job files (see `rrt.assetstore`); set
+# RRT_ASSET_STORE to another share, or to nothing to submit without it
+ASSET_STORE_UNC = os.getenv('RRT_ASSET_STORE', "\\\\cassets\\cassets")
 
 if os.getenv('RRT_USE_DESMOND', False):
     SPOOL_UNC = "\\\\desmond\\spool" # note the native \ style separators
     JOB_LOGS_UNC = "\\\\desmond\\spool\\logs"
     JOB_OUTPUT_UNC = "\\\\desmond\\spool\\output"
+    ASSET_STORE_UNC = os.getenv('RRT_ASSET_STORE', "\\\\desmond\\spool\\assets")
+
+"""
+Drive letter -> unc share resolution (see `rrt.filesystem`)
+"""
+# on the cluster vlan, our file-server hosts have a 1 appended to their names
+# each rule is a (pattern, replacement) pair applied once to a resolved unc
+UNC_HOST_RULES = [
+    (r'(hamming|minsky|perlis|shannon|wilkes|wilkinson)', r'\g<1>1'),
+]
+# seconds a resolved share is trusted before asking `net use` again
+SHARE_CACHE_TTL = int(os.getenv('RRT_SHARE_CACHE_TTL', 300))
+# optional json file used to share resolved drives between processes
+SHARE_CACHE_FILE = os.getenv('RRT_SHARE_CACHE', None)
+# optional "Z: = \\host\share" mapping file used instead of `net use`
+SHARE_MAP_FILE = os.getenv('RRT_SHARE_MAP', None)
+
+"""
+Compute node locations (see `rrt.hpc`)
+"""
+# per-job project directories are created here as NODE_PROJECT
+NODE_JOB_DIR = os.getenv('RRT_NODE_JOB_DIR', os.path.join('D:\\', 'hpc'))
+# node local cache of extracted project data, shared by every job on a node
+NODE_CACHE_DIR = os.getenv('RRT_NODE_CACHE', os.path.join(NODE_JOB_DIR, 'cache'))
+# least recently used entries are evicted once the cache grows past this
+NODE_CACHE_BUDGET = int(os.getenv('RRT_NODE_CACHE_BUDGET', 100 * 1024 ** 3))
+# hardlink cached files into NODE_PROJECT rather than copying them.  A link
+# is the cached file itself, so a render or script rewriting a project file
+# in place changes it for later jobs too (the caches check sizes and mtimes
+# and fetch changed files again, but a same-size same-mtime rewrite is missed)
+NODE_CACHE_HARDLINKS = bool(os.getenv('RRT_NODE_CACHE_HARDLINKS', False))
+# node local copies of asset store blobs, evicted least recently used first
+NODE_BLOB_DIR = os.path.join(NODE_CACHE_DIR, 'blobs')
+NODE_BLOB_BUDGET = int(os.getenv('RRT_NODE_BLOB_BUDGET', 50 * 1024 ** 3))
+# archive extraction: worker threads and read/write buffer size
+EXTRACT_THREADS = int(os.getenv('RRT_EXTRACT_THREADS', 4))
+EXTRACT_BUFFER = 4 * 1024 * 1024
+# archive member lists read on this node (see `rrt.archiveindex`)
+NODE_ARCHIVE_INDEX_DIR = os.path.join(NODE_CACHE_DIR, 'archives')
+# node release: threads used to delete NODE_PROJECT, and whether to move it
+# to NODE_TRASH_DIR and delete it in the background instead
+RELEASE_THREADS = int(os.getenv('RRT_RELEASE_THREADS', 8))
+RELEASE_ASYNC = bool(os.getenv('RRT_ASYNC_RELEASE', False))
+NODE_TRASH_DIR = os.path.join(NODE_JOB_DIR, '.trash')
+# maya prep: top level project entries mirrored onto each node (fnmatch
+# patterns, ';' separated in RRT_SYNC_INCLUDE), and where the mirrors live
+SYNC_INCLUDE = os.getenv('RRT_SYNC_INCLUDE', 'fur*').split(';')
+SYNC_MIRROR_DIR = os.path.join(NODE_CACHE_DIR, 'mirror')
+# mirrors not synced for this many days are removed
+SYNC_MIRROR_MAX_AGE = 14
+SYNC_THREADS = int(os.getenv('RRT_SYNC_THREADS', 8))
+# files at least this big are copied one at a time with large buffers
+SYNC_LARGE_FILE = 8 * 1024 * 1024
+
+"""
+Peer to peer fan out of asset store files between a job's nodes (see 
+`rrt.hpc.fanout`)
+"""
+FANOUT = not os.getenv('RRT_NO_FANOUT', False)
+# each node's blob server listens here
+FANOUT_PORT = int(os.getenv('RRT_FANOUT_PORT', 8765))
+# the first nodes of a job to start prep fetch from the asset store, the
+# rest from nodes that already have the files
+FANOUT_SEEDS = int(os.getenv('RRT_FANOUT_SEEDS', 2))
+# seconds a node waits for a peer to have a file before using the store
+FANOUT_WAIT = 120
+# downloads a node serves at once; more are turned away to try elsewhere
+FANOUT_MAX_CLIENTS = 4
+# a blob server with no requests for this many seconds exits
+FANOUT_IDLE = 30 * 60
+
+"""
+Job manifests (see `rrt.dependencies`)
+"""
+# hash every file a scene uses at submit time, so nodes can skip copies of
+# files that were touched but not changed; reading them all can be slow
+MANIFEST_HASHES = not os.getenv('RRT_NO_MANIFEST_HASHES', False)
+
+"""
+Job telemetry (see `rrt.telemetry`)
+"""
+# per-phase timing records are written next to each job's logs
+TELEMETRY = not os.getenv('RRT_NO_TELEMETRY', False)
+
+"""
+Render cost planning (see `rrt.planner`)
+"""
+# cores the cluster has, for planning when the head node isn't asked
+CLUSTER_CORES = int(os.getenv('RRT_CLUSTER_CORES', 64))
+# cores in one compute node (max jobs take a whole node per task)
+NODE_CORES = int(os.getenv('RRT_NODE_CORES', 8))
+# earlier jobs of the same scene whose logs are read for frame times
+PLANNER_HISTORY_JOBS = 10
+# seconds every task spends starting the renderer and loading the scene
+PLANNER_TASK_OVERHEAD = 30.0
+# part of a frame's render time that shrinks as threads are added
+PLANNER_PARALLEL = 0.9
+
+"""
+Spool service (see `rrt.spoolservice`)
+"""
+# port the service listens on, on this machine only
+SPOOL_PORT = int(os.getenv('RRT_SPOOL_PORT', 8766))
+# job files copied here are spooled by the service
+SPOOL_DROP_DIR = os.getenv('RRT_SPOOL_DROP_DIR', os.path.join(JOBSPEC_DIR, 'drop'))
+# the submit windows hand jobs to a running service instead of starting hpc-spool
+SPOOL_SERVICE = not os.getenv('RRT_NO_SPOOL_SERVICE', False)
+# seconds to wait for the service to submit a job
+SPOOL_TIMEOUT = 300
+
+"""
+Archive index (see `rrt.archiveindex`)
+"""
+# member lists of the Max archives browsed and submitted from this machine
+ARCHIVE_INDEX_DIR = os.getenv('RRT_ARCHIVE_INDEX_DIR', os.path.join(os.path.dirname(JOBSPEC_DIR), 'archives'))
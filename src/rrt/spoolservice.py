@@ -0,0 +1,260 @@
+"""
+Keeps hpc-spool running (``hpc-spool --serve``), so a submission doesn't
+wait for IronPython to start, the HPC assemblies to load and a connection
+to the head node to be made every time::
+
+    hpc-spool --serve                           # once, on the workstation
+    ...
+    submit(['D:\\hpc\\jdoe\\scripts\\job.ini'])  # [(path, job id, error)]
+
+Jobs reach the service two ways:
+
+* over a socket on this machine (SPOOL_PORT): `submit` sends job file paths
+  and waits for their job ids.  `rrt.submitqueue` tries the service first
+  and only starts hpc-spool itself when there isn't one.
+* through a drop folder (SPOOL_DROP_DIR): job files saved there are
+  spooled, and a ``<name>.spooled`` file with the job id (or error) is
+  written next to each, so it isn't spooled again.
+
+Whatever has arrived is submitted as one batch over the service's one
+connection, which is checked before every batch and made again if it has
+dropped.
+
+hpc-spool runs this module under IronPython, so it only uses the standard
+library.
+"""
+import os, glob, json, time, socket, logging, threading, Queue
+from SocketServer import ThreadingMixIn, TCPServer, StreamRequestHandler
+from rrt.settings import SPOOL_PORT, SPOOL_DROP_DIR, SPOOL_TIMEOUT
+
+LOG = logging.getLogger('hpc-spool')
+
+# the service only listens to this machine
+HOST = '127.0.0.1'
+# written next to each job file the drop folder has spooled
+SPOOLED = '.spooled'
+# the error for jobs that weren't tried, which the drop folder tries again
+NOT_SUBMITTED = 'not submitted: '
+
+class NotRunning(RuntimeError):
+    """There's no service to hand jobs to."""
+
+def spooled_path(path):
+    return os.path.splitext(path)[0] + SPOOLED
+
+class _Request(object):
+    """Job files waiting for the next batch, and their results once it's done."""
+
+    def __init__(self, paths, callback=None):
+        self.paths = paths
+        self.callback = callback
+        self.results = None
+        self._done = threading.Event()
+
+    def finish(self, results):
+        self.results = results
+        self._done.set()
+        if self.callback is not None:
+            self.callback(self)
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.results
+
+class _Handler(StreamRequestHandler):
+    """One request per connection: a line of json in, a line of json out."""
+
+    def handle(self):
+        try:
+            paths = json.loads(self.rfile.readline())['paths']
+        except (ValueError, KeyError, TypeError), e:
+            reply = {'error': 'bad request: %s' % e}
+        else:
+            reply = {'results': self.server.service.spool(paths)}
+        self.wfile.write(json.dumps(reply) + '\n')
+
+class _Server(ThreadingMixIn, TCPServer):
+    daemon_threads = True
+    # on windows this would let a second service take the port
+    allow_reuse_address = os.name != 'nt'
+
+class SpoolService(object):
+    """
+    Submits the jobs from the socket and the drop folder.  `spooler` holds
+    the connection: ``connect()``, ``check()`` (raises if the connection has
+    dropped), ``submit(paths)``, which returns [(path, job id, error)], and
+    ``close()``.  A `port` of None turns the socket off (0 picks a free
+    port) and a `drop_dir` of None the drop folder.
+    """
+
+    def __init__(self, spooler, port=SPOOL_PORT, drop_dir=SPOOL_DROP_DIR, poll=2.0, settle=1.0):
+        self.spooler = spooler
+        self.drop_dir = drop_dir
+        # seconds between looks at the drop folder, and since a job file
+        # last changed before it's taken to be completely written
+        self.poll = poll
+        self.settle = settle
+        self.connected = False
+        self.connects = 0
+        self.batches = 0
+        self._queue = Queue.Queue()
+        self._stopped = threading.Event()
+        self._dropped = set()
+        self._server = None
+        self.port = None
+        if port is not None:
+            self._server = _Server((HOST, port), _Handler)
+            self._server.service = self
+            self.port = self._server.server_address[1]
+
+    def spool(self, paths, timeout=None):
+        """Queues job files for the next batch; returns their results."""
+        request = _Request(list(paths))
+        self._queue.put(request)
+        return request.wait(timeout)
+
+    def serve_forever(self):
+        """Submits whatever arrives until `stop` is called."""
+        threads = []
+        if self._server is not None:
+            threads.append(threading.Thread(target=self._server.serve_forever, name='spool-socket'))
+        if self.drop_dir:
+            if not os.path.isdir(self.drop_dir):
+                os.makedirs(self.drop_dir)
+            threads.append(threading.Thread(target=self._watch, name='spool-drop'))
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+        LOG.info("Spool service ready (port %s, drop folder %s)" % (self.port, self.drop_dir))
+        try:
+            while not self._stopped.isSet():
+                self.run_once(0.5)
+        finally:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+            self._disconnect()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_once(self, timeout=None):
+        """Submits everything queued as one batch; returns how many requests it had."""
+        try:
+            requests = [self._queue.get(True, timeout)]
+        except Queue.Empty:
+            return 0
+        while True:
+            try:
+                requests.append(self._queue.get_nowait())
+            except Queue.Empty:
+                break
+        self._submit(requests)
+        return len(requests)
+
+    def _submit(self, requests):
+        paths = []
+        for request in requests:
+            for path in request.paths:
+                if path not in paths:
+                    paths.append(path)
+        try:
+            self._connect()
+        except Exception, e:
+            LOG.error("Unable to connect to the cluster: %s" % e)
+            results = [(path, None, NOT_SUBMITTED + str(e)) for path in paths]
+        else:
+            try:
+                results = self.spooler.submit(paths)
+            except Exception, e:
+                LOG.error("Batch failed: %s" % e)
+                self._disconnect()
+                results = [(path, None, str(e)) for path in paths]
+        self.batches += 1
+        by_path = dict([(result[0], tuple(result)) for result in results])
+        for request in requests:
+            try:
+                request.finish([by_path[path] for path in request.paths])
+            except Exception, e:
+                LOG.error("Unable to report %s: %s" % (', '.join(request.paths), e))
+
+    def _connect(self):
+        if self.connected:
+            try:
+                self.spooler.check()
+                return
+            except Exception, e:
+                LOG.warning("Lost the cluster connection (%s), reconnecting." % e)
+                self._disconnect()
+        self.spooler.connect()
+        self.connected = True
+        self.connects += 1
+
+    def _disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        try:
+            self.spooler.close()
+        except Exception, e:
+            LOG.debug("Closing the cluster connection failed: %s" % e)
+
+    def _watch(self):
+        while not self._stopped.isSet():
+            try:
+                self.scan()
+            except Exception, e:
+                LOG.error("Unable to read drop folder %s: %s" % (self.drop_dir, e))
+            self._stopped.wait(self.poll)
+
+    def scan(self, now=None):
+        """Queues the drop folder's new job files; returns how many."""
+        now = now or time.time()
+        paths = []
+        for path in sorted(glob.glob(os.path.join(self.drop_dir, '*.ini'))):
+            if path in self._dropped or os.path.exists(spooled_path(path)):
+                continue
+            try:
+                if now - os.path.getmtime(path) < self.settle:
+                    continue
+            except OSError:
+                continue
+            paths.append(path)
+        if paths:
+            self._dropped.update(paths)
+            self._queue.put(_Request(paths, self._spooled))
+        return len(paths)
+
+    def _spooled(self, request):
+        for path, job_id, error in request.results:
+            self._dropped.discard(path)
+            if error and error.startswith(NOT_SUBMITTED):
+                continue
+            with open(spooled_path(path), 'wb') as fh:
+                json.dump({'job': job_id, 'error': error}, fh)
+
+def submit(paths, port=SPOOL_PORT, timeout=SPOOL_TIMEOUT):
+    """
+    Hands job files to the service on this machine; returns a list of
+    (path, job id, error).  Raises NotRunning if there's no service.
+    """
+    try:
+        sock = socket.create_connection((HOST, port), 2)
+    except socket.error, e:
+        raise NotRunning("No spool service on port %d: %s" % (port, e))
+    try:
+        try:
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps({'paths': [os.path.abspath(p) for p in paths]}) + '\n')
+            reply = sock.makefile('rb').readline()
+        except socket.error, e:
+            raise RuntimeError("No answer from the spool service: %s" % e)
+    finally:
+        sock.close()
+    try:
+        reply = json.loads(reply)
+    except ValueError:
+        raise RuntimeError("Unreadable answer from the spool service: %r" % reply)
+    if 'error' in reply:
+        raise RuntimeError(reply['error'])
+    return [tuple(result) for result in reply['results']]
@@ -0,0 +1,194 @@
+"""
+Submits jobs in the background, so the submit windows don't wait while the
+job's files are stored and published and hpc-spool starts IronPython,
+connects to the head node and submits::
+
+    submission = get_queue().submit(spec)     # returns right away
+    ...
+    for message in submission.poll():         # from the window's own thread
+        show(message)
+    if submission.finished:
+        submission.job_id or submission.error
+
+When a spool service (``hpc-spool --serve``, see `rrt.spoolservice`) is
+running the job is handed to it, which saves starting hpc-spool; otherwise
+hpc-spool is started for each job.
+
+Submissions are handled one at a time, in order, by a worker thread.
+Callbacks given to `SubmitQueue.submit` are called on that thread, so a
+window should only hand their messages back to its own thread (maya's
+executeDeferred) or poll instead (a Qt timer).
+"""
+import os, re, threading, Queue
+from subprocess import Popen, PIPE, STDOUT
+from rrt import get_log, spoolservice
+from rrt.settings import SPOOL_SERVICE, SPOOL_PORT
+
+LOG = get_log(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUBMITTED = 'submitted'
+FAILED = 'failed'
+
+# hpc-spool's report of the job it made
+_JOB_ID = re.compile(r'Submitted job (\d+)')
+# keeps hpc-spool's console window from flashing up over maya/max
+CREATE_NO_WINDOW = 0x08000000
+
+class Submission(object):
+    """A job on its way to the cluster: its progress, and its job id or error."""
+
+    def __init__(self, spec, callback=None):
+        self.spec = spec
+        self.callback = callback
+        self.state = QUEUED
+        self.job_id = None
+        self.error = None
+        self.messages = []
+        self._polled = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def title(self):
+        return self.spec.data.get('title')
+
+    def progress(self, message):
+        with self._lock:
+            self.messages.append(message)
+        if self.callback is not None:
+            try:
+                self.callback(self, message)
+            except Exception, e:
+                LOG.debug("Submission callback failed: %s" % e)
+
+    def poll(self):
+        """The messages since the last poll."""
+        with self._lock:
+            messages = self.messages[self._polled:]
+            self._polled = len(self.messages)
+        return messages
+
+    @property
+    def finished(self):
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """Waits for the submission to finish; returns whether it has."""
+        self._done.wait(timeout)
+        return self.finished
+
+    def _finish(self, state, job_id=None, error=None):
+        self.state, self.job_id, self.error = state, job_id, error
+        if state == SUBMITTED:
+            message = "Submitted %s as job %s." % (self.title, job_id or '(unknown)')
+        else:
+            message = "Could not submit %s: %s" % (self.title, error)
+        # set before the last message, so a callback sees the result
+        self._done.set()
+        self.progress(message)
+
+class SubmitQueue(object):
+    # the spool service tried first, or None to always start hpc-spool
+    spool_port = SPOOL_SERVICE and SPOOL_PORT or None
+
+    def __init__(self):
+        self._queue = Queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def submit(self, spec, callback=None):
+        """Queues a JobSpec; returns its `Submission` right away."""
+        submission = Submission(spec, callback)
+        with self._lock:
+            self._pending.append(submission)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='rrt-submit')
+                self._worker.setDaemon(True)
+                self._worker.start()
+        self._queue.put(submission)
+        return submission
+
+    @property
+    def pending(self):
+        """Submissions that haven't finished."""
+        with self._lock:
+            self._pending = [s for s in self._pending if not s.finished]
+            return list(self._pending)
+
+    def wait(self, timeout=None):
+        """Waits for everything queued so far; returns whether it all finished."""
+        for submission in self.pending:
+            if not submission.wait(timeout):
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            submission = self._queue.get()
+            try:
+                self._submit(submission)
+            finally:
+                self._queue.task_done()
+
+    def _submit(self, submission):
+        submission.state = RUNNING
+        try:
+            submission.progress("Preparing %s..." % submission.title)
+            path = submission.spec.prepare_submit(submission.progress)
+            submission.progress("Spooling %s..." % os.path.basename(path))
+            job_id = self._hand_off(submission, path)
+            if job_id is None:
+                job_id = self._spool(submission, submission.spec.spool_command(path))
+        except Exception, e:
+            LOG.error("Could not submit %s: %s" % (submission.title, e))
+            submission._finish(FAILED, error=str(e))
+        else:
+            submission._finish(SUBMITTED, job_id)
+
+    def _hand_off(self, submission, path):
+        """Has the spool service submit the job.  Returns the job id, or None with no service."""
+        if self.spool_port is None:
+            return None
+        try:
+            [(path, job_id, error)] = spoolservice.submit([path], self.spool_port)
+        except spoolservice.NotRunning, e:
+            LOG.debug(e)
+            return None
+        if error:
+            raise RuntimeError(error)
+        submission.progress("Submitted job %s through the spool service." % job_id)
+        return job_id
+
+    def _spool(self, submission, cmd):
+        """Runs hpc-spool, passing its output on as progress.  Returns the job id."""
+        kwargs = {}
+        if os.name == 'nt':
+            kwargs['creationflags'] = CREATE_NO_WINDOW
+        proc = Popen(cmd, stdout=PIPE, stderr=STDOUT, **kwargs)
+        job_id, last = None, None
+        for line in iter(proc.stdout.readline, ''):
+            line = line.rstrip()
+            if not line:
+                continue
+            last = line
+            submission.progress(line)
+            match = _JOB_ID.search(line)
+            if match:
+                job_id = int(match.group(1))
+        if proc.wait() != 0:
+            raise RuntimeError(last or "hpc-spool exited with %d" % proc.returncode)
+        return job_id
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    """The process wide queue."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SubmitQueue()
+        return _queue
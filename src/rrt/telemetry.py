@@ -0,0 +1,230 @@
+"""
+Per-phase job timing records.
+
+The node scripts append one json object per line to
+``<job log dir>\\telemetry\\<node>.jsonl``, beside the job's LOGS files::
+
+    {"job": "20100903154215", "node": "node01", "phase": "prep",
+     "start": 1283543000.5, "seconds": 12.5, "ok": true, "bytes_copied": 1024}
+
+Phases are "prep", "release" (hpc-node-prep/release) and "render" (each
+render command, through hpc-node-run).  Besides timings a phase may report
+any of COUNTERS.  `rrt-stats` reads the records back for a job or a date
+range and prints per-phase and per-node percentiles.
+"""
+import os, sys, glob, math, time, json, socket, datetime
+from optparse import OptionParser
+from rrt import get_log
+from rrt.settings import JOB_LOGS_UNC, TELEMETRY
+from rrt.filesystem import FileLock
+from rrt.ids import job_dir, job_dirs
+
+LOG = get_log(__name__)
+
+TELEMETRY_DIR = 'telemetry'
+PHASES = ('prep', 'render', 'release')
+COUNTERS = ('bytes_copied', 'bytes_extracted', 'bytes_deleted', 'bytes_fetched',
+            'files_copied', 'files_extracted', 'files_deleted', 'blob_hits', 'blob_misses',
+            'frames')
+
+def job_uuid():
+    """The running job's uuid, from the task environment."""
+    uuid = os.getenv('JOB_UUID', None)
+    if not uuid and os.getenv('NODE_PROJECT', None):
+        # NODE_PROJECT is always <node job dir>[\<date>]\<uuid>
+        uuid = os.path.basename(os.getenv('NODE_PROJECT').rstrip('\\/'))
+    return uuid
+
+def telemetry_dir(logs):
+    """Where the records for a job with the given LOGS pattern are kept."""
+    return os.path.join(os.path.dirname(logs), TELEMETRY_DIR)
+
+def record(phase, start, seconds, logs=None, job=None, node=None, **fields):
+    """
+    Appends a record for `phase` and returns it.  Telemetry never fails a
+    job: problems writing the record are logged and otherwise ignored.
+    """
+    logs = logs or os.getenv('LOGS', None)
+    if not TELEMETRY or not logs:
+        return None
+    entry = {'job': job or job_uuid(),
+             'node': node or socket.gethostname(),
+             'phase': phase,
+             'start': start,
+             'seconds': seconds}
+    entry.update(fields)
+    try:
+        folder = telemetry_dir(logs)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+        path = os.path.join(folder, '%s.jsonl' % entry['node'].lower())
+        # render tasks running side by side on a node share the file
+        with FileLock(path + '.lock', timeout=30):
+            with open(path, 'ab') as fh:
+                fh.write(json.dumps(entry, sort_keys=True) + '\n')
+    except Exception, e:
+        LOG.warning("Could not write telemetry for %s: %s" % (phase, e))
+    return entry
+
+class Phase(object):
+    """
+    Times a block and records it when the block exits::
+
+        with Phase('prep') as phase:
+            phase.update(bytes_copied=copy_stuff())
+    """
+    def __init__(self, phase, **fields):
+        self.phase = phase
+        self.fields = fields
+        self.start = None
+        self.entry = None
+
+    def update(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fields = dict(self.fields)
+        fields['ok'] = exc_type is None and fields.get('ok', True)
+        self.entry = record(self.phase, self.start, time.time() - self.start,
+                            **fields)
+        return False
+
+def read_records(path):
+    """Yields the records in a telemetry file, skipping damaged lines."""
+    with open(path, 'rb') as fh:
+        for line in fh:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # a node died mid write
+                continue
+
+def _day(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d')
+
+def _epoch(day):
+    return time.mktime(day.timetuple())
+
+def find_records(root=JOB_LOGS_UNC, jobs=None, users=None, since=None, until=None):
+    """
+    Returns every record under `root` (laid out as <user>\\<date>\\<uuid>,
+    or <user>\\<uuid> for older jobs, see `rrt.ids`) for the
+    given job uuids and/or users, started on or after `since` and before the
+    end of `until` (datetimes).
+    """
+    first = since and _epoch(since)
+    last = until and _epoch(until + datetime.timedelta(days=1))
+    # uuids start with the submit date, which lets whole jobs (and whole
+    # date directories) be skipped
+    low = since and since.strftime('%Y%m%d')
+    high = until and until.strftime('%Y%m%d')
+    found = []
+    for user in users or os.listdir(root):
+        user_dir = os.path.join(root, user)
+        if not os.path.isdir(user_dir):
+            continue
+        if jobs:
+            folders = [(job, job_dir(user_dir, job)) for job in jobs]
+        else:
+            folders = job_dirs(user_dir, low, high)
+        for job, folder in folders:
+            if job[:8].isdigit() and ((low and job[:8] < low) or
+                                      (high and job[:8] > high)):
+                continue
+            pattern = os.path.join(folder, TELEMETRY_DIR, '*.jsonl')
+            for path in glob.glob(pattern):
+                for entry in read_records(path):
+                    if first and entry.get('start', 0) < first:
+                        continue
+                    if last and entry.get('start', 0) >= last:
+                        continue
+                    found.append(entry)
+    return found
+
+def percentile(values, pct):
+    """Nearest rank percentile of a list of numbers."""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+def summarize(records, percentiles=(50, 90, 99)):
+    """
+    Groups records by phase, and by phase and node.  Returns a list of rows
+    (dicts) with the count, duration percentiles, total seconds and summed
+    COUNTERS of each group; rows for all nodes have node '*'.
+    """
+    groups = {}
+    for entry in records:
+        for key in ((entry['phase'], '*'), (entry['phase'], entry['node'])):
+            groups.setdefault(key, []).append(entry)
+    order = dict((phase, i) for i, phase in enumerate(PHASES))
+    rows = []
+    for (phase, node), entries in sorted(groups.items(),
+            key=lambda item: (order.get(item[0][0], len(order)), item[0])):
+        seconds = [e['seconds'] for e in entries]
+        row = {'phase': phase, 'node': node, 'count': len(entries),
+               'failed': len([e for e in entries if not e.get('ok', True)]),
+               'total': sum(seconds), 'max': max(seconds)}
+        for pct in percentiles:
+            row['p%d' % pct] = percentile(seconds, pct)
+        for counter in COUNTERS:
+            row[counter] = sum([e.get(counter) or 0 for e in entries])
+        rows.append(row)
+    return rows
+
+def format_rows(rows, percentiles=(50, 90, 99)):
+    columns = ['p%d' % pct for pct in percentiles] + ['max', 'total']
+    lines = ['%-8s %-16s %6s %6s ' % ('phase', 'node', 'count', 'failed') +
+             ' '.join(['%9s' % c for c in columns]) + ' %10s' % 'MB']
+    for row in rows:
+        size = sum([row[c] for c in COUNTERS if c.startswith('bytes_')])
+        lines.append('%-8s %-16s %6d %6d ' % (row['phase'], row['node'],
+                                               row['count'], row['failed']) +
+                     ' '.join(['%9.1f' % row[c] for c in columns]) +
+                     ' %10.1f' % (size / (1024 * 1024.0)))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    """
+    rrt-stats: prints per-phase and per-node timings for jobs.
+    """
+    parser = OptionParser(usage="%prog [options] [uuid ...]",
+                          description="Summarizes prep/render/release timings "
+                                      "for the given jobs, or for every job in a date range.")
+    parser.add_option('-u', '--user', action='append', dest='users',
+                      help="only jobs submitted by USER (may be repeated)")
+    parser.add_option('--since', metavar='YYYY-MM-DD', help="first day to include")
+    parser.add_option('--until', metavar='YYYY-MM-DD', help="last day to include")
+    parser.add_option('--root', default=JOB_LOGS_UNC,
+                      help="job logs location [default: %default]")
+    parser.add_option('--json', action='store_true', default=False,
+                      help="print the summary as json")
+    options, jobs = parser.parse_args(argv)
+    if not (jobs or options.since or options.until or options.users):
+        parser.error("give job uuids, a user or a date range")
+    try:
+        since = options.since and _day(options.since)
+        until = options.until and _day(options.until)
+    except ValueError, e:
+        parser.error(str(e))
+    rows = summarize(find_records(options.root, jobs, options.users, since, until))
+    if options.json:
+        print json.dumps(rows, indent=1, sort_keys=True)
+    elif not rows:
+        print "No telemetry found."
+    else:
+        print format_rows(rows)
+    sys.exit(0)
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,129 @@
+import os, time, shutil, struct, zipfile, tempfile, unittest
+from rrt.archiveindex import ArchiveIndex, get_index, set_index
+from rrt.hpc.archive import StreamingExtractor
+from rrt.hpc.scripts import LOG
+
+class TestArchiveIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'index')
+        self.archive = self.write_archive('shot.zip', {
+            'shot.max': 'scene' * 100,
+            'maps/': '',
+            'maps/wood.jpg': 'wood',
+            'props/chair.MAX': 'chair',
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_archive(self, name, members, compression=zipfile.ZIP_DEFLATED):
+        path = os.path.join(self.tmp, name)
+        zf = zipfile.ZipFile(path, 'w', compression)
+        for member in sorted(members):
+            zf.writestr(member, members[member])
+        zf.close()
+        return path
+
+    def test_members(self):
+        index = ArchiveIndex(self.root)
+        self.assertEqual(index.scenes(self.archive), ['props/chair.MAX', 'shot.max'])
+        self.assertEqual(index.names(self.archive), ['maps/wood.jpg', 'props/chair.MAX', 'shot.max'])
+        expected = zipfile.ZipFile(self.archive).infolist()
+        for info in (index.infolist(self.archive), ArchiveIndex(self.root).infolist(self.archive)):
+            self.assertEqual([(i.filename, i.file_size, i.compress_size, i.CRC, i.header_offset,
+                               i.compress_type, i.date_time) for i in info],
+                             [(i.filename, i.file_size, i.compress_size, i.CRC, i.header_offset,
+                               i.compress_type, i.date_time) for i in expected])
+        self.assertTrue(index.has_member(self.archive, 'maps\\WOOD.jpg'))
+        self.assertFalse(index.has_member(self.archive, 'maps'))
+
+    def test_cached(self):
+        index = ArchiveIndex(self.root)
+        index.names(self.archive)
+        index.scenes(self.archive)
+        self.assertEqual(index.reads, 1)
+        # another process (or tomorrow's session) reads the stored index
+        other = ArchiveIndex(self.root)
+        other.scenes(self.archive)
+        self.assertEqual(other.reads, 0)
+        # a changed archive is read again
+        self.write_archive('shot.zip', {'shot.max': 'scene', 'new.max': 'new'})
+        self.assertEqual(other.scenes(self.archive), ['new.max', 'shot.max'])
+        self.assertEqual(other.reads, 1)
+        self.assertEqual(ArchiveIndex(self.root).scenes(self.archive), ['new.max', 'shot.max'])
+        self.assertEqual(os.listdir(self.root), [os.path.basename(other._index_path(self.archive))])
+
+    def test_unwritable_index(self):
+        blocked = os.path.join(self.tmp, 'blocked')
+        open(blocked, 'wb').close()
+        index = ArchiveIndex(blocked)
+        self.assertEqual(index.scenes(self.archive), ['props/chair.MAX', 'shot.max'])
+        self.assertEqual(index.scenes(self.archive), ['props/chair.MAX', 'shot.max'])
+        self.assertEqual(index.reads, 1)
+
+    def test_problems(self):
+        index = ArchiveIndex(self.root)
+        self.assertEqual(index.problems(self.archive), [])
+        missing = index.problems(os.path.join(self.tmp, 'missing.zip'))
+        self.assertTrue(missing[0].startswith("Can't read archive"), missing)
+        notzip = os.path.join(self.tmp, 'notzip.zip')
+        with open(notzip, 'wb') as fh:
+            fh.write('PK' * 100)
+        self.assertTrue(index.problems(notzip)[0].startswith("Not a zip archive"))
+        clash = self.write_archive('clash.zip', {'maps/wood.jpg': 'a', 'MAPS/wood.jpg': 'b'})
+        self.assertEqual(index.problems(clash), ["MAPS/wood.jpg and maps/wood.jpg would overwrite each other."])
+        # a central directory pointing past the end, as in an archive cut short
+        with open(self.archive, 'rb') as fh:
+            data = fh.read()
+        at = data.index('PK\001\002') + 42
+        with open(self.archive, 'wb') as fh:
+            fh.write(data[:at] + struct.pack('<L', len(data) * 2) + data[at + 4:])
+        problems = index.problems(self.archive)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue('cut short' in problems[0], problems)
+
+    def test_extract_from_index(self):
+        ArchiveIndex(self.root).infolist(self.archive)
+        # rebuilt from the stored index
+        infolist = ArchiveIndex(self.root).infolist(self.archive)
+        dest = os.path.join(self.tmp, 'node')
+        stats = StreamingExtractor(self.archive, infolist=infolist).extract(dest)
+        self.assertEqual(stats['files'], 3)
+        with open(os.path.join(dest, 'maps', 'wood.jpg'), 'rb') as fh:
+            self.assertEqual(fh.read(), 'wood')
+
+    def test_get_index(self):
+        index = ArchiveIndex(self.root)
+        set_index(index)
+        try:
+            self.assertTrue(get_index() is index)
+        finally:
+            set_index(None)
+        self.assertFalse(get_index() is index)
+
+    def test_benchmark(self):
+        members = dict([('maps/tile%05d.jpg' % i, str(i)) for i in range(5000)])
+        members['shot.max'] = 'scene'
+        archive = self.write_archive('big.zip', members, zipfile.ZIP_STORED)
+        started = time.time()
+        for i in range(5):
+            names = [n for n in zipfile.ZipFile(open(archive, 'rb')).namelist()
+                     if n.lower().endswith('.max')]
+        cold = (time.time() - started) / 5
+        index = ArchiveIndex(self.root)
+        self.assertEqual(index.scenes(archive), names)
+        started = time.time()
+        for i in range(5):
+            ArchiveIndex(self.root).scenes(archive)
+        stored = (time.time() - started) / 5
+        started = time.time()
+        for i in range(5):
+            index.scenes(archive)
+        memory = (time.time() - started) / 5
+        self.assertEqual(index.reads, 1)
+        LOG.info("archive index: %0.2fms reading the zip, %0.2fms from the stored index, "
+                 "%0.2fms from memory (%d members)" % (cold * 1000, stored * 1000,
+                                                       memory * 1000, len(members)))
+        self.assertTrue(memory < cold)
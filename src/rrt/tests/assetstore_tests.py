@@ -0,0 +1,76 @@
+import os, shutil, tempfile, unittest, zipfile
+from rrt.assetstore import AssetStore, hash_stream, is_blob_name
+from rrt.dependencies import manifest_entries, archive_entries
+from rrt.filesystem import set_resolver, ShareResolver
+from rrt.jobspec import JobSpec
+from rrt.archiveindex import ArchiveIndex, set_index
+from rrt.tests.verify_tests import StaticBackend
+
+class TestAssetStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = AssetStore(os.path.join(self.tmp, 'store'))
+        set_index(ArchiveIndex(os.path.join(self.tmp, 'index')))
+
+    def tearDown(self):
+        set_resolver(None)
+        set_index(None)
+        shutil.rmtree(self.tmp)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def test_files_are_stored_once(self):
+        # the same texture library used by two projects
+        a = self._write('one/sourceimages/wood.tif', 'wood' * 100)
+        b = self._write('two/sourceimages/wood.tif', 'wood' * 100)
+        c = self._write('two/sourceimages/tile.tif', 'tile')
+        entries, missing = manifest_entries([a], hashes=False)
+        stats = self.store.store_manifest(entries)
+        self.assertEqual((stats['uploaded_files'], stats['uploaded_bytes']), (1, 400))
+        self.assertTrue(is_blob_name(entries[0]['blob']))
+        entries, missing = manifest_entries([b, c])
+        stats = self.store.store_manifest(entries)
+        self.assertEqual((stats['files'], stats['uploaded_files']), (2, 1))
+        # the manifest's sha1 is the blob name, so nothing is hashed again
+        self.assertEqual(entries[0]['blob'], entries[0]['hash'])
+        with open(self.store.blob_path(entries[1]['blob']), 'rb') as fh:
+            self.assertEqual(fh.read(), 'tile')
+        self.assertEqual(os.listdir(os.path.join(self.store.root, 'tmp')), [])
+
+    def test_archive_members(self):
+        archive = os.path.join(self.tmp, 'shot.zip')
+        zf = zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED)
+        zf.writestr('shot.max', 'scene' * 50)
+        zf.writestr('maps/wood.jpg', 'wood' * 100)
+        zf.close()
+        entries = archive_entries(archive)
+        self.store.store_manifest(entries, archive)
+        with open(self.store.blob_path(entries[1]['blob']), 'rb') as fh:
+            self.assertEqual(hash_stream(fh), entries[1]['blob'])
+        # a re-zipped archive with one map changed uploads just that map
+        zf = zipfile.ZipFile(archive, 'w')
+        zf.writestr('shot.max', 'scene' * 50)
+        zf.writestr('maps/wood.jpg', 'WOOD' * 100)
+        zf.close()
+        stats = self.store.store_manifest(archive_entries(archive), archive)
+        self.assertEqual((stats['uploaded_files'], stats['uploaded_bytes']), (1, 400))
+
+    def test_submit_without_store(self):
+        set_resolver(ShareResolver(StaticBackend()))
+        spec = JobSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                       1, 10, renderer='maya_render_sw', threads=2, output='out')
+        entries, missing = manifest_entries([self._write('shot/a.tif', 'a')])
+        spec.set_manifest(entries)
+        # a store on a share that isn't there costs the job nothing
+        self._write('not_a_dir', '')
+        self.assertEqual(spec._store_assets(AssetStore(os.path.join(self.tmp, 'not_a_dir'))), None)
+        self.assertFalse('blob' in entries[0])
+        self.assertEqual(spec._store_assets(self.store)['uploaded_files'], 1)
+        self.assertTrue(spec._manifest[0]['blob'])
@@ -0,0 +1,145 @@
+import os, shutil, tempfile, unittest, zipfile
+from rrt.dependencies import scan_maya_ascii, manifest_entries, archive_entries, \
+    scene_manifest, resolve_path
+from rrt.filesystem import set_resolver, ShareResolver
+from rrt.jobspec import JobSpec, PUBLISHED_MANIFEST_FILE
+from rrt.manifest import read_manifest, manifest_paths
+from rrt.archiveindex import ArchiveIndex, set_index
+from rrt.tests.verify_tests import StaticBackend
+
+SCENE = r'''//Maya ASCII 2011 scene
+//Name: shot.ma
+file -rdi 1 -ns "chair" -rfn "chairRN" "scenes/chair.ma";
+file -r -ns "chair" -dr 1 -rfn "chairRN" "scenes/chair.ma";
+requires maya "2011";
+createNode transform -n "pSphere1";
+	setAttr ".t" -type "double3" 0 1 0 ;
+createNode file -n "file1";
+	setAttr ".ftn" -type "string" "sourceimages/wood.tif";
+createNode file -n "file2";
+	setAttr ".ftn" -type "string" "//sourceimages/tiles.<udim>.tif";
+createNode imagePlane -n "imagePlane1";
+	setAttr ".imn" -type "string" "%(project)s/sourceimages/plate.tif";
+createNode cacheFile -n "cacheFile1";
+	setAttr ".cn" -type "string" "sphereShape";
+	setAttr ".cp" -type "string" "data/cache";
+createNode file -n "file3";
+	setAttr ".ftn" -type "string" "sourceimages/gone.tif";
+createNode script -n "uiConfigurationScriptNode";
+	setAttr ".b" -type "string" "sourceimages/not_a_texture.tif";
+'''
+
+CHAIR = r'''//Maya ASCII 2011 scene
+file -r -ns "shot" -rfn "shotRN" "scenes/shot.ma";
+createNode file -n "file1";
+	setAttr ".fileTextureName" -type "string" "sourceimages/leather.tif";
+'''
+
+class TestDependencies(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.project = os.path.join(self.tmp, 'shot')
+        for name in ('scenes', 'sourceimages', 'data/cache'):
+            os.makedirs(os.path.join(self.project, name))
+        self.scene = self._write('scenes/shot.ma', SCENE % {'project': self.project.replace('\\', '/')})
+        self._write('scenes/chair.ma', CHAIR)
+        for name in ('wood.tif', 'tiles.1001.tif', 'tiles.1002.tif', 'plate.tif', 'leather.tif',
+                     'not_a_texture.tif'):
+            self._write('sourceimages/' + name, name)
+        for name in ('sphereShape.xml', 'sphereShapeFrame1.mc', 'sphereShapeFrame2.mc'):
+            self._write('data/cache/' + name, name)
+        set_index(ArchiveIndex(os.path.join(self.tmp, 'index')))
+
+    def tearDown(self):
+        set_resolver(None)
+        set_index(None)
+        shutil.rmtree(self.tmp)
+
+    def _write(self, rel, data):
+        path = os.path.join(self.project, *rel.split('/'))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def _rel(self, paths):
+        return sorted([os.path.relpath(p, self.project).replace('\\', '/') for p in paths])
+
+    def test_resolve_path(self):
+        self.assertEqual(resolve_path('sourceimages/a.tif', self.project),
+                         os.path.join(self.project, 'sourceimages', 'a.tif'))
+        self.assertEqual(resolve_path('//sourceimages/a.tif', self.project),
+                         os.path.join(self.project, 'sourceimages', 'a.tif'))
+        # a unc path stays one
+        self.assertEqual(resolve_path('//server/share/a.tif', self.project),
+                         os.path.normpath('//server/share/a.tif'))
+
+    def test_scan_maya_ascii(self):
+        paths = scan_maya_ascii(self.scene, self.project)
+        self.assertEqual(self._rel(paths), [
+            'data/cache/sphereShape.xml', 'data/cache/sphereShapeFrame1.mc',
+            'data/cache/sphereShapeFrame2.mc', 'scenes/chair.ma',
+            # the reference back to shot.ma isn't followed again
+            'scenes/shot.ma',
+            'sourceimages/gone.tif', 'sourceimages/leather.tif', 'sourceimages/plate.tif',
+            'sourceimages/tiles.1001.tif', 'sourceimages/tiles.1002.tif', 'sourceimages/wood.tif'])
+
+    def test_wrapped_statements(self):
+        self._write('scenes/lamp.ma', 'createNode file -n "file1";\n'
+                                      '\tsetAttr ".ftn" -type "string" "sourceimages/wood.tif";\n')
+        scene = self._write('scenes/set.ma', '//Maya ASCII 2011 scene\n'
+                            'file -rdi 1 -ns "lamp" -rfn "lampRN"\n\t\t"scenes/lamp.ma";\n'
+                            'file -r -ns "lamp" -dr 1 -rfn "lampRN"\n\t\t"scenes/lamp.ma";\n'
+                            'createNode file -n "file1";\n'
+                            '\tsetAttr ".ftn" -type "string"\n\t\t"sourceimages/plate.tif";\n')
+        self.assertEqual(self._rel(scan_maya_ascii(scene, self.project)),
+                         ['scenes/lamp.ma', 'sourceimages/plate.tif', 'sourceimages/wood.tif'])
+
+    def test_manifest_entries(self):
+        entries, missing = manifest_entries(scan_maya_ascii(self.scene, self.project))
+        self.assertEqual(self._rel(missing), ['sourceimages/gone.tif'])
+        wood = [e for e in entries if e['path'].endswith('wood.tif')][0]
+        self.assertEqual(wood['size'], len('wood.tif'))
+        self.assertEqual(len(wood['hash']), 40)
+        entries, missing = manifest_entries([self.scene], hashes=False)
+        self.assertFalse('hash' in entries[0])
+        # binary scenes need maya to list them
+        self.assertEqual(scene_manifest(os.path.join(self.project, 'scenes', 'shot.mb'),
+                                        self.project), None)
+
+    def test_archive_entries(self):
+        archive = os.path.join(self.tmp, 'shot.zip')
+        zf = zipfile.ZipFile(archive, 'w')
+        zf.writestr('shot.max', 'scene')
+        zf.writestr('maps/', '')
+        zf.writestr('maps/wood.jpg', 'wood')
+        zf.close()
+        entries, missing = scene_manifest('shot.max', archive)
+        self.assertEqual([e['path'] for e in entries], ['shot.max', 'maps/wood.jpg'])
+        self.assertEqual(entries[1]['size'], 4)
+        self.assertTrue(entries[1]['hash'].startswith('crc32:'))
+        self.assertEqual(archive_entries(archive), entries)
+
+    def test_jobspec_manifest(self):
+        set_resolver(ShareResolver(StaticBackend()))
+        spec = JobSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                       1, 10, renderer='maya_render_sw', threads=2, output='out',
+                       uuid='20101018120000')
+        self.assertEqual(spec.data['manifest'], '')
+        entries, missing = manifest_entries([self.scene])
+        spec.set_manifest(entries)
+        self.assertEqual(spec.data['manifest'],
+                         os.path.join(spec.log_dir, PUBLISHED_MANIFEST_FILE))
+        ini = spec._write_ini_file(self.tmp)
+        self.assertEqual(manifest_paths(os.path.join(self.tmp, '20101018120000.manifest.json')),
+                         set([self.scene]))
+        self.assertEqual(JobSpec.from_ini(ini).data['manifest'], spec.data['manifest'])
+        # the log share isn't there, so the job goes without
+        spec._job_data['logs'] = os.path.join(self.scene, 'logs', 'shot.*.txt')
+        spec._job_data['manifest'] = os.path.join(spec.log_dir, PUBLISHED_MANIFEST_FILE)
+        spec._publish_manifest()
+        self.assertEqual(spec.data['manifest'], '')
+        spec._job_data['logs'] = os.path.join(self.tmp, 'logs', 'shot.*.txt')
+        spec.set_manifest(entries)
+        spec._publish_manifest()
+        self.assertEqual(len(read_manifest(spec.data['manifest'])), 1)
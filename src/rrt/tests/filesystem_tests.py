@@ -0,0 +1,99 @@
+import os, tempfile, unittest
+from rrt import RinglingException
+from rrt.filesystem import ShareBackend, NetUseBackend, MappingFileBackend,\
+    ShareResolver
+
+NET_USE_LISTING = """New connections will be remembered.
+
+
+Status       Local     Remote                    Network
+
+-------------------------------------------------------------------------------
+OK           S:        \\\\Hamming\\Students          Microsoft Windows Network
+Disconnected T:        \\\\wilkes\\faculty           Microsoft Windows Network
+             Z:        \\\\clogs\\clogs               Microsoft Windows Network
+The command completed successfully.
+"""
+
+class CountingBackend(ShareBackend):
+    def __init__(self, table):
+        self.table = table
+        self.calls = 0
+
+    def shares(self):
+        self.calls += 1
+        return dict(self.table)
+
+class Clock(object):
+    now = 1000.0
+    def __call__(self):
+        return self.now
+
+class TestShareResolver(unittest.TestCase):
+
+    def test_parse_net_use_listing(self):
+        table = NetUseBackend.parse_listing(NET_USE_LISTING)
+        self.assertEqual(table, {'S:': '\\\\Hamming\\Students',
+                                 'T:': '\\\\wilkes\\faculty',
+                                 'Z:': '\\\\clogs\\clogs'})
+
+    def test_host_rules_applied(self):
+        resolver = ShareResolver(CountingBackend({'S:': '\\\\Hamming\\Students',
+                                                  'Z:': '\\\\clogs\\clogs'}))
+        self.assertEqual(resolver.resolve('s:'), '\\\\hamming1\\students')
+        self.assertEqual(resolver.resolve('Z:'), '\\\\clogs\\clogs')
+
+    def test_single_enumeration_until_ttl(self):
+        clock = Clock()
+        backend = CountingBackend({'S:': '\\\\hamming\\students',
+                                   'T:': '\\\\wilkes\\faculty'})
+        resolver = ShareResolver(backend, ttl=60, clock=clock)
+        for i in range(100):
+            resolver.resolve('S:')
+            resolver.resolve('T:')
+        self.assertEqual(backend.calls, 1)
+        clock.now += 61
+        resolver.resolve('S:')
+        self.assertEqual(backend.calls, 2)
+
+    def test_unknown_drive(self):
+        resolver = ShareResolver(CountingBackend({}))
+        self.assertRaises(RinglingException, resolver.resolve, 'Q:')
+
+    def test_misses_cached_until_ttl(self):
+        clock = Clock()
+        backend = CountingBackend({})
+        resolver = ShareResolver(backend, ttl=60, clock=clock)
+        for i in range(10):
+            self.assertRaises(RinglingException, resolver.resolve, 'Q:')
+        # the listing, then the drive by itself
+        self.assertEqual(backend.calls, 2)
+        # mapped since
+        backend.table['Q:'] = '\\\\perlis\\projects'
+        clock.now += 61
+        self.assertEqual(resolver.resolve('Q:'), '\\\\perlis1\\projects')
+        self.assertEqual(backend.calls, 3)
+
+    def test_disk_cache(self):
+        fd, cache = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(cache)
+        try:
+            backend = CountingBackend({'S:': '\\\\hamming\\students'})
+            ShareResolver(backend, cache_file=cache).resolve('S:')
+            other = CountingBackend({})
+            self.assertEqual(ShareResolver(other, cache_file=cache).resolve('S:'),
+                             '\\\\hamming1\\students')
+            self.assertEqual(other.calls, 0)
+        finally:
+            os.remove(cache)
+
+    def test_mapping_file(self):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, "# test shares\ns: = \\\\perlis\\projects\n")
+        os.close(fd)
+        try:
+            resolver = ShareResolver(MappingFileBackend(path))
+            self.assertEqual(resolver.resolve('S:'), '\\\\perlis1\\projects')
+        finally:
+            os.remove(path)
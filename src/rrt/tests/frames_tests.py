@@ -0,0 +1,82 @@
+import unittest
+from rrt.frames import chunk_ranges, frame_count, auto_chunk_size, \
+    parse_chunk, interleave, FrameSet, AUTO_CHUNK, AUTO_MAX_CHUNK
+
+class TestChunking(unittest.TestCase):
+
+    def _frames(self, ranges, step):
+        frames = []
+        for first, last in ranges:
+            frames.extend(range(first, last + 1, step))
+        return frames
+
+    def test_even_chunks(self):
+        self.assertEqual(chunk_ranges(1, 10, 1, 5), [(1, 5), (6, 10)])
+
+    def test_ragged_final_chunk(self):
+        self.assertEqual(chunk_ranges(1, 11, 1, 5), [(1, 5), (6, 10), (11, 11)])
+
+    def test_step(self):
+        ranges = chunk_ranges(1, 20, 3, 4)
+        self.assertEqual(ranges, [(1, 10), (13, 19)])
+        self.assertEqual(self._frames(ranges, 3), range(1, 21, 3))
+
+    def test_chunks_cover_every_frame(self):
+        for start, end, step, chunk in [(0, 99, 1, 7), (5, 5, 1, 3),
+                                        (10, 250, 4, 6), (-10, 10, 2, 1)]:
+            ranges = chunk_ranges(start, end, step, chunk)
+            self.assertEqual(self._frames(ranges, step), range(start, end + 1, step))
+            for first, last in ranges:
+                self.assertTrue(frame_count(first, last, step) <= chunk)
+
+    def test_auto_chunk(self):
+        self.assertEqual(auto_chunk_size(10, 64), 1)
+        self.assertEqual(auto_chunk_size(2000, 64, 2), AUTO_MAX_CHUNK)
+        self.assertEqual(auto_chunk_size(300, 64, 2), 3)
+
+    def test_parse_chunk(self):
+        self.assertEqual(parse_chunk('Auto'), AUTO_CHUNK)
+        self.assertEqual(parse_chunk('4'), 4)
+        self.assertRaises(ValueError, parse_chunk, 0)
+        self.assertRaises(ValueError, parse_chunk, 'lots')
+
+class TestFrameSet(unittest.TestCase):
+
+    def test_parse(self):
+        frames = FrameSet.parse('1-10x3, 150,200-203')
+        self.assertEqual(list(frames), [1, 4, 7, 10, 150, 200, 201, 202, 203])
+        self.assertEqual(FrameSet.parse('-3--1'), FrameSet([-3, -2, -1]))
+        self.assertTrue(150 in frames)
+        self.assertEqual((frames.first, frames.last), (1, 203))
+        for bad in ('', '1-', '5-1', 'a', '1-10x0', ','):
+            self.assertRaises(ValueError, FrameSet.parse, bad)
+
+    def test_str_round_trip(self):
+        for expression in ('1-99x2,150,200-230', '10,57', '5', '1-3,7-15x4'):
+            self.assertEqual(str(FrameSet.parse(expression)), expression)
+        # ranges are written out ending on their last frame
+        self.assertEqual(str(FrameSet.parse('1-100x2')), '1-99x2')
+        self.assertEqual(str(FrameSet([1, 5, 6, 7, 8])), '1,5-8')
+
+    def test_ranges(self):
+        frames = FrameSet.parse('10,57,200-230')
+        self.assertEqual(frames.ranges(), [(10, 57, 47), (200, 230, 1)])
+        self.assertEqual(FrameSet.from_range(1, 20, 3).ranges(), [(1, 19, 3)])
+        # every frame is covered exactly once
+        frames = FrameSet([1, 2, 4, 8, 9, 10, 30, 33, 36, 37])
+        covered = []
+        for first, last, step in frames.ranges():
+            covered.extend(range(first, last + 1, step))
+        self.assertEqual(covered, list(frames))
+
+    def test_interleave(self):
+        passes = interleave(FrameSet.from_range(1, 100))
+        self.assertEqual([str(p) for p in passes], ['1-97x16', '9-89x16', '5-93x8', '3-99x4', '2-100x2'])
+        # each frame exactly once, for any stride or frame list
+        for frames, stride in ((FrameSet.from_range(1, 100), 12), (FrameSet.parse('1-5,50-60x2'), 16),
+                               (FrameSet([7]), 16)):
+            covered = []
+            for p in interleave(frames, stride):
+                covered.extend(p)
+            self.assertEqual(sorted(covered), list(frames))
+        self.assertEqual(interleave(FrameSet.from_range(1, 5), 1), [FrameSet.from_range(1, 5)])
@@ -0,0 +1,46 @@
+import os, shutil, tempfile, threading, unittest, datetime
+from rrt.ids import new_id, new_ids, is_id, id_time, shard, job_dir, job_dirs, node_name
+
+class TestIds(unittest.TestCase):
+
+    def test_new_ids(self):
+        ids = new_ids(5000, 'WS-042.ringling.edu')
+        self.assertEqual(len(set(ids)), 5000)
+        self.assertEqual(sorted(ids), ids)
+        self.assertTrue(ids[0].split('-')[1] == 'ws042ringlinged')
+        later = new_id('ws042')
+        self.assertTrue(is_id(later))
+        self.assertTrue(later[:17] >= ids[-1][:17])
+        self.assertFalse(is_id('20101018120000'))
+        self.assertTrue(abs(id_time(later) - datetime.datetime.now()) < datetime.timedelta(minutes=1))
+        self.assertEqual(id_time('20101018120000'), datetime.datetime(2010, 10, 18, 12))
+        self.assertTrue(node_name())
+
+    def test_threads(self):
+        found = []
+        def make():
+            found.extend(new_ids(500))
+        threads = [threading.Thread(target=make) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(found)), 4000)
+
+    def test_layout(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            self.assertEqual(shard('20101018120000'), None)
+            self.assertEqual(job_dir(tmp, '20101018120000'), os.path.join(tmp, '20101018120000'))
+            jobs = ['20101017120000', '20101018090000', '20101018120000001-ws1-000001',
+                    '20101018120000002-ws1-000002', '20101019080000000-ws1-000003']
+            for job in jobs:
+                os.makedirs(job_dir(tmp, job))
+            self.assertEqual(job_dir(tmp, jobs[2]), os.path.join(tmp, '20101018', jobs[2]))
+            self.assertEqual([job for job, path in job_dirs(tmp)], list(reversed(jobs)))
+            self.assertTrue(all([os.path.isdir(path) for job, path in job_dirs(tmp)]))
+            self.assertEqual([job for job, path in job_dirs(tmp, low='20101018', high='20101018')],
+                             [jobs[3], jobs[2], jobs[1]])
+            self.assertEqual(list(job_dirs(os.path.join(tmp, 'missing'))), [])
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,69 @@
+import os, sys, unittest, json
+from subprocess import Popen, PIPE
+
+import rrt
+
+# Runs in a fresh interpreter: trips on anything that would start a process
+# while the module is imported, then reports how long the import took.
+PROBE = """
+import os, sys, time, json, subprocess
+spawned = []
+def _trap(name):
+    def trapped(*args, **kwargs):
+        spawned.append(name)
+        raise OSError("%s called during import" % name)
+    return trapped
+subprocess.Popen.__init__ = _trap('subprocess.Popen')
+for name in ('system', 'popen', 'fork', 'spawnv', 'spawnve', 'execv', 'execve'):
+    if hasattr(os, name):
+        setattr(os, name, _trap('os.' + name))
+start = time.time()
+error = None
+try:
+    __import__(sys.argv[1])
+except Exception, e:
+    error = repr(e)
+elapsed = time.time() - start
+sys.stdout.write(json.dumps({'spawned': spawned, 'elapsed': elapsed, 'error': error}))
+"""
+
+# generous, this only needs to catch imports that reach for git or the network
+IMPORT_BUDGET = 2.0
+
+class TestImportCost(unittest.TestCase):
+
+    def _probe(self, module):
+        src = os.path.dirname(os.path.dirname(os.path.abspath(rrt.__file__)))
+        environ = dict(os.environ)
+        environ['PYTHONPATH'] = os.pathsep.join([src, environ.get('PYTHONPATH', '')])
+        p = Popen([sys.executable, '-c', PROBE, module], stdout=PIPE,
+                  stderr=PIPE, env=environ)
+        out, err = p.communicate()
+        self.assertEqual(p.returncode, 0, err)
+        return json.loads(out)
+
+    def _check(self, module):
+        version_file = os.path.join(os.path.dirname(rrt.__file__),
+                                    rrt.__VERSION_FILE__)
+        before = os.path.exists(version_file) and os.stat(version_file).st_mtime
+        result = self._probe(module)
+        self.assertEqual(result['error'], None, result['error'])
+        self.assertEqual(result['spawned'], [],
+                         "%s spawned %r during import" % (module, result['spawned']))
+        self.assertTrue(result['elapsed'] < IMPORT_BUDGET,
+                        "importing %s took %0.3fs" % (module, result['elapsed']))
+        after = os.path.exists(version_file) and os.stat(version_file).st_mtime
+        self.assertEqual(before, after, "%s rewrote %s" % (module, version_file))
+
+    def test_import_rrt(self):
+        self._check('rrt')
+
+    def test_import_scripts(self):
+        self._check('rrt.hpc.scripts')
+
+    def test_import_jobspec(self):
+        self._check('rrt.jobspec')
+
+    def test_version_is_lazy(self):
+        self.assertTrue(rrt.__version__)
+        self.assertTrue(rrt.get_version().endswith(rrt.__version__))
@@ -0,0 +1,90 @@
+import time, random, string, shutil, tempfile, unittest
+from rrt.jobfile import loads, dumps, decode, quote, unquote, load, JOB_FIELDS, \
+    PATH, INT, FRAMES, CHUNK
+from rrt.frames import FrameSet, AUTO_CHUNK
+from rrt.filesystem import set_resolver, ShareResolver
+from rrt.jobspec import JobSpec
+from rrt.tests.verify_tests import StaticBackend
+from rrt.hpc.scripts import LOG
+
+# characters that broke the old job file reader, and ones that need quoting
+AWKWARD = ' #="\\\t\r\n:;'
+
+def random_text(rng, size=12, alphabet=string.ascii_letters + string.digits + AWKWARD):
+    return ''.join([rng.choice(alphabet) for i in range(rng.randint(0, size))])
+
+def random_job(rng):
+    """A job's typed values, as `decode` returns them."""
+    job = {}
+    for key, field in JOB_FIELDS:
+        if field is INT:
+            job[key] = rng.choice([None, rng.randint(-10, 100000)])
+        elif field is FRAMES:
+            job[key] = rng.choice([None, FrameSet(rng.sample(range(-5, 500), rng.randint(1, 20)))])
+        elif field is CHUNK:
+            job[key] = rng.choice([None, AUTO_CHUNK, rng.randint(1, 50)])
+        elif field is PATH:
+            job[key] = 'S:\\' + '\\'.join([random_text(rng, 8) for i in range(rng.randint(0, 4))])
+        else:
+            job[key] = random_text(rng)
+    job['extra_' + random_text(rng, 6, string.ascii_lowercase)] = random_text(rng)
+    return job
+
+class TestJobFile(unittest.TestCase):
+
+    def test_quote(self):
+        self.assertEqual(quote('S:\\projects\\shot #2 = final'), 'S:\\projects\\shot #2 = final')
+        self.assertEqual(quote(' padded'), '" padded"')
+        self.assertEqual(quote('two\nlines'), '"two\\nlines"')
+        self.assertEqual(quote('"quoted"'), '"\\"quoted\\""')
+        for value in ('', '"', '\\', 'a\\', ' \\"\n', '"\\n"'):
+            self.assertEqual(unquote(quote(value)), value)
+
+    def test_loads(self):
+        data = loads('\r\n    # a comment\r\n    name = shot #2 = final\r\n'
+                     '    scene = S:\\shot.ma\n    blank =\nnot a value\n    padded = " x "\n')
+        self.assertEqual(data, {'name': 'shot #2 = final', 'scene': 'S:\\shot.ma',
+                                'blank': '', 'padded': ' x '})
+
+    def test_decode(self):
+        data = decode({'start': '5', 'frames': '1-9x2', 'chunk': 'auto', 'threads': '',
+                       'scene': 'S:\\shot.ma'})
+        self.assertEqual(data, {'start': 5, 'frames': FrameSet([1, 3, 5, 7, 9]),
+                                'chunk': AUTO_CHUNK, 'threads': None, 'scene': 'S:\\shot.ma'})
+        self.assertRaises(ValueError, decode, {'start': 'one'})
+
+    def test_round_trip(self):
+        rng = random.Random(20101018)
+        for i in range(500):
+            job = random_job(rng)
+            text = dumps(job, comment=random_text(rng))
+            self.assertEqual(decode(loads(text)), job, text)
+
+    def test_jobspec(self):
+        tmp = tempfile.mkdtemp()
+        set_resolver(ShareResolver(StaticBackend()))
+        try:
+            spec = JobSpec('shot #2 = final', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                           1, 10, renderer='maya_render_sw', threads=2, output='out',
+                           uuid='20101018120000')
+            path = spec._write_ini_file(tmp)
+            self.assertEqual(load(path)['name'], 'shot #2 = final')
+            loaded = JobSpec.from_ini(path)
+            self.assertEqual(loaded.data['title'], 'shot #2 = final')
+            self.assertEqual(loaded.ini_data.split('\n')[1:], spec.ini_data.split('\n')[1:])
+        finally:
+            set_resolver(None)
+            shutil.rmtree(tmp)
+
+    def test_benchmark(self):
+        rng = random.Random(1)
+        jobs = [random_job(rng) for i in range(2000)]
+        started = time.time()
+        texts = [dumps(job) for job in jobs]
+        written = time.time() - started
+        started = time.time()
+        for text in texts:
+            decode(loads(text))
+        read = time.time() - started
+        LOG.info("job files: %0.1fus to write, %0.1fus to read and decode (%d jobs)" % (
+                 written * 1e6 / len(jobs), read * 1e6 / len(jobs), len(jobs)))
@@ -0,0 +1,137 @@
+import os, json, shutil, tempfile, unittest
+from rrt.frames import FrameSet, longest_first, ORDER_ASCENDING, ORDER_LONGEST, \
+    ORDER_INTERLEAVE
+from rrt.planner import find_history, frame_costs, makespan, plan, recommend, \
+    speedup, COSTS_FILE
+from rrt.jobspec import PUBLISHED_JOB_FILE
+from rrt.ids import job_dir
+from rrt.tests.spool_tests import SpoolTestCase
+
+JOB_FILE = """
+    renderer = maya_render_sw
+    name = shot
+    project = %(project)s
+    scene = %(scene)s
+    logs = %(logs)s
+    start = 1
+    end = 10
+    step = 1
+    threads = %(threads)s
+    uuid = %(uuid)s
+"""
+
+FRAME_LOG = """Starting Rendering S:/projects/shot/images/shot.%(frame)04d.iff
+Finished Rendering S:/projects/shot/images/shot.%(frame)04d.iff.
+Total Elapsed Time for Maya Software : 0:00:%(seconds)02d
+"""
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _job(self, uuid, scene, times, threads=1, project='S:\\projects\\shot'):
+        """An earlier job with a log per frame in `times` ({frame: seconds})."""
+        log_dir = job_dir(os.path.join(self.tmp, 'tester'), uuid)
+        os.makedirs(log_dir)
+        logs = os.path.join(log_dir, 'shot.*.txt')
+        with open(os.path.join(log_dir, PUBLISHED_JOB_FILE), 'wb') as fh:
+            fh.write(JOB_FILE % dict(scene=scene, project=project, logs=logs, threads=threads,
+                                     uuid=uuid))
+        for frame, seconds in times.items():
+            with open(logs.replace('*', str(frame)), 'wb') as fh:
+                fh.write(FRAME_LOG % dict(frame=frame, seconds=seconds))
+
+    def test_history(self):
+        self._job('20100901120000', 'S:\\projects\\shot\\scenes\\a.ma', {1: 10})
+        self._job('20100902120000', 'S:\\projects\\shot\\scenes\\b.ma', {1: 20})
+        # newer jobs are in date directories
+        self._job('20100903120000000-ws01-000001', 'S:\\projects\\shot\\scenes\\a.ma', {1: 30})
+        history = find_history('S:\\projects\\shot\\scenes\\a.ma', root=self.tmp, user='tester')
+        self.assertEqual([uuid for uuid, data in history],
+                         ['20100903120000000-ws01-000001', '20100901120000'])
+        # another scene in the project stands in when there's nothing else
+        history = find_history('S:\\projects\\shot\\scenes\\c.ma', 'S:\\projects\\shot',
+                               root=self.tmp, user='tester')
+        self.assertEqual(len(history), 3)
+        self.assertEqual(find_history('c.ma', root=self.tmp, user='nobody'), [])
+
+    def test_archive_members(self):
+        self._job('20100901120000', 'main.max', {1: 10}, project='S:\\projects\\shot.zip')
+        self._job('20100902120000', 'main.max', {1: 20}, project='S:\\projects\\other.zip')
+        history = find_history('main.max', 'S:\\projects\\shot.zip', root=self.tmp, user='tester')
+        self.assertEqual([uuid for uuid, data in history], ['20100901120000'])
+        self.assertEqual(find_history('main.max', 'S:\\projects\\new.zip', root=self.tmp,
+                                      user='tester'), [])
+
+    def test_costs_newest_wins_and_scale_to_one_thread(self):
+        self._job('20100901120000', 'a.ma', {1: 10, 2: 10})
+        self._job('20100903120000', 'a.ma', {1: 30}, threads=2)
+        costs = frame_costs(find_history('a.ma', 'S:\\projects\\shot', root=self.tmp,
+                                         user='tester'))
+        self.assertEqual(costs[2], 10)
+        self.assertAlmostEqual(costs[1], 30 * speedup(2))
+
+    def test_makespan(self):
+        self.assertEqual(makespan([5, 5, 5, 5], 2), 10)
+        # handing out the long task last leaves one worker busy at the end
+        self.assertEqual(makespan([1, 1, 1, 1, 4], 2), 6)
+        self.assertEqual(makespan([4, 1, 1, 1, 1], 2), 4)
+
+    def test_longest_first(self):
+        tasks = [(1, 1, 1), (2, 2, 1), (3, 4, 1)]
+        costs = {1: 5.0, 2: 50.0, 3: 10.0, 4: 10.0}
+        self.assertEqual(longest_first(tasks, costs), [(2, 2, 1), (3, 4, 1), (1, 1, 1)])
+
+    def test_plan(self):
+        frames = FrameSet.from_range(1, 100)
+        # a few very slow frames in an otherwise quick shot
+        costs = dict((f, 600.0 if f > 95 else 60.0) for f in frames)
+        best = plan(frames, costs, cores=16, overhead=30.0)
+        self.assertEqual(best.known, 100)
+        ascending = plan(frames, costs, cores=16, overhead=30.0, order=ORDER_ASCENDING)
+        self.assertTrue(best.seconds < ascending.seconds)
+        # chunking would pile the slow frames into the same tasks
+        self.assertEqual(best.chunk, 1)
+        # when loading the scene costs more than a frame, frames get chunked
+        cheap = plan(frames, dict((f, 10.0) for f in frames), cores=16, overhead=30.0)
+        self.assertTrue(cheap.chunk > 1)
+        self.assertEqual(plan(frames, {}, cores=16), None)
+
+    def test_plan_interleaved(self):
+        frames = FrameSet.from_range(1, 64)
+        costs = dict((f, 60.0) for f in frames)
+        ascending = plan(frames, costs, cores=8, chunk_choices=(4,), order=ORDER_ASCENDING)
+        interleaved = plan(frames, costs, cores=8, chunk_choices=(4,), order=ORDER_INTERLEAVE)
+        # the passes' tasks are smaller at the end, but the cluster stays just as busy
+        self.assertTrue(interleaved.seconds <= ascending.seconds * 1.1)
+
+    def test_recommend(self):
+        self._job('20100901120000', 'a.ma', dict((f, 40) for f in range(1, 11)))
+        best = recommend('a.ma', 'S:\\projects\\shot', '1-10', cores=4, root=self.tmp,
+                         user='tester')
+        self.assertEqual(best.jobs, 1)
+        self.assertEqual(sorted(best.costs), range(1, 11))
+        self.assertTrue('frames/task' in str(best))
+        self.assertEqual(recommend('b.ma', None, '1-10', root=self.tmp, user='tester'), None)
+
+class TestOrderedSpool(SpoolTestCase):
+
+    def test_longest_first_tasks(self):
+        costs = os.path.join(self.tmp, COSTS_FILE)
+        with open(costs, 'wb') as fh:
+            costs_by_frame = dict((str(f), 10.0) for f in range(1, 11))
+            costs_by_frame.update({'3': 100.0, '7': 50.0, '8': 75.0})
+            json.dump(costs_by_frame, fh)
+        ini = self.write_ini('shot', start=1, end=10, chunk=1, order=ORDER_LONGEST)
+        with open(ini, 'ab') as fh:
+            fh.write('costs = %s\n' % costs)
+        scheduler = self.spool.Scheduler()
+        self.spool.Spooler(ini).Submit(scheduler, 64)
+        tasks = self.render_tasks(scheduler.jobs[0])
+        self.assertEqual([t.Name for t in tasks][:3], ['Render 3-3', 'Render 8-8', 'Render 7-7'])
+        self.assertEqual(len(tasks), 10)
+        self.assertTrue(' -s 3 -e 3 ' in tasks[0].CommandLine)
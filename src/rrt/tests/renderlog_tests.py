@@ -0,0 +1,116 @@
+import os, shutil, tempfile, unittest
+from rrt.renderlog import LogIndex, LogParser, guess_renderer, parse_seconds, \
+    INDEX_NAME
+
+SW_LOG = """Result: S:/projects/shot/scenes/shot.ma
+// Warning: file: S:/projects/shot/scenes/shot.ma line 40: Unrecognized node type 'fur'
+Starting Rendering S:/projects/shot/images/shot.0003.iff
+Maya Software Renderer: Peak memory 812.5 MB
+// Error: texture missing: wood.tif
+Finished Rendering S:/projects/shot/images/shot.0003.iff.
+Total Elapsed Time for Maya Software : 0:01:05.5
+Starting Rendering S:/projects/shot/images/shot.0004.iff
+Maya Software Renderer: Peak memory 1.5 GB
+Finished Rendering S:/projects/shot/images/shot.0004.iff.
+Total Elapsed Time for Maya Software : 0:00:42.0
+"""
+
+MAX_LOG = """7/29/2010 10:14:05 AM; Job Started
+7/29/2010 10:14:06 AM; Frame 12 assigned
+7/29/2010 10:14:30 AM; Warning: missing map
+7/29/2010 10:16:06 AM; Frame 12 completed
+"""
+
+class TestParser(unittest.TestCase):
+
+    def _parse(self, name, text, renderer=None):
+        frames = {}
+        parser = LogParser(name, renderer or guess_renderer(text), frames)
+        for line in text.splitlines():
+            parser.feed(line)
+        return frames, parser
+
+    def test_seconds(self):
+        self.assertEqual(parse_seconds('1:02:03.5'), 3723.5)
+        self.assertEqual(parse_seconds('02:03'), 123.0)
+        self.assertEqual(parse_seconds('12.5'), 12.5)
+
+    def test_maya_sw(self):
+        frames, parser = self._parse('shot.3.txt', SW_LOG)
+        self.assertEqual(parser.renderer, 'maya_render_sw')
+        self.assertEqual(sorted(frames), ['3', '4'])
+        self.assertEqual(frames['3']['seconds'], 65.5)
+        self.assertEqual(frames['3']['memory_mb'], 812.5)
+        self.assertEqual(frames['3']['errors'], 1)
+        self.assertEqual(frames['4']['memory_mb'], 1536.0)
+        self.assertTrue(frames['4']['done'])
+        # the scene load warning goes to the sweep log's frame
+        self.assertEqual(frames['3']['warnings'], 1)
+        self.assertEqual(frames['3']['messages'][-1], 'texture missing: wood.tif')
+
+    def test_chunk_log_preamble(self):
+        frames, parser = self._parse('shot.txt', SW_LOG)
+        # a chunk log's scene load warning isn't any one frame's
+        self.assertEqual(parser.warnings, 1)
+        self.assertEqual(frames['3']['warnings'], 0)
+
+    def test_max_timestamps(self):
+        frames, parser = self._parse('shot.12.txt', MAX_LOG)
+        self.assertEqual(parser.renderer, 'max')
+        self.assertEqual(frames['12']['seconds'], 120.0)
+        self.assertEqual(frames['12']['warnings'], 1)
+
+    def test_frame_from_log_name(self):
+        frames, parser = self._parse('shot.7.txt', "Render time: 0:10\n", 'max')
+        self.assertEqual(frames['7']['seconds'], 10.0)
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logs = os.path.join(self.tmp, 'shot.*.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, name, text, mode='wb'):
+        with open(os.path.join(self.tmp, name), mode) as fh:
+            fh.write(text)
+
+    def test_incremental(self):
+        lines = SW_LOG.splitlines(True)
+        # a running task: the last line is only half written
+        self._write('shot.3.txt', ''.join(lines[:4]) + lines[4][:10])
+        index = LogIndex(self.logs)
+        self.assertEqual(index.update(), 1)
+        self.assertFalse(index.frame(3)['done'])
+        self.assertEqual(index.frame(3)['errors'], 0)
+        self.assertEqual(index.update(), 0)
+        self._write('shot.3.txt', lines[4][10:] + ''.join(lines[5:]), 'ab')
+        # a fresh instance picks up from the saved index
+        index = LogIndex(self.logs)
+        self.assertEqual(index.update(), 1)
+        self.assertTrue(index.frame(3)['done'])
+        self.assertEqual(index.frame(3)['errors'], 1)
+        self.assertEqual(index.frame(3)['seconds'], 65.5)
+        self.assertEqual([f for f, r in index.slowest(1)], [3])
+        self.assertEqual([f for f, r in index.over_memory(1000)], [4])
+        self.assertEqual([f for f, r in index.failed()], [3])
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp, INDEX_NAME)))
+
+    def test_rewritten_log(self):
+        self._write('shot.3.txt', SW_LOG)
+        index = LogIndex(self.logs)
+        index.update()
+        self.assertEqual(len(index.frames()), 2)
+        self._write('shot.3.txt', '\n'.join(SW_LOG.splitlines()[2:7]) + '\n')
+        index.update()
+        self.assertEqual([f for f, r in index.frames()], [3])
+        self.assertEqual(index.frame(3)['warnings'], 0)
+
+    def test_only_matching_logs(self):
+        self._write('shot.12.txt', MAX_LOG)
+        self._write('other.1.txt', SW_LOG)
+        index = LogIndex(self.logs)
+        index.update()
+        self.assertEqual([f for f, r in index.frames()], [12])
@@ -0,0 +1,194 @@
+import os, sys, glob, json, shutil, tempfile, time, unittest
+from rrt.scheduler import TaskType, JobUnitType, get_backend
+from rrt.scheduler.local import Scheduler as LocalScheduler
+from rrt.tests.spool_tests import load_spool
+
+def max_overlap(results):
+    """Most processes that were running at the same time."""
+    edges = []
+    for r in results:
+        edges.append((r.StartTime, 1))
+        edges.append((r.EndTime, -1))
+    running = peak = 0
+    for when, delta in sorted(edges):
+        running += delta
+        peak = max(peak, running)
+    return peak
+
+class TestLocalScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _job(self, scheduler, frames=6, cores=2, unit=JobUnitType.Core):
+        job = scheduler.CreateJob()
+        job.Name = 'test'
+        job.UnitType = unit
+        prep = job.CreateTask()
+        prep.Type = TaskType.NodePrep
+        prep.CommandLine = 'echo prep'
+        render = job.CreateTask()
+        render.Type = TaskType.ParametricSweep
+        render.StartValue, render.EndValue, render.IncrementValue = 1, frames, 1
+        render.MinimumNumberOfCores = render.MaximumNumberOfCores = cores
+        render.CommandLine = 'sleep 0.1 && echo frame * cores $CCP_NUMCPUS $SHOT'
+        render.StdOutFilePath = render.StdErrFilePath = os.path.join(self.tmp, 'logs', 'shot.*.txt')
+        render.SetEnvironmentVariable('SHOT', 'sh010')
+        release = job.CreateTask()
+        release.Type = TaskType.NodeRelease
+        release.CommandLine = 'echo release'
+        for task in (prep, render, release):
+            job.AddTask(task)
+        return job
+
+    def test_backend_registry(self):
+        self.assertEqual(get_backend('local').Scheduler, LocalScheduler)
+        self.assertRaises(ValueError, get_backend, 'slurm')
+
+    def test_prep_render_release_order(self):
+        scheduler = LocalScheduler(cores=4)
+        job = self._job(scheduler)
+        scheduler.SubmitJob(job, None, None)
+        scheduler.Close()
+        self.assertEqual(job.State, 'Finished')
+        types = [r.Type for r in sorted(job.Results, key=lambda r: r.StartTime)]
+        self.assertEqual(types[0], TaskType.NodePrep)
+        self.assertEqual(types[-1], TaskType.NodeRelease)
+        renders = [r for r in job.Results if r.Type == TaskType.ParametricSweep]
+        self.assertEqual(sorted([r.Value for r in renders]), range(1, 7))
+        prep_end = min([r.EndTime for r in job.Results if r.Type == TaskType.NodePrep])
+        self.assertTrue(min([r.StartTime for r in renders]) >= prep_end)
+
+    def test_core_limits(self):
+        scheduler = LocalScheduler(cores=4)
+        job = self._job(scheduler, cores=2)
+        scheduler.SubmitJob(job, None, None)
+        scheduler.Close()
+        renders = [r for r in job.Results if r.Type == TaskType.ParametricSweep]
+        self.assertEqual(max_overlap(renders), 2)
+        self.assertEqual(set([r.Cores for r in renders]), set([2]))
+
+        scheduler = LocalScheduler(cores=4)
+        job = self._job(scheduler, unit=JobUnitType.Node)
+        scheduler.SubmitJob(job, None, None)
+        scheduler.Close()
+        renders = [r for r in job.Results if r.Type == TaskType.ParametricSweep]
+        self.assertEqual(max_overlap(renders), 1)
+
+    def test_log_redirection(self):
+        scheduler = LocalScheduler(cores=4)
+        scheduler.SubmitJob(self._job(scheduler, frames=3), None, None)
+        scheduler.Close()
+        for frame in (1, 2, 3):
+            with open(os.path.join(self.tmp, 'logs', 'shot.%d.txt' % frame)) as fh:
+                self.assertEqual(fh.read().strip(), 'frame %d cores 2 sh010' % frame)
+
+FAKE_RENDER = """#!%(python)s
+import os, sys
+args = sys.argv[1:]
+opt = dict(zip(args[:-1:2], args[1::2]))
+for frame in range(int(opt['-s']), int(opt['-e']) + 1, int(opt['-b'])):
+    open(os.path.join(opt['-rd'], 'shot.%%04d.iff' %% frame), 'wb').write('img')
+print 'rendered', opt['-s'], opt['-e']
+"""
+
+FAKE_DELEGATOR = """#!%(python)s
+import sys
+sys.path.insert(0, %(src)r)
+from rrt.hpc.scripts import %(entry)s
+%(entry)s()
+"""
+
+INI = """
+renderer = maya_render_sw
+name = shot
+project = %(tmp)s/project
+output = %(tmp)s/output
+scene = %(tmp)s/project/scenes/shot.ma
+logs = %(tmp)s/logs/shot.*.txt
+start = 1
+end = 9
+step = 2
+chunk = 2
+threads = 1
+uuid = 20261018120000
+net_drive = S:
+net_share = \\\\\\\\hamming1\\\\projects
+"""
+
+if os.name == 'posix':
+    class TestLocalEndToEnd(unittest.TestCase):
+        """
+        Spools a Maya job through the local backend with a fake Render.exe
+        while hpc-node-prep/release run the real rrt.hpc.scripts code.
+        """
+        def setUp(self):
+            self.tmp = tempfile.mkdtemp()
+            self.environ = dict(os.environ)
+            src = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            bin_dir = os.path.join(self.tmp, 'bin')
+            os.makedirs(bin_dir)
+            scripts = {'Render.exe': FAKE_RENDER, 'net': "#!/bin/sh\nexit 0\n",
+                       'hpc-node-prep': FAKE_DELEGATOR, 'hpc-node-release': FAKE_DELEGATOR,
+                       'hpc-node-run': FAKE_DELEGATOR}
+            entries = {'hpc-node-prep': 'prep_delegator', 'hpc-node-release': 'release_delegator',
+                       'hpc-node-run': 'run_delegator'}
+            for name, body in scripts.items():
+                path = os.path.join(bin_dir, name)
+                with open(path, 'wb') as fh:
+                    fh.write(body % {'python': sys.executable, 'src': src,
+                                     'entry': entries.get(name)})
+                os.chmod(path, 0755)
+            os.makedirs(os.path.join(self.tmp, 'project', 'furFiles'))
+            os.makedirs(os.path.join(self.tmp, 'output'))
+            with open(os.path.join(self.tmp, 'project', 'workspace.mel'), 'wb') as fh:
+                fh.write('workspace -fr "images" "images";\n')
+            with open(os.path.join(self.tmp, 'project', 'furFiles', 'a.fur'), 'wb') as fh:
+                fh.write('fur' * 1000)
+            os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+            os.environ['RRT_NODE_CACHE'] = os.path.join(self.tmp, 'cache')
+            self.ini = os.path.join(self.tmp, 'shot.ini')
+            with open(self.ini, 'wb') as fh:
+                fh.write(INI % {'tmp': self.tmp})
+
+        def tearDown(self):
+            os.environ.clear()
+            os.environ.update(self.environ)
+            shutil.rmtree(self.tmp)
+
+        def test_end_to_end(self):
+            spool = load_spool()
+            spool.UseBackend('local')
+            spool.Spooler.NODE_JOB_DIR = os.path.join(self.tmp, 'nodes')
+            scheduler = spool.Scheduler(cores=2)
+            started = time.time()
+            results = spool.SpoolBatch([self.ini], 'localhost', scheduler=scheduler)
+            total = time.time() - started
+            self.assertEqual(results[0][2], None)
+            job = scheduler.jobs[0]
+            self.assertEqual(job.State, 'Finished',
+                             [(r.Name, r.ExitCode) for r in job.Results])
+            self.assertEqual(sorted(os.listdir(os.path.join(self.tmp, 'output'))),
+                             ['shot.%04d.iff' % f for f in (1, 3, 5, 7, 9)])
+            self.assertEqual(sorted([os.path.basename(f) for f in
+                                     glob.glob(os.path.join(self.tmp, 'logs', '*.txt'))]),
+                             ['shot.%d.txt' % f for f in (1, 5, 9)])
+            # each phase was recorded beside the logs
+            records = []
+            for path in glob.glob(os.path.join(self.tmp, 'logs', 'telemetry', '*.jsonl')):
+                with open(path) as fh:
+                    records.extend([json.loads(line) for line in fh])
+            self.assertEqual(sorted([r['phase'] for r in records]),
+                             ['prep', 'release', 'render', 'render', 'render'])
+            self.assertEqual(set([r['job'] for r in records]), set(['20261018120000']))
+            renders = [r for r in records if r['phase'] == 'render']
+            self.assertEqual(sorted([r['frames'] for r in renders]), [1, 2, 2])
+            self.assertTrue([r for r in records if r['phase'] == 'prep'][0]['bytes_copied'] > 0)
+            # release removed the node project
+            self.assertEqual(os.listdir(os.path.join(self.tmp, 'nodes')), [])
+            overhead = sum([r.Elapsed for r in job.Results
+                            if r.Type in (TaskType.NodePrep, TaskType.NodeRelease)])
+            self.assertTrue(overhead < total, "prep/release %0.2fs of %0.2fs" % (overhead, total))
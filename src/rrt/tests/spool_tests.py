@@ -0,0 +1,144 @@
+import os, imp, shutil, tempfile, unittest
+import rrt
+
+SPOOL_SCRIPT = os.path.join(os.path.dirname(rrt.__file__), 'extras', 'bin',
+                            'hpc-spool-script.py')
+
+def load_spool():
+    """hpc-spool isn't a module, so load it from the extras."""
+    spool = imp.load_source('hpc_spool', SPOOL_SCRIPT)
+    spool.UseBackend('dryrun')
+    return spool
+
+INI = """
+    # Created for tester
+    renderer = %(renderer)s
+    name = %(name)s
+    project = S:\\projects\\shot
+    output = \\\\coutput\\coutput\\tester\\%(uuid)s
+    scene = S:\\projects\\shot\\scenes\\%(name)s.ma
+    logs = \\\\clogs\\clogs\\tester\\%(uuid)s\\%(name)s.*.txt
+    start = %(start)s
+    end = %(end)s
+    threads = 2
+    step = %(step)s
+    frames = %(frames)s
+    chunk = %(chunk)s
+    order = %(order)s
+    uuid = %(uuid)s
+    net_drive = S:
+    net_share = \\\\hamming1\\projects
+"""
+
+class SpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = load_spool()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_ini(self, name, **kwargs):
+        values = dict(renderer='maya_render_sw', name=name, start=1, end=10,
+                      step=1, chunk=1, frames='', order='ascending', uuid='2026101812000%d' % len(os.listdir(self.tmp)))
+        values.update(kwargs)
+        path = os.path.join(self.tmp, name + '.ini')
+        with open(path, 'wb') as fh:
+            fh.write(INI % values)
+        return path
+
+    def render_tasks(self, job):
+        return [t for t in job.Tasks if t.Type not in ('NodePrep', 'NodeRelease')]
+
+class TestBatchSpool(SpoolTestCase):
+
+    def test_expand_conf_paths(self):
+        paths = [self.write_ini('shot%d' % i) for i in range(3)]
+        self.assertEqual(self.spool.ExpandConfPaths([self.tmp]), sorted(paths))
+        self.assertEqual(self.spool.ExpandConfPaths([os.path.join(self.tmp, 'shot[01].ini'), paths[0]]),
+                         sorted(paths[:2]))
+
+    def test_one_connection_for_many_jobs(self):
+        paths = [self.write_ini('shot%d' % i) for i in range(12)]
+        connects = []
+        scheduler = self.spool.Scheduler()
+        original = scheduler.Connect
+        scheduler.Connect = lambda host: connects.append(host) or original(host)
+        results = self.spool.SpoolBatch(paths, 'head', scheduler=scheduler)
+        self.assertEqual(connects, ['head'])
+        self.assertEqual([r[0] for r in results], paths)
+        # submitted one at a time, in order
+        self.assertEqual([r[1] for r in results], range(1, 13))
+        self.assertEqual([r[2] for r in results], [None] * 12)
+        names = sorted([job.Name for job in scheduler.jobs])
+        self.assertEqual(names, sorted(['shot%d' % i for i in range(12)]))
+
+    def test_version_mismatch_closes(self):
+        scheduler = self.spool.Scheduler()
+        scheduler.SERVER_VERSION = (2, 0, 0, 0)
+        closed = []
+        scheduler.Close = lambda: closed.append(True)
+        self.assertRaises(RuntimeError, self.spool.Spooler.Connect, scheduler, 'head')
+        self.assertEqual(closed, [True])
+
+    def test_failures_are_reported_per_job(self):
+        good = self.write_ini('good')
+        bad = self.write_ini('bad', renderer='blender')
+        missing = os.path.join(self.tmp, 'missing.ini')
+        results = dict((r[0], r[1:]) for r in
+                       self.spool.SpoolBatch([good, bad, missing], 'head'))
+        self.assertEqual(results[good], (1, None))
+        self.assertEqual(results[bad][0], None)
+        self.assertTrue(results[missing][1])
+
+    def test_values_with_comment_characters(self):
+        # see rrt.jobfile
+        scheduler = self.spool.Scheduler()
+        self.spool.Spooler(self.write_ini('shot#2=final')).Submit(scheduler, 64)
+        self.assertEqual(scheduler.jobs[0].Name, 'shot#2=final')
+
+class TestTaskList(SpoolTestCase):
+
+    def _job(self, **kwargs):
+        scheduler = self.spool.Scheduler()
+        spooler = self.spool.Spooler(self.write_ini('shot', **kwargs))
+        spooler.Submit(scheduler, 64)
+        return scheduler.jobs[0]
+
+    def test_sweep(self):
+        tasks = self.render_tasks(self._job(start=1, end=10))
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].Type, 'ParametricSweep')
+        self.assertTrue(' -s * -e * ' in tasks[0].CommandLine)
+
+    def test_chunks(self):
+        tasks = self.render_tasks(self._job(start=1, end=20, step=2, chunk=4))
+        self.assertEqual([t.Name for t in tasks], ['Render 1-7', 'Render 9-15', 'Render 17-19'])
+        self.assertTrue(' -s 17 -e 19 -b 2 ' in tasks[-1].CommandLine)
+        self.assertTrue(tasks[-1].StdOutFilePath.endswith('shot.17.txt'))
+
+    def test_frame_list_sweeps(self):
+        job = self._job(frames='10,57,200-230,300-320x4')
+        tasks = self.render_tasks(job)
+        self.assertEqual([(t.StartValue, t.EndValue, t.IncrementValue) for t in tasks],
+                         [(10, 57, 47), (200, 230, 1), (300, 320, 4)])
+        self.assertTrue(' -b 4 ' in tasks[-1].CommandLine)
+        # one prep and release for the whole list
+        self.assertEqual(len(job.Tasks) - len(tasks), 2)
+
+    def test_frame_list_chunks(self):
+        tasks = self.render_tasks(self._job(frames='1-5,20-24x2', chunk=2))
+        self.assertEqual([t.Name for t in tasks],
+                         ['Render 1-2', 'Render 3-4', 'Render 5-5', 'Render 20-22', 'Render 24-24'])
+        self.assertTrue(' -s 20 -e 22 -b 2 ' in tasks[3].CommandLine)
+
+    def test_interleaved_passes(self):
+        tasks = self.render_tasks(self._job(start=1, end=100, order='interleave'))
+        self.assertEqual([(t.Name, t.StartValue, t.EndValue, t.IncrementValue) for t in tasks],
+                         [('Pass 1 *', 1, 97, 16), ('Pass 2 *', 9, 89, 16), ('Pass 3 *', 5, 93, 8),
+                          ('Pass 4 *', 3, 99, 4), ('Pass 5 *', 2, 100, 2)])
+        tasks = self.render_tasks(self._job(start=1, end=40, chunk=2, order='interleave'))
+        self.assertEqual([t.Name for t in tasks][:4], ['Pass 1 1-17', 'Pass 1 33-33',
+                                                       'Pass 2 9-25', 'Pass 3 5-13'])
+        self.assertTrue(' -s 1 -e 17 -b 16 ' in tasks[0].CommandLine)
@@ -0,0 +1,175 @@
+import os, sys, json, time, shutil, threading
+from subprocess import Popen, PIPE, STDOUT
+import rrt
+from rrt import spoolservice
+from rrt.spoolservice import SpoolService, NotRunning, spooled_path
+from rrt.submitqueue import SubmitQueue, SUBMITTED
+from rrt.tests.spool_tests import SpoolTestCase, SPOOL_SCRIPT
+from rrt.hpc.scripts import LOG
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(rrt.__file__)))
+
+class PathSpec(object):
+    """A job file that's already written, for SubmitQueue."""
+    def __init__(self, path):
+        self.data = {'title': os.path.basename(path)}
+        self.path = path
+    def prepare_submit(self, progress=None):
+        return self.path
+    def spool_command(self, fp):
+        raise AssertionError("hpc-spool started with a service running")
+
+class TestSpoolService(SpoolTestCase):
+
+    def setUp(self):
+        SpoolTestCase.setUp(self)
+        self.schedulers = []
+        self.running = []
+        self.drop = os.path.join(self.tmp, 'drop')
+        os.mkdir(self.drop)
+
+    def tearDown(self):
+        for service, thread in self.running:
+            service.stop()
+            thread.join(10)
+        SpoolTestCase.tearDown(self)
+
+    def scheduler(self):
+        scheduler = self.spool.Scheduler()
+        self.schedulers.append(scheduler)
+        return scheduler
+
+    def service(self, **kwargs):
+        spooler = self.spool.ServiceSpooler('head', scheduler_factory=self.scheduler)
+        kwargs.setdefault('port', None)
+        kwargs.setdefault('drop_dir', None)
+        return SpoolService(spooler, **kwargs)
+
+    def start(self, service):
+        thread = threading.Thread(target=service.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.running.append((service, thread))
+
+    def drop_ini(self, name, **kwargs):
+        path = os.path.join(self.drop, name + '.ini')
+        shutil.move(self.write_ini(name, **kwargs), path)
+        # long enough ago that it's finished being written
+        os.utime(path, (time.time() - 60, time.time() - 60))
+        return path
+
+    def test_socket(self):
+        service = self.service(port=0)
+        self.start(service)
+        paths = [self.write_ini('shot%d' % i) for i in range(6)]
+        results = {}
+        def send(path):
+            results[path] = spoolservice.submit([path], service.port)
+        threads = [threading.Thread(target=send, args=(path,)) for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(sorted([r[0][1] for r in results.values()]), range(1, 7))
+        self.assertEqual([r[0][2] for r in results.values()], [None] * 6)
+        # one connection, however the jobs were batched
+        self.assertEqual(service.connects, 1)
+        self.assertEqual(len(self.schedulers), 1)
+        self.assertTrue(1 <= service.batches <= 6)
+        bad = self.write_ini('bad', renderer='blender')
+        [(path, job_id, error)] = spoolservice.submit([bad], service.port)
+        self.assertEqual((path, job_id), (bad, None))
+        self.assertTrue('blender' in error, error)
+
+    def test_not_running(self):
+        service = self.service(port=0)
+        port = service.port
+        service._server.server_close()
+        self.assertRaises(NotRunning, spoolservice.submit, ['job.ini'], port)
+
+    def test_drop_folder(self):
+        service = self.service(drop_dir=self.drop)
+        good = self.drop_ini('good')
+        bad = self.drop_ini('bad', renderer='blender')
+        fresh = os.path.join(self.drop, 'fresh.ini')
+        shutil.copy(good, fresh)
+        self.assertEqual(service.scan(), 2)
+        self.assertEqual(service.scan(), 0)
+        self.assertEqual(service.run_once(1), 1)
+        self.assertEqual(json.load(open(spooled_path(good))), {'job': 1, 'error': None})
+        self.assertTrue('blender' in json.load(open(spooled_path(bad)))['error'])
+        # spooled files aren't spooled again, and fresh.ini is old enough now
+        self.assertEqual(service.scan(time.time() + 60), 1)
+        self.assertEqual(service.run_once(1), 1)
+        self.assertEqual(json.load(open(spooled_path(fresh)))['job'], 2)
+
+    def test_reconnects(self):
+        service = self.service(drop_dir=self.drop)
+        first = self.drop_ini('first')
+        service.scan()
+        service.run_once(1)
+        self.assertEqual(json.load(open(spooled_path(first))), {'job': 1, 'error': None})
+        # the connection drops between batches
+        def lost():
+            raise IOError("connection reset")
+        closed = []
+        self.schedulers[0].GetServerVersion = lost
+        self.schedulers[0].Close = lambda: closed.append(True)
+        second = self.drop_ini('second')
+        service.scan()
+        service.run_once(1)
+        self.assertEqual(service.connects, 2)
+        self.assertEqual(closed, [True])
+        self.assertEqual(json.load(open(spooled_path(second))), {'job': 1, 'error': None})
+        self.assertEqual([job.Name for job in self.schedulers[1].jobs], ['second'])
+
+    def test_unreachable_head_node(self):
+        service = self.service(drop_dir=self.drop)
+        factory = service.spooler.scheduler_factory
+        def unreachable():
+            scheduler = factory()
+            def connect(host):
+                raise IOError("no route to %s" % host)
+            scheduler.Connect = connect
+            return scheduler
+        service.spooler.scheduler_factory = unreachable
+        path = self.drop_ini('shot')
+        service.scan()
+        service.run_once(1)
+        self.assertFalse(service.connected)
+        # not tried, so it's tried again rather than marked spooled
+        self.assertFalse(os.path.exists(spooled_path(path)))
+        service.spooler.scheduler_factory = factory
+        self.assertEqual(service.scan(), 1)
+        service.run_once(1)
+        self.assertEqual(json.load(open(spooled_path(path)))['job'], 1)
+
+    def test_submit_queue(self):
+        service = self.service(port=0)
+        self.start(service)
+        queue = SubmitQueue()
+        queue.spool_port = service.port
+        submission = queue.submit(PathSpec(self.write_ini('shot')))
+        self.assertTrue(submission.wait(30))
+        self.assertEqual((submission.state, submission.job_id), (SUBMITTED, 1), submission.messages)
+
+    def test_benchmark(self):
+        paths = [self.write_ini('shot%d' % i) for i in range(3)]
+        env = dict(os.environ, PYTHONPATH=SRC)
+        started = time.time()
+        for path in paths:
+            proc = Popen([sys.executable, SPOOL_SCRIPT, '--dry-run', path],
+                         stdout=PIPE, stderr=STDOUT, env=env)
+            output = proc.communicate()[0]
+            self.assertEqual(proc.returncode, 0, output)
+        cold = (time.time() - started) / len(paths)
+        service = self.service(port=0)
+        self.start(service)
+        started = time.time()
+        for path in paths:
+            [(path, job_id, error)] = spoolservice.submit([path], service.port)
+            self.assertEqual(error, None)
+        warm = (time.time() - started) / len(paths)
+        LOG.info("spool: %0.1fms a job starting hpc-spool, %0.1fms through the service" % (
+                 cold * 1000, warm * 1000))
+        self.assertTrue(warm < cold)
@@ -0,0 +1,113 @@
+import os, sys, json, time, shutil, tempfile, threading, unittest
+import rrt, rrt.jobspec
+from rrt.frames import FrameSet, ORDER_LONGEST
+from rrt.planner import plan
+from rrt.filesystem import set_resolver, ShareResolver
+from rrt.jobspec import JobSpec
+from rrt.submitqueue import SubmitQueue, SUBMITTED, FAILED
+from rrt.tests.spool_tests import SPOOL_SCRIPT
+from rrt.tests.verify_tests import StaticBackend
+from rrt.hpc.scripts import LOG
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(rrt.__file__)))
+
+class DryRunSpec(JobSpec):
+    """Spools with hpc-spool --dry-run, under this python."""
+    def spool_command(self, fp):
+        return [sys.executable, SPOOL_SCRIPT, '--dry-run', fp]
+
+class FakeSpec(object):
+    def __init__(self, title, script):
+        self.data = {'title': title}
+        self.script = script
+    def prepare_submit(self, progress=None):
+        return self.data['title'] + '.ini'
+    def spool_command(self, fp):
+        return [sys.executable, '-c', self.script]
+
+class TestSubmitQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = (rrt.jobspec.JOBSPEC_DIR, rrt.jobspec.JOB_LOGS_UNC, os.environ.get('PYTHONPATH'))
+        rrt.jobspec.JOBSPEC_DIR = os.path.join(self.tmp, 'jobs')
+        rrt.jobspec.JOB_LOGS_UNC = os.path.join(self.tmp, 'logs')
+        os.environ['PYTHONPATH'] = SRC
+        set_resolver(ShareResolver(StaticBackend()))
+
+    def tearDown(self):
+        rrt.jobspec.JOBSPEC_DIR, rrt.jobspec.JOB_LOGS_UNC, path = self.saved
+        if path is None:
+            os.environ.pop('PYTHONPATH', None)
+        else:
+            os.environ['PYTHONPATH'] = path
+        set_resolver(None)
+        shutil.rmtree(self.tmp)
+
+    def test_submit_returns_right_away(self):
+        spec = DryRunSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                          1, 10, renderer='maya_render_sw', threads=2, output='out')
+        queue = SubmitQueue()
+        started = time.time()
+        submission = queue.submit(spec)
+        returned = time.time() - started
+        self.assertTrue(submission.wait(120))
+        total = time.time() - started
+        self.assertEqual(submission.state, SUBMITTED, submission.messages)
+        self.assertEqual(submission.job_id, 1)
+        self.assertTrue(returned < total)
+        messages = submission.poll()
+        self.assertTrue([m for m in messages if 'Submitted job 1' in m])
+        self.assertEqual(messages[-1], "Submitted shot as job 1.")
+        self.assertEqual(submission.poll(), [])
+        # the job file was written (and published) on the worker
+        self.assertEqual(os.listdir(rrt.jobspec.JOBSPEC_DIR), [spec.data['uuid'] + '.ini'])
+        LOG.info("submit: %0.1fms to queue, %0.1fs to submit" % (returned * 1000, total))
+
+    def test_manifest_made_in_background(self):
+        spec = DryRunSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                          1, 10, renderer='maya_render_sw', threads=2, output='out')
+        threads = []
+        def source():
+            threads.append(threading.currentThread())
+            return [{'path': 'S:\\projects\\shot\\wood.tif', 'size': 4}], ['S:\\gone.tif']
+        spec.defer_manifest(source)
+        self.assertEqual(threads, [])
+        submission = SubmitQueue().submit(spec)
+        self.assertTrue(submission.wait(120))
+        self.assertEqual(submission.state, SUBMITTED, submission.messages)
+        self.assertTrue(threads[0] is not threading.currentThread())
+        self.assertTrue("Scene uses a file that doesn't exist: S:\\gone.tif" in submission.messages)
+        self.assertTrue("1 files in the job manifest." in submission.messages)
+        self.assertTrue(os.path.isfile(spec.data['manifest']))
+
+    def test_plan_made_in_background(self):
+        spec = DryRunSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                          1, 4, renderer='maya_render_sw', threads=2, output='out',
+                          order=ORDER_LONGEST)
+        threads = []
+        def source():
+            threads.append(threading.currentThread())
+            return plan(FrameSet.parse('1-4'), {1: 10.0, 2: 40.0, 3: 20.0, 4: 30.0}, cores=4)
+        spec.defer_plan(source)
+        self.assertEqual(threads, [])
+        submission = SubmitQueue().submit(spec)
+        self.assertTrue(submission.wait(120))
+        self.assertEqual(submission.state, SUBMITTED, submission.messages)
+        self.assertTrue(threads[0] is not threading.currentThread())
+        self.assertTrue([m for m in submission.messages if m.startswith('Recommended: ')])
+        with open(spec.data['costs'], 'rb') as fh:
+            self.assertEqual(sorted(json.load(fh)), ['1', '2', '3', '4'])
+
+    def test_failures_and_order(self):
+        seen = []
+        queue = SubmitQueue()
+        bad = queue.submit(FakeSpec('bad', "import sys; print 'ERROR: no head node'; sys.exit(2)"),
+                           lambda s, m: seen.append((s.title, s.state, m)))
+        good = queue.submit(FakeSpec('good', "print 'INFO: Submitted job 42 to head.'"))
+        self.assertEqual(len(queue.pending), 2)
+        self.assertTrue(queue.wait(60))
+        self.assertEqual(queue.pending, [])
+        self.assertEqual((bad.state, bad.error), (FAILED, 'ERROR: no head node'))
+        self.assertEqual(seen[-1], ('bad', FAILED, "Could not submit bad: ERROR: no head node"))
+        self.assertEqual((good.state, good.job_id), (SUBMITTED, 42))
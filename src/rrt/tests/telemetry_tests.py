@@ -0,0 +1,131 @@
+import os, sys, json, time, shutil, datetime, tempfile, unittest
+from StringIO import StringIO
+from rrt import telemetry
+from rrt.telemetry import Phase, record, find_records, summarize, percentile
+from rrt.ids import job_dir
+from rrt.hpc.scripts import run_delegator, parse_frame_range
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmp)
+
+    def _logs(self, user, uuid):
+        return os.path.join(job_dir(os.path.join(self.tmp, user), uuid), 'shot.*.txt')
+
+    def test_phase_writes_json_lines(self):
+        os.environ['LOGS'] = self._logs('tester', '20100903154215')
+        os.environ['NODE_PROJECT'] = os.path.join(self.tmp, 'hpc', '20100903154215')
+        with Phase('prep') as phase:
+            phase.update(bytes_copied=1024)
+        try:
+            with Phase('render', frames=2):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        folder = os.path.join(self.tmp, 'tester', '20100903154215', 'telemetry')
+        files = [f for f in os.listdir(folder) if f.endswith('.jsonl')]
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(folder, files[0])) as fh:
+            entries = [json.loads(line) for line in fh]
+        self.assertEqual([e['phase'] for e in entries], ['prep', 'render'])
+        self.assertEqual(entries[0]['job'], '20100903154215')
+        self.assertEqual(entries[0]['bytes_copied'], 1024)
+        self.assertTrue(entries[0]['ok'])
+        self.assertFalse(entries[1]['ok'])
+        self.assertEqual(entries[1]['frames'], 2)
+
+    def test_negative_frames(self):
+        self.assertEqual(parse_frame_range('-5--1'), (-5, -1))
+        self.assertEqual(parse_frame_range('-2-3'), (-2, 3))
+        self.assertEqual(parse_frame_range('10-20'), (10, 20))
+        self.assertEqual(parse_frame_range('*-*'), None)
+        os.environ['LOGS'] = self._logs('tester', '20100903154215')
+        os.environ['NODE_PROJECT'] = os.path.join(self.tmp, 'hpc', '20100903154215')
+        try:
+            run_delegator(['--frames=-5--3', '--step=1', sys.executable, '-c', 'pass'])
+        except SystemExit, e:
+            self.assertEqual(e.code, 0)
+        else:
+            self.fail("expected run_delegator to exit")
+        [entry] = find_records(self.tmp, jobs=['20100903154215'])
+        self.assertEqual((entry['first_frame'], entry['last_frame'], entry['frames']), (-5, -3, 3))
+
+    def test_no_logs_no_record(self):
+        os.environ.pop('LOGS', None)
+        with Phase('prep') as phase:
+            pass
+        self.assertEqual(phase.entry, None)
+
+    def test_unwritable_location_is_ignored(self):
+        blocker = os.path.join(self.tmp, 'file')
+        open(blocker, 'wb').close()
+        entry = record('prep', time.time(), 1.0, logs=os.path.join(blocker, 'x', 'shot.*.txt'))
+        self.assertEqual(entry['phase'], 'prep')
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+        self.assertEqual(percentile([], 50), None)
+
+    def _populate(self):
+        day = time.mktime(datetime.datetime(2010, 9, 3, 12).timetuple())
+        for user, uuid, start in [('alice', '20100903120000', day),
+                                  # in a date directory, see rrt.ids
+                                  ('alice', '20100910120000000-ws01-00000a', day + 7 * 86400),
+                                  ('bob', '20100903130000', day + 3600)]:
+            logs = self._logs(user, uuid)
+            for node, seconds in [('node01', 10.0), ('node02', 30.0)]:
+                record('prep', start, seconds, logs=logs, job=uuid, node=node,
+                       bytes_copied=1024 * 1024)
+                for frame in range(4):
+                    record('render', start + seconds, 60.0 + frame, logs=logs,
+                           job=uuid, node=node, frames=1)
+                record('release', start + 600, 2.0, logs=logs, job=uuid, node=node)
+
+    def test_find_by_job_user_and_date(self):
+        self._populate()
+        self.assertEqual(len(find_records(self.tmp)), 3 * 12)
+        self.assertEqual(len(find_records(self.tmp, jobs=['20100903120000'])), 12)
+        self.assertEqual(len(find_records(self.tmp, users=['bob'])), 12)
+        day = datetime.datetime(2010, 9, 3)
+        found = find_records(self.tmp, since=day, until=day)
+        self.assertEqual(set([e['job'] for e in found]),
+                         set(['20100903120000', '20100903130000']))
+
+    def test_summarize(self):
+        self._populate()
+        rows = summarize(find_records(self.tmp, users=['alice']))
+        self.assertEqual([(r['phase'], r['node']) for r in rows][:3],
+                         [('prep', '*'), ('prep', 'node01'), ('prep', 'node02')])
+        self.assertEqual(rows[-1]['phase'], 'release')
+        prep = rows[0]
+        self.assertEqual(prep['count'], 4)
+        self.assertEqual(prep['max'], 30.0)
+        self.assertEqual(prep['bytes_copied'], 4 * 1024 * 1024)
+        render = [r for r in rows if r['phase'] == 'render' and r['node'] == '*'][0]
+        self.assertEqual(render['frames'], 16)
+        self.assertEqual(render['p50'], 61.0)
+
+    def test_main(self):
+        self._populate()
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.assertRaises(SystemExit, telemetry.main,
+                              ['--root', self.tmp, '--json', '20100903130000'])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        rows = json.loads(output)
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(set([r['phase'] for r in rows]), set(telemetry.PHASES))
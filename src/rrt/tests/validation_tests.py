@@ -0,0 +1,157 @@
+import os, sys, time, shutil, tempfile, unittest, zipfile
+from StringIO import StringIO
+from rrt.filesystem import set_resolver, ShareResolver, ShareBackend
+from rrt.validation import Validator, Problem, PathCache, validate, errors, main, \
+    check_files, check_share, check_archive, CHECKS, ERROR
+from rrt.archiveindex import ArchiveIndex, set_index
+from rrt.jobfile import dumps
+from rrt.hpc.scripts import LOG
+
+class CountingBackend(ShareBackend):
+    def __init__(self):
+        self.calls = 0
+    def shares(self):
+        self.calls += 1
+        return {'S:': '\\\\hamming\\projects'}
+
+# everything but the checks that look for the project and scene
+NO_FILES = [c for c in CHECKS if c not in (check_files, check_archive)]
+
+def job(**kw):
+    data = {'renderer': 'maya_render_sw', 'title': 'shot', 'project': 'S:\\projects\\shot',
+            'scene': 'S:\\projects\\shot\\scenes\\shot.ma', 'start': 1, 'end': 10, 'step': 1,
+            'output': 'S:\\output\\shot', 'chunk': 1, 'order': 'ascending'}
+    data.update(kw)
+    return data
+
+class TestValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.backend = CountingBackend()
+        set_resolver(ShareResolver(self.backend))
+        set_index(ArchiveIndex(os.path.join(self.tmp, 'index')))
+
+    def tearDown(self):
+        set_resolver(None)
+        set_index(None)
+        shutil.rmtree(self.tmp)
+
+    def _fields(self, problems):
+        return [p.field for p in problems]
+
+    def test_everything_is_reported(self):
+        problems = Validator(checks=NO_FILES).validate(
+            job(title='', start=20, chunk='lots', order='random',
+                scene='S:\\projects\\my shot\\scene#1.ma', output='S:\\output\\'))
+        self.assertEqual(self._fields(problems), ['title', 'end', 'chunk', 'order', 'output',
+                                                  'scene', 'scene'])
+        self.assertEqual(problems[0], Problem('title', "title cannot be blank."))
+        self.assertEqual(problems[0].as_dict()['level'], ERROR)
+        # a frame list stands in for the range
+        self.assertEqual(self._fields(validate(job(frames='1-x'))[:1]), ['frames'])
+        # max scenes are members of an archive, not paths
+        self.assertEqual(Validator(checks=NO_FILES).validate(
+            job(renderer='max', scene='my shot.max', project='S:\\shot.zip')), [])
+
+    def test_share(self):
+        validator = Validator(checks=(check_share,))
+        self.assertEqual(validator.validate(job()), [])
+        self.assertEqual(self._fields(validator.validate(job(project='T:\\shot'))), ['project'])
+        self.assertEqual(self._fields(validator.validate(job(project='shot'))), ['project'])
+
+    def test_files(self):
+        project = os.path.join(self.tmp, 'shot')
+        os.makedirs(os.path.join(project, 'scenes'))
+        scene = os.path.join(project, 'scenes', 'shot.ma')
+        open(scene, 'wb').close()
+        validator = Validator(checks=(check_files,))
+        self.assertEqual(validator.validate(job(project=project, scene=scene)), [])
+        problems = validator.validate(job(project=project, scene=scene + 'x'))
+        self.assertEqual(self._fields(problems), ['scene'])
+        self.assertEqual(self._fields(validator.validate(job(project=project + '.zip'))), ['project'])
+        problems = validator.validate(job(project=os.path.join(project, 'scenes'), scene=scene))
+        self.assertEqual(problems, [])
+        problems = validator.validate(job(project=os.path.join(project, 'sc'), scene=scene))
+        self.assertEqual([p.level for p in problems], ['error', 'warning'])
+
+    def test_archive(self):
+        archive = os.path.join(self.tmp, 'shot.zip')
+        zf = zipfile.ZipFile(archive, 'w')
+        zf.writestr('scenes/shot.max', 'scene')
+        zf.writestr('maps/wood.jpg', 'wood')
+        zf.writestr('Maps/Wood.jpg', 'WOOD')
+        zf.close()
+        validator = Validator(checks=(check_archive,))
+        problems = validator.validate(job(renderer='max', project=archive, scene='scenes\\shot.max'))
+        self.assertEqual(self._fields(problems), ['project'])
+        self.assertTrue('overwrite' in problems[0].message)
+        zf = zipfile.ZipFile(archive, 'w')
+        zf.writestr('scenes/shot.max', 'scene')
+        zf.close()
+        self.assertEqual(validator.validate(job(renderer='max', project=archive, scene='scenes/shot.max')), [])
+        problems = validator.validate(job(renderer='max', project=archive, scene='shot.max'))
+        self.assertEqual(self._fields(problems), ['scene'])
+        with open(archive, 'wb') as fh:
+            fh.write('not a zip')
+        self.assertEqual(self._fields(Validator(checks=(check_archive,)).validate(
+            job(renderer='max', project=archive, scene='shot.max'))), ['project'])
+
+    def test_cached_lookups(self):
+        paths = PathCache()
+        validator = Validator(paths=paths)
+        results = validator.validate_all([job(title='shot%d' % i) for i in range(10)])
+        self.assertEqual(len(results), 10)
+        # the share, the project and the scene, once for all ten jobs
+        self.assertEqual(paths.lookups, 3)
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(self._fields(errors(results[0][1])), ['project', 'scene'])
+
+    def test_benchmark(self):
+        project = os.path.join(self.tmp, 'shot')
+        os.makedirs(os.path.join(project, 'scenes'))
+        jobs = []
+        for i in range(500):
+            scene = os.path.join(project, 'scenes', 'shot%d.ma' % i)
+            open(scene, 'wb').close()
+            jobs.append(job(project=project, scene=scene))
+        started = time.time()
+        for data in jobs:
+            # what each submit used to pay: nothing shared between jobs
+            Validator(checks=(check_files,)).validate(data)
+        cold = time.time() - started
+        validator = Validator(checks=(check_files,))
+        started = time.time()
+        results = validator.validate_all(jobs)
+        batch = time.time() - started
+        self.assertEqual([p for data, p in results if p], [])
+        self.assertEqual(validator.paths.lookups, 501)
+        LOG.info("validation: %0.3fms a job alone, %0.3fms a job in a batch of %d" % (
+                 cold * 1000 / len(jobs), batch * 1000 / len(jobs), len(jobs)))
+
+    def _job_file(self, name, **kw):
+        data = job(**kw)
+        # as JobSpec.ini_data writes it
+        data['name'] = data.pop('title')
+        path = os.path.join(self.tmp, name + '.ini')
+        with open(path, 'wb') as fh:
+            fh.write(dumps(data))
+        return path
+
+    def test_main(self):
+        good = self._job_file('good')
+        bad = self._job_file('bad', start=20)
+        output = StringIO()
+        sys.stdout = output
+        try:
+            main(['-q', good, bad])
+        except SystemExit, e:
+            self.assertEqual(e.code, 3)
+        else:
+            self.fail("expected a failing exit code")
+        finally:
+            sys.stdout = sys.__stdout__
+        output = output.getvalue()
+        # the title is read from the name the job file keeps it under
+        self.assertFalse('title' in output, output)
+        self.assertEqual(output.count('End frame is before the start frame.'), 1, output)
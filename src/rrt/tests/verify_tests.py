@@ -0,0 +1,116 @@
+import os, sys, shutil, struct, tempfile, unittest
+from StringIO import StringIO
+from rrt.filesystem import ShareBackend, ShareResolver, set_resolver
+from rrt.jobspec import JobSpec
+from rrt.verify import verify_output, check_image, requeue_spec, output_location, main
+
+PNG = '\x89PNG\r\n\x1a\n' + 'x' * 100 + 'IEND\xaeB`\x82'
+
+def iff(size):
+    return 'FOR4' + struct.pack('>I', size - 8) + 'CIMG' + 'x' * (size - 12)
+
+class StaticBackend(ShareBackend):
+    def shares(self):
+        return {'S:': '\\\\hamming\\projects'}
+
+class TestVerify(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        set_resolver(ShareResolver(StaticBackend()))
+
+    def tearDown(self):
+        set_resolver(None)
+        shutil.rmtree(self.tmp)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def test_check_image(self):
+        self.assertEqual(check_image(self._write('a.png', PNG), len(PNG)), None)
+        self.assertEqual(check_image(self._write('b.png', PNG[:60]), 60), 'truncated')
+        self.assertEqual(check_image(self._write('c.png', 'GIF89a' + PNG), len(PNG) + 6), 'bad header')
+        self.assertEqual(check_image(self._write('d.png', ''), 0), 'empty')
+        self.assertEqual(check_image(self._write('e.iff', iff(64)), 64), None)
+        self.assertEqual(check_image(self._write('f.iff', iff(64)[:40]), 40), 'truncated')
+        # formats without a signature only need to be non-empty
+        self.assertEqual(check_image(self._write('g.tga', 'x' * 20), 20), None)
+
+    def test_maya_layers(self):
+        for frame in (1, 3, 5, 9):
+            self._write('out/shot.%04d.iff' % frame, iff(64))
+        for frame in (1, 3, 5, 7, 9):
+            self._write('out/spec/shot_spec.%04d.iff' % frame, iff(64))
+        self._write('out/spec/shot_spec.0003.iff', iff(64)[:20])
+        self._write('out/notes.txt', 'frame 7 crashed')
+        result = verify_output(os.path.join(self.tmp, 'out'), 1, 9, 2)
+        self.assertEqual(len(result.sequences), 2)
+        self.assertEqual(result.missing, [7])
+        self.assertEqual(sorted(result.corrupt), [3])
+        self.assertEqual(result.bad_frames, [3, 7])
+        result = verify_output(os.path.join(self.tmp, 'out'), 1, 9, 2, headers=False)
+        self.assertEqual(result.bad_frames, [7])
+
+    def test_max_output(self):
+        output = os.path.join(self.tmp, 'out', 'beauty.png')
+        self.assertEqual(output_location(output), (os.path.dirname(output), 'beauty'))
+        for frame in range(1, 6):
+            self._write('out/beauty%04d.png' % frame, PNG)
+        self._write('out/beauty_Alpha0002.png', PNG)
+        self._write('out/other0004.png', '')
+        result = verify_output(output, 1, 5)
+        # the alpha element is missing everything but frame 2
+        self.assertEqual(result.missing, [1, 3, 4, 5])
+        self.assertEqual(result.corrupt, {})
+
+    def test_nothing_rendered(self):
+        result = verify_output(os.path.join(self.tmp, 'nowhere'), 1, 3)
+        self.assertEqual(result.missing, [1, 2, 3])
+        self.assertFalse(result.ok)
+
+    def test_frame_list(self):
+        for frame in (1, 2, 10):
+            self._write('out/shot.%04d.iff' % frame, iff(64))
+        spec = JobSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                       1, 10, 1, renderer='maya_render_sw', frames='1-3,10',
+                       output=os.path.join(self.tmp, 'out'))
+        path = spec._write_ini_file(self.tmp)
+        requeued = os.path.join(self.tmp, 'requeued')
+        output = StringIO()
+        sys.stdout = output
+        try:
+            main([path, '--write', requeued])
+        except SystemExit, e:
+            self.assertEqual(e.code, 3)
+        else:
+            self.fail("expected a failing exit code")
+        finally:
+            sys.stdout = sys.__stdout__
+        # 4-9 aren't in the job, so only 3 is missing
+        self.assertTrue('missing  3\n' in output.getvalue(), output.getvalue())
+        self.assertFalse('missing  4' in output.getvalue(), output.getvalue())
+        [name] = os.listdir(requeued)
+        self.assertEqual(JobSpec.from_ini(os.path.join(requeued, name)).data['frames'], '3')
+
+    def test_requeue(self):
+        spec = JobSpec('shot', 'S:\\projects\\shot', 'S:\\projects\\shot\\scenes\\shot.ma',
+                       1, 100, 2, renderer='maya_render_sw', threads=4,
+                       output=os.path.join(self.tmp, 'out'), uuid='20101018120000')
+        path = spec._write_ini_file(self.tmp)
+        loaded = JobSpec.from_ini(path)
+        self.assertEqual(loaded.data['uuid'], '20101018120000')
+        self.assertEqual(loaded.data['title'], 'shot')
+        self.assertEqual(loaded.data['net_share'], '\\\\hamming1\\projects')
+        requeue = requeue_spec(loaded, [5, 7, 9, 51, 99])
+        self.assertEqual(requeue.data['frames'], '5-9x2,51,99')
+        self.assertEqual((requeue.data['start'], requeue.data['end']), (5, 99))
+        self.assertEqual(requeue.data['output'], os.path.join(self.tmp, 'out'))
+        self.assertNotEqual(requeue.data['logs'], spec.data['logs'])
+        # and it survives the trip through a job file
+        reloaded = JobSpec.from_ini(requeue._write_ini_file(self.tmp))
+        self.assertEqual(reloaded.data['frames'], '5-9x2,51,99')
@@ -0,0 +1,253 @@
+"""
+Checks a job's settings before it's submitted.
+
+Every check runs, and each returns the `Problem` objects it found, so the
+submit windows can show everything wrong with a job at once.  A `Validator`
+remembers the files and drive shares it has looked up, so validating a
+batch of jobs (``rrt-validate *.ini``, or `Validator.validate_all` from a
+script) asks the file server about each project, scene and drive once.
+`rrt.jobspec.JobSpec` still refuses data it can't build a job from; these
+checks catch more, and catch it earlier.
+"""
+import os, sys, stat, string, ntpath, re
+from optparse import OptionParser
+from rrt import get_log
+from rrt.filesystem import get_share
+from rrt.archiveindex import get_index
+from rrt.frames import FrameSet, parse_chunk, AUTO_CHUNK, ORDERS
+
+LOG = get_log(__name__)
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# fields every job needs
+REQUIRED_FIELDS = ('renderer', 'title', 'project', 'scene', 'start', 'end', 'step', 'output')
+# punctuation maya scene paths can't have on the nodes
+ALLOWED_PATH_PUNCTUATION = r'/\._-'
+ILLEGAL_PATH_CHARS = re.sub('[%s]' % re.escape(ALLOWED_PATH_PUNCTUATION), '', string.punctuation)
+_ILLEGAL_PATH = re.compile('[%s]' % re.escape(ILLEGAL_PATH_CHARS))
+
+class Problem(object):
+    """Something wrong with one field of a job."""
+
+    def __init__(self, field, message, level=ERROR):
+        self.field = field
+        self.message = message
+        self.level = level
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return 'Problem(%r, %r, %r)' % (self.field, self.message, self.level)
+
+    def __eq__(self, other):
+        return isinstance(other, Problem) and \
+            (self.field, self.message, self.level) == (other.field, other.message, other.level)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def as_dict(self):
+        return {'field': self.field, 'message': self.message, 'level': self.level}
+
+def errors(problems):
+    return [p for p in problems if p.level == ERROR]
+
+def _blank(value):
+    return value is None or not str(value).strip()
+
+def _is_archive(project):
+    return project.lower().endswith('.zip')
+
+class PathCache(object):
+    """
+    Stats and drive shares looked up once each, however many jobs ask.
+    `lookups` counts the trips to the file system.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._shares = {}
+        self.lookups = 0
+
+    def stat(self, path):
+        key = os.path.normcase(os.path.normpath(path))
+        if key not in self._stats:
+            self.lookups += 1
+            try:
+                self._stats[key] = os.stat(path)
+            except (IOError, OSError):
+                self._stats[key] = None
+        return self._stats[key]
+
+    def isdir(self, path):
+        st = self.stat(path)
+        return st is not None and stat.S_ISDIR(st.st_mode)
+
+    def isfile(self, path):
+        st = self.stat(path)
+        return st is not None and stat.S_ISREG(st.st_mode)
+
+    def share(self, path):
+        """The unc share for a path's drive, or None."""
+        drive = ntpath.splitdrive(path)[0].upper()
+        if drive not in self._shares:
+            self.lookups += 1
+            try:
+                self._shares[drive] = get_share(path)
+            except Exception, e:
+                LOG.debug("No share for %s: %s" % (path, e))
+                self._shares[drive] = None
+        return self._shares[drive]
+
+def check_fields(data, paths):
+    return [Problem(k, "%s cannot be blank." % k) for k in REQUIRED_FIELDS if _blank(data.get(k))]
+
+def check_frames(data, paths):
+    problems = []
+    if not _blank(data.get('frames')):
+        try:
+            FrameSet.parse(str(data['frames']))
+        except ValueError, e:
+            problems.append(Problem('frames', "Bad frame list: %s" % e))
+    else:
+        numbers = {}
+        for k in ('start', 'end', 'step'):
+            if _blank(data.get(k)):
+                continue
+            try:
+                numbers[k] = int(data[k])
+            except (TypeError, ValueError):
+                problems.append(Problem(k, "%s must be a whole number, not '%s'." % (k, data[k])))
+        if numbers.get('step', 1) < 1:
+            problems.append(Problem('step', "step must be at least 1."))
+        if numbers.get('start', 0) > numbers.get('end', sys.maxint):
+            problems.append(Problem('end', "End frame is before the start frame."))
+    try:
+        parse_chunk(data.get('chunk', 1))
+    except (TypeError, ValueError):
+        problems.append(Problem('chunk', "Frames per task must be a positive number or '%s'." % AUTO_CHUNK))
+    if data.get('order') and data['order'] not in ORDERS:
+        problems.append(Problem('order', "Frame order must be one of: %s." % ', '.join(ORDERS)))
+    return problems
+
+def check_output(data, paths):
+    output = data.get('output')
+    if not _blank(output) and not os.path.splitext(ntpath.basename(str(output)))[0]:
+        return [Problem('output', "Output cannot be blank.")]
+    return []
+
+def check_scene_name(data, paths):
+    """Maya scenes are loaded on the nodes by path, which has to survive the trip."""
+    scene = data.get('scene')
+    if _blank(scene) or not str(data.get('renderer', '')).startswith('maya'):
+        return []
+    problems = []
+    tail = ntpath.splitdrive(scene)[1]
+    if ' ' in tail:
+        problems.append(Problem('scene', "Scene name or project path contains spaces. "
+                                         "Rename/Save As... before submitting."))
+    if _ILLEGAL_PATH.search(tail):
+        problems.append(Problem('scene', "Scene name or project path contains illegal characters: "
+                                         "e.g. %s -- Rename/Save As... before submitting." % ILLEGAL_PATH_CHARS))
+    return problems
+
+def check_share(data, paths):
+    project = data.get('project')
+    if _blank(project):
+        return []
+    if not ntpath.splitdrive(project)[0]:
+        return [Problem('project', "Can't find drive letter in project path: '%s'" % project)]
+    if paths.share(project) is None:
+        return [Problem('project', "Can't find network share for project '%s'." % project)]
+    return []
+
+def check_files(data, paths):
+    project, scene = data.get('project'), data.get('scene')
+    if _blank(project):
+        return []
+    if _is_archive(project):
+        # the scene is a member of the archive
+        if not paths.isfile(project):
+            return [Problem('project', "Project archive doesn't exist: %s" % project)]
+        return []
+    problems = []
+    if not paths.isdir(project):
+        problems.append(Problem('project', "Project directory doesn't exist: %s" % project))
+    if _blank(scene):
+        return problems
+    if not paths.isfile(scene):
+        problems.append(Problem('scene', "Scene doesn't exist: %s" % scene))
+    elif not os.path.normcase(scene).startswith(os.path.normcase(os.path.join(project, ''))):
+        # it renders, but only what the project's manifest and sync cover is local
+        problems.append(Problem('scene', "Scene isn't in the project: %s" % scene, WARNING))
+    return problems
+
+def check_archive(data, paths):
+    project, scene = data.get('project'), data.get('scene')
+    if _blank(project) or not _is_archive(project) or not paths.isfile(project):
+        return []
+    # the member list is read once per archive, see rrt.archiveindex
+    index = get_index()
+    problems = [Problem('project', p) for p in index.problems(project)]
+    if not problems and not _blank(scene) and not index.has_member(project, scene):
+        problems.append(Problem('scene', "Scene isn't in the project archive: %s" % scene))
+    return problems
+
+# run in order, all of them, for every job
+CHECKS = (check_fields, check_frames, check_output, check_scene_name, check_share, check_files,
+          check_archive)
+
+class Validator(object):
+
+    def __init__(self, checks=CHECKS, paths=None):
+        self.checks = checks
+        self.paths = paths or PathCache()
+
+    def validate(self, data):
+        """Returns every `Problem` with a job's data (a dict of job fields)."""
+        problems = []
+        for check in self.checks:
+            problems.extend(check(data, self.paths))
+        return problems
+
+    def validate_all(self, jobs):
+        """Returns a list of (data, problems), one for each job."""
+        return [(data, self.validate(data)) for data in jobs]
+
+def validate(data):
+    return Validator().validate(data)
+
+def main(argv=None):
+    """
+    rrt-validate: checks job files before they're spooled.
+    """
+    from rrt.jobspec import JobSpec
+    parser = OptionParser(usage="%prog [options] job.ini [job.ini ...]",
+                          description="Checks job files and lists every problem with each.")
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+                      help="only list jobs with problems")
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error("give one or more job files")
+    validator = Validator()
+    failed = 0
+    for path in args:
+        try:
+            data = JobSpec.ini_to_data(path)
+        except (IOError, OSError), e:
+            problems = [Problem('', "Can't read %s: %s" % (path, e))]
+        else:
+            problems = validator.validate(data)
+        if errors(problems):
+            failed += 1
+        if problems or not options.quiet:
+            print "%s: %s" % (path, 'error' if errors(problems) else 'ok')
+        for problem in problems:
+            print "    %s: %s" % (problem.level, problem.message)
+    sys.exit(3 if failed else 0)
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,246 @@
+"""
+Checks that every frame of a job landed in its output, and builds jobs for
+the frames that didn't.
+
+The output directory is listed once (render layer subdirectories included)
+and image sequences are picked out by name: ``shot.0001.iff`` from Maya,
+``shot0001.exr`` from Max.  Each image is also checked for a valid header
+(and, where the format has one, trailer or length field) so zero-byte and
+truncated frames are caught along with the missing ones.
+"""
+import os, re, sys, struct
+from optparse import OptionParser
+from rrt import get_log
+from rrt.frames import FrameSet
+from rrt.jobspec import JobSpec
+from rrt.settings import JOBSPEC_DIR
+try:
+    # os.scandir (python 3.5+), or the backport; listing with it gives file
+    # sizes without a stat per file, which is a round trip each over smb
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+LOG = get_log(__name__)
+
+IMAGE_EXT = [
+#    '.avi',
+    '.bmp',
+    '.cin',
+    '.eps', '.ps',
+    '.exr', '.fxr', '.hdr',
+    '.pic',
+    '.jpg', '.jpe', '.jpeg',
+    '.png',
+    '.rgb', '.rgba',
+    '.sgi', '.int', '.inta', '.bw',
+    '.rla',
+    '.rpf',
+    '.tga', '.vda', '.icb',
+    '.vst',
+    '.tif',
+    '.dds'
+]
+# maya's formats which aren't in the max list above
+MAYA_IMAGE_EXT = ['.iff', '.tiff', '.tex', '.dpx', '.psd', '.als', '.yuv']
+
+# name prefix, frame number, extension
+SEQUENCE = re.compile(r'^(?P<prefix>.*?)(?P<frame>\d+)(?P<ext>\.\w+)$')
+
+# bytes every valid file of a type starts (or ends) with
+MAGIC = {
+    '.bmp': ['BM'],
+    '.cin': ['\x80\x2a\x5f\xd7', '\xd7\x5f\x2a\x80'],
+    '.dds': ['DDS '],
+    '.dpx': ['SDPX', 'XPDS'],
+    '.eps': ['%!', '\xc5\xd0\xd3\xc6'],
+    '.ps': ['%!'],
+    '.exr': ['\x76\x2f\x31\x01'],
+    '.hdr': ['#?RADIANCE', '#?RGBE'],
+    '.iff': ['FORM', 'FOR4'],
+    '.jpg': ['\xff\xd8'], '.jpe': ['\xff\xd8'], '.jpeg': ['\xff\xd8'],
+    '.pic': ['\x53\x80\xf6\x34'],
+    '.png': ['\x89PNG\r\n\x1a\n'],
+    '.psd': ['8BPS'],
+    '.rgb': ['\x01\xda'], '.rgba': ['\x01\xda'], '.sgi': ['\x01\xda'],
+    '.int': ['\x01\xda'], '.inta': ['\x01\xda'], '.bw': ['\x01\xda'],
+    '.tif': ['II*\x00', 'MM\x00*'], '.tiff': ['II*\x00', 'MM\x00*'],
+}
+TRAILERS = {
+    '.jpg': '\xff\xd9', '.jpe': '\xff\xd9', '.jpeg': '\xff\xd9',
+    '.png': 'IEND\xaeB`\x82',
+}
+HEAD_BYTES = 16
+
+def _entries(folder):
+    """(name, path, is_dir, size) for everything in folder."""
+    if scandir is not None:
+        for entry in scandir(folder):
+            is_dir = entry.is_dir()
+            yield entry.name, entry.path, is_dir, 0 if is_dir else entry.stat().st_size
+        return
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        is_dir = os.path.isdir(path)
+        yield name, path, is_dir, 0 if is_dir else os.path.getsize(path)
+
+def list_images(folder, extensions, depth=1):
+    """
+    Returns {(subdir, prefix, ext): {frame: (path, size)}} for the image
+    sequences in folder, looking `depth` levels of subdirectories down
+    (maya puts render layers in their own directories).
+    """
+    sequences = {}
+    def walk(current, subdir, depth):
+        for name, path, is_dir, size in _entries(current):
+            if is_dir:
+                if depth > 0:
+                    walk(path, os.path.join(subdir, name), depth - 1)
+                continue
+            match = SEQUENCE.match(name)
+            if not match or match.group('ext').lower() not in extensions:
+                continue
+            key = (subdir, match.group('prefix'), match.group('ext').lower())
+            sequences.setdefault(key, {})[int(match.group('frame'))] = (path, size)
+    if os.path.isdir(folder):
+        walk(folder, '', depth)
+    return sequences
+
+def check_image(path, size):
+    """Returns None for an image that looks whole, or what's wrong with it."""
+    if not size:
+        return 'empty'
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'rb') as fh:
+        head = fh.read(HEAD_BYTES)
+        tail = ''
+        if ext in TRAILERS and size > HEAD_BYTES:
+            fh.seek(-len(TRAILERS[ext]) - 2, os.SEEK_END)
+            tail = fh.read()
+    if ext in MAGIC and not [m for m in MAGIC[ext] if head.startswith(m)]:
+        return 'bad header'
+    if ext in TRAILERS and TRAILERS[ext] not in (tail or head):
+        return 'truncated'
+    if ext == '.bmp' and len(head) >= 6 and struct.unpack('<I', head[2:6])[0] > size:
+        return 'truncated'
+    if ext == '.iff' and len(head) >= 8 and struct.unpack('>I', head[4:8])[0] + 8 > size:
+        return 'truncated'
+    return None
+
+class Verification(object):
+    """The outcome of checking a job's output against its frame range."""
+    def __init__(self, expected, sequences, missing, corrupt):
+        self.expected = expected
+        self.sequences = sequences
+        self.missing = missing
+        # {frame: [(path, problem)]}
+        self.corrupt = corrupt
+
+    @property
+    def bad_frames(self):
+        return sorted(set(self.missing) | set(self.corrupt))
+
+    @property
+    def ok(self):
+        return not self.bad_frames
+
+def output_location(output):
+    """
+    (directory, image name prefix or None) for a job's output setting:
+    maya jobs give a directory, max jobs the first image's path.
+    """
+    base, ext = os.path.splitext(output)
+    if ext.lower() in IMAGE_EXT + MAYA_IMAGE_EXT:
+        return os.path.dirname(output), os.path.basename(base)
+    return output, None
+
+def verify_output(output, start, end, step=1, headers=True, frames=None):
+    """
+    Checks output for frames start..end by step (or just `frames`, for jobs
+    with a frame list).  Every image sequence found there must have every
+    frame; a frame missing from any of them is missing.
+    """
+    if frames is not None:
+        expected = sorted(frames)
+    else:
+        start, end, step = int(start), int(end), int(step)
+        expected = range(start, end + 1, step)
+    folder, prefix = output_location(output)
+    sequences = list_images(folder, IMAGE_EXT + MAYA_IMAGE_EXT)
+    if prefix is not None:
+        # max writes render elements as <prefix>_<element>####.ext
+        sequences = dict((k, v) for k, v in sequences.items()
+                         if k[1].lower().startswith(prefix.lower()))
+    missing = set(expected) if not sequences else set()
+    corrupt = {}
+    for key, frames in sequences.items():
+        missing.update([f for f in expected if f not in frames])
+        if not headers:
+            continue
+        for frame in expected:
+            if frame not in frames:
+                continue
+            path, size = frames[frame]
+            problem = check_image(path, size)
+            if problem:
+                corrupt.setdefault(frame, []).append((path, problem))
+    LOG.info("%s: %d frames expected in %d sequences, %d missing, %d damaged" %
+             (folder, len(expected), len(sequences), len(missing), len(corrupt)))
+    return Verification(expected, sequences, sorted(missing), corrupt)
+
+def requeue_spec(spec, frames):
+    """
+    A JobSpec re-rendering just `frames` of `spec`, into the same output.
+    """
+    job = dict(spec.data)
+    for key in JobSpec._GENERATED_KEYS:
+        job.pop(key, None)
+    job.update(uuid=JobSpec.new_uuid(), frames=str(FrameSet(frames)))
+    return JobSpec(**job)
+
+def main(argv=None):
+    """
+    rrt-verify: checks a job's output and writes jobs for the bad frames.
+    """
+    parser = OptionParser(usage="%prog [options] job.ini",
+                          description="Checks that every frame of a job was rendered, and "
+                                      "writes job files that re-render the missing or damaged ones.")
+    parser.add_option('--no-headers', action='store_false', dest='headers', default=True,
+                      help="only look for missing frames, don't open the images")
+    parser.add_option('-w', '--write', metavar='DIR', default=None,
+                      help="write re-render job files to DIR")
+    parser.add_option('-s', '--submit', action='store_true', default=False,
+                      help="submit the re-render jobs")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("give one job file")
+    path = args[0]
+    if not os.path.isfile(path):
+        # a job uuid
+        path = os.path.join(JOBSPEC_DIR, path + '.ini')
+    spec = JobSpec.from_ini(path)
+    data = spec.data
+    # start and end only bound a frame list, e.g. an earlier re-render's
+    frames = data.get('frames') and list(FrameSet.parse(data['frames'])) or None
+    result = verify_output(data['output'], data['start'], data['end'], data['step'],
+                           options.headers, frames)
+    for frame in result.missing:
+        print "missing  %d" % frame
+    for frame, problems in sorted(result.corrupt.items()):
+        for image, problem in problems:
+            print "%-8s %d %s" % (problem, frame, image)
+    if result.ok:
+        print "All %d frames are there." % len(result.expected)
+        sys.exit(0)
+    job = requeue_spec(spec, result.bad_frames)
+    if options.submit:
+        job.submit_job()
+    else:
+        print job._write_ini_file(options.write)
+    sys.exit(3)
+
+if '__main__' == __name__:
+    main()